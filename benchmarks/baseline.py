@@ -0,0 +1,188 @@
+"""
+Базовая линия бенчмарков и сравнение с ней.
+
+    python -m benchmarks.baseline record  --scale small            # записать baseline
+    python -m benchmarks.baseline compare --scale small            # сравнить, код выхода 1 при регрессии
+
+Baseline - JSON с версией формата, параметрами прогона и результатами
+bench_db по каждому сценарию. Сравнение учитывает шум: регрессией считается
+только замедление p50 больше порога, который не меньше относительного
+разброса (p95/p50) обоих прогонов и больше абсолютного минимума в мс, причем
+минимальное время тоже должно вырасти - одиночные всплески p50 не считаются.
+Вместе с результатами пишется время калибровочной нагрузки: при сравнении
+новые замеры приводятся к скорости машины, на которой снимался baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks import bench_db
+from benchmarks.league import SCALES
+
+FORMAT_VERSION = 1
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+REL_THRESHOLD = 0.20     # +20% к p50 - минимум для регрессии
+ABS_THRESHOLD_MS = 0.2   # изменения меньше этого - шум при любых процентах
+MEMORY_THRESHOLD = 0.30  # +30% к пиковой памяти
+
+
+def baseline_path(scale):
+    return os.path.join(BASELINE_DIR, f"{scale}.json")
+
+
+def _environment():
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+
+
+def calibrate(rounds=7):
+    """Время (мс) фиксированной CPU-нагрузки: json + сортировка + строки"""
+    payload = [{"nickname": f"p{i}", "K": i % 30, "RATING": i / 7} for i in range(2000)]
+    timings = []
+    for _ in range(rounds + 1):
+        started = time.perf_counter()
+        data = json.loads(json.dumps(payload))
+        data.sort(key=lambda x: (x["RATING"], x["nickname"]))
+        "".join(x["nickname"].upper() for x in data)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Первый прогон - прогрев
+    return statistics.median(timings[1:])
+
+
+def normalize(results, factor):
+    """Приводит времена к скорости другой машины (factor = калибровка baseline / текущая)"""
+    keys = ("p50_ms", "p95_ms", "min_ms")
+    return {name: {k: (v * factor if k in keys else v) for k, v in r.items()} for name, r in results.items()}
+
+
+def run_calibrated(scale, repeat):
+    """Результаты bench_db и калибровка (минимум из замеров до и после прогона)"""
+    before = calibrate()
+    results = bench_db.run(scale, repeat)
+    return results, min(before, calibrate())
+
+
+def record(scale, repeat, path=None):
+    results, calibration_ms = run_calibrated(scale, repeat)
+    payload = {
+        "version": FORMAT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "repeat": repeat,
+        "environment": _environment(),
+        "calibration_ms": round(calibration_ms, 4),
+        "results": results,
+    }
+    path = path or baseline_path(scale)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False, sort_keys=True)
+    return path, payload
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    if payload.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: формат baseline {payload.get('version')}, ожидается {FORMAT_VERSION}")
+    return payload
+
+
+def _noise(entry):
+    """Относительный разброс замеров прогона"""
+    if entry["p50_ms"] <= 0:
+        return 0.0
+    return (entry["p95_ms"] - entry["p50_ms"]) / entry["p50_ms"]
+
+
+def compare(base, current, rel=REL_THRESHOLD, abs_ms=ABS_THRESHOLD_MS, mem=MEMORY_THRESHOLD):
+    """Список строк отчета: (сценарий, статус, было p50, стало p50, изменение, комментарий)"""
+    report = []
+    for name in sorted(set(base) | set(current)):
+        old, new = base.get(name), current.get(name)
+        if old is None:
+            report.append((name, "new", None, new["p50_ms"], None, "нет в baseline"))
+            continue
+        if new is None:
+            report.append((name, "missing", old["p50_ms"], None, None, "нет в текущем прогоне"))
+            continue
+
+        delta = new["p50_ms"] - old["p50_ms"]
+        change = delta / old["p50_ms"] if old["p50_ms"] > 0 else 0.0
+        threshold = max(rel, _noise(old), _noise(new))
+        min_change = (new["min_ms"] - old["min_ms"]) / old["min_ms"] if old["min_ms"] > 0 else 0.0
+        mem_change = (new["peak_kb"] - old["peak_kb"]) / old["peak_kb"] if old["peak_kb"] > 0 else 0.0
+
+        status, note = "ok", f"порог {threshold:+.0%}"
+        if change > threshold and delta > abs_ms and min_change > rel:
+            status = "regression"
+        elif change < -threshold and -delta > abs_ms and min_change < -rel:
+            status = "improved"
+        if mem_change > mem and new["peak_kb"] - old["peak_kb"] > 64:
+            note += f", память {mem_change:+.0%}"
+            if status == "ok":
+                status = "regression"
+        report.append((name, status, old["p50_ms"], new["p50_ms"], change, note))
+    return report
+
+
+def print_report(report):
+    marks = {"ok": " ", "improved": "+", "regression": "!", "new": "?", "missing": "?"}
+    print(f"  {'сценарий':<24} {'было, мс':>10} {'стало, мс':>10} {'изм.':>8}  комментарий")
+    for name, status, old, new, change, note in report:
+        old_s = f"{old:.3f}" if old is not None else "-"
+        new_s = f"{new:.3f}" if new is not None else "-"
+        change_s = f"{change:+.0%}" if change is not None else "-"
+        print(f"{marks[status]} {name:<24} {old_s:>10} {new_s:>10} {change_s:>8}  {status}; {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись и сравнение baseline бенчмарков")
+    parser.add_argument("command", choices=["record", "compare"])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--baseline", help="путь к файлу baseline (по умолчанию benchmarks/baselines/<scale>.json)")
+    parser.add_argument("--rel", type=float, default=REL_THRESHOLD, help="относительный порог регрессии p50")
+    parser.add_argument("--abs-ms", type=float, default=ABS_THRESHOLD_MS, help="минимальное замедление p50 в мс")
+    parser.add_argument("--raw", action="store_true", help="не приводить замеры к скорости машины baseline")
+    args = parser.parse_args()
+
+    path = args.baseline or baseline_path(args.scale)
+    if args.command == "record":
+        path, _ = record(args.scale, args.repeat, path)
+        print(f"baseline записан: {path}")
+        return 0
+
+    if not os.path.exists(path):
+        print(f"нет baseline {path}: сначала запустите record", file=sys.stderr)
+        return 2
+    base = load(path)
+    if base["scale"] != args.scale:
+        print(f"baseline снят на шкале {base['scale']}, а не {args.scale}", file=sys.stderr)
+        return 2
+    if base["environment"] != _environment():
+        print(f"внимание: baseline снят в другом окружении {base['environment']}", file=sys.stderr)
+
+    current, calibration_ms = run_calibrated(args.scale, args.repeat)
+    factor = base["calibration_ms"] / calibration_ms if calibration_ms > 0 else 1.0
+    if not args.raw:
+        print(f"калибровка: baseline {base['calibration_ms']:.2f} мс, сейчас {calibration_ms:.2f} мс (x{factor:.2f})")
+        current = normalize(current, factor)
+    report = compare(base["results"], current, args.rel, args.abs_ms)
+    print_report(report)
+    regressions = [r for r in report if r[1] == "regression"]
+    print(f"\nрегрессий: {len(regressions)} из {len(report)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
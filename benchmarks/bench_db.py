@@ -0,0 +1,160 @@
+"""
+Бенчмарк функций database.py и форматирования на синтетической лиге.
+
+    python -m benchmarks.bench_db --scale small --repeat 20
+    python -m benchmarks.bench_db --scale medium --only top,player
+
+Для каждого сценария: прогрев, затем repeat замеров (p50/p95 в мс) и
+отдельный прогон под tracemalloc для пикового объема памяти.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+import database
+import rendering
+from benchmarks.league import SCALES, ensure_league, team_tag, PLAYERS_PER_TEAM
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def build_cases(scale, rng):
+    """name -> фабрика корутины (или обычной функции) без аргументов"""
+    p = SCALES[scale]
+    teams, tournaments = p["teams"], p["tournaments"]
+
+    def nick():
+        return f"p{rng.randrange(teams)}_{rng.randrange(PLAYERS_PER_TEAM)}"
+
+    sample_game = {}
+
+    async def load_sample_game():
+        if not sample_game:
+            sample_game.update(await database.get_game_by_id(1))
+        return sample_game
+
+    async def fmt_game():
+        game = await load_sample_game()
+        return rendering.format_game_stats(game, "S1")
+
+    async def tour_choices():
+        database.invalidate_tournament_choices()
+        return await database.get_tournament_choices()
+
+    escape_fields = ["p12_3", "Team 1 Rust", 1.33, "Cup 7 (S2)", "2024-01-01"]
+
+    return {
+        # --- игроки ---
+        "player_stats_and_rank": lambda: database.get_player_stats_and_rank(nick()),
+        "top_players_100": lambda: database.get_top_players_list(100),
+        "all_roster_page": lambda: database.get_all_roster_players_paginated(rng.randrange(max(1, teams * PLAYERS_PER_TEAM // 10)), 10),
+        "player_achievements": lambda: database.get_player_achievements(nick(), rng.randrange(2, teams + 2)),
+        # --- пагинаторы ---
+        "teams_page_tag": lambda: database.get_teams_paginated(rng.randrange(max(1, teams // 5)), 5, "tag"),
+        "teams_page_name": lambda: database.get_teams_paginated(rng.randrange(max(1, teams // 5)), 5, "name"),
+        "tournaments_page": lambda: database.get_tournaments_paginated(rng.randrange(max(1, tournaments // 5)), 5, "year"),
+        "games_page": lambda: database.get_games_paginated(rng.randint(1, tournaments), 0, 5),
+        "admins_page": lambda: database.get_admins_paginated(0, 3),
+        # --- точечные выборки ---
+        "team_by_tag": lambda: database.get_team_by_tag(team_tag(rng.randrange(teams)).lower()),
+        "team_rank": lambda: database.get_team_rank_alphabetical(team_tag(rng.randrange(teams))),
+        "tournament_by_id": lambda: database.get_tournament_by_id(rng.randint(1, tournaments)),
+        "tournament_choices": tour_choices,
+        "game_by_id": lambda: database.get_game_by_id(rng.randint(1, p["games"])),
+        # --- форматирование ---
+        "format_game_stats": fmt_game,
+        "escape_md_5_fields": lambda: [rendering.escape_md(f) for f in escape_fields],
+    }
+
+
+async def _call(factory):
+    result = factory()
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def measure(factory, repeat, warmup=1):
+    for _ in range(warmup):
+        await _call(factory)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await _call(factory)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    await _call(factory)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "n": repeat,
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(_percentile(timings, 95), 4),
+        "min_ms": round(min(timings), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+async def run_cases(db_path, scale, repeat, only=None, seed=1):
+    old_name = database.DB_NAME
+    database.DB_NAME = db_path
+    try:
+        # Миграции (индексы и т.п.) - база должна быть в том же виде, что у бота
+        await database.init_db()
+        rng = random.Random(seed)
+        cases = build_cases(scale, rng)
+        results = {}
+        for name, factory in cases.items():
+            if only and not any(part in name for part in only):
+                continue
+            results[name] = await measure(factory, repeat)
+        return results
+    finally:
+        database.DB_NAME = old_name
+
+
+def run(scale="small", repeat=20, only=None, db_path=None, rebuild=False):
+    """Синхронная точка входа (используется и baseline-инструментом)"""
+    path = db_path or ensure_league(scale, rebuild=rebuild)
+    return asyncio.run(run_cases(path, scale, repeat, only))
+
+
+def print_report(results):
+    print(f"{'сценарий':<24} {'p50, мс':>10} {'p95, мс':>10} {'пик, КБ':>10}")
+    for name, r in results.items():
+        print(f"{name:<24} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['peak_kb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк database.py и форматирования")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", help="подстроки имен сценариев через запятую")
+    parser.add_argument("--db", help="готовая база вместо сгенерированной")
+    parser.add_argument("--rebuild", action="store_true", help="пересоздать синтетическую базу")
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    args = parser.parse_args()
+
+    only = [x.strip() for x in args.only.split(",")] if args.only else None
+    results = run(args.scale, args.repeat, only, args.db, args.rebuild)
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
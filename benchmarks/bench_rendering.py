@@ -0,0 +1,276 @@
+"""
+Сравнение rendering.py с прежними функциями форматирования из bot.py.
+
+Запуск: python -m benchmarks.bench_rendering
+Сначала проверяет, что вывод совпадает символ в символ, потом меряет время.
+"""
+import json
+import timeit
+
+import rendering
+
+
+# --- ПРЕЖНЯЯ РЕАЛИЗАЦИЯ (как была в bot.py) ---
+
+def legacy_escape_md(text):
+    if text is None: return ""
+    text = str(text)
+    chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in chars:
+        text = text.replace(char, f"\\{char}")
+    return text
+
+def legacy_escape_md_code(text):
+    if text is None: return ""
+    text = str(text)
+    return text.replace('\\', '\\\\').replace('`', '\\`')
+
+def legacy_format_team_tag_md(tag):
+    if not tag:
+        return "\\[\\]"
+    return f"\\[{legacy_escape_md(tag)}\\]"
+
+def legacy_fmt_money(val):
+    if val.is_integer():
+        return str(int(val))
+    return f"{val:.2f}".rstrip("0").rstrip(".")
+
+def legacy_format_game_stats(game, tournament_season=""):
+    try:
+        stats = json.loads(game['stats_json'])
+    except:
+        return "⚠️ Ошибка загрузки статистики"
+
+    date_safe = legacy_escape_md_code(game['game_date'])
+    map_safe = legacy_escape_md_code(game['map_name'])
+    season_safe = legacy_escape_md(tournament_season)
+
+    txt = f"⚔️ *Матч ID:* `{legacy_escape_md(game['id'])}`\n"
+    if season_safe:
+        txt += f"❄️ *Сезон:* {season_safe}\n"
+    txt += f"📅 `{date_safe}` \\| 🗺 `{map_safe}`\n"
+    txt += f"🏆 Счет: *{legacy_escape_md(game['score_t1'])} : {legacy_escape_md(game['score_t2'])}*\n"
+
+    try:
+        s1 = int(game.get('score_t1', 0))
+        s2 = int(game.get('score_t2', 0))
+    except Exception:
+        s1 = 0
+        s2 = 0
+
+    if s1 > s2:
+        winner_line = f"🏆 *Победитель:* {legacy_format_team_tag_md(game.get('team1_tag', ''))}\n"
+    elif s2 > s1:
+        winner_line = f"🏆 *Победитель:* {legacy_format_team_tag_md(game.get('team2_tag', ''))}\n"
+    else:
+        winner_line = "🏆 *Победитель:* Ничья\n"
+
+    txt += winner_line + "\n"
+
+    def draw_team_stats(tag, players):
+        res = f"🚩 *{legacy_format_team_tag_md(tag)}*\n"
+        res += "```\n"
+        res += f"{'Player':<10} {'K':>2} {'A':>2} {'D':>2} {'KD':>4} {'RTG':>4}\n"
+        res += "-" * 32 + "\n"
+        for p in players:
+            name = legacy_escape_md_code(p.get('nickname', 'Player')[:10])
+            k = p.get('K', 0)
+            a = p.get('A', 0)
+            d = p.get('D', 0)
+            kd = p.get('KD', 0.0)
+            rtg = p.get('RATING', 0.0)
+            res += f"{name:<10} {k:>2} {a:>2} {d:>2} {kd:>4} {rtg:>4}\n"
+        res += "```\n"
+        return res
+
+    for team_tag, players_list in stats.items():
+        txt += draw_team_stats(team_tag, players_list)
+    return txt
+
+def legacy_format_player_profile(stats):
+    escape_md = legacy_escape_md
+    full_name = stats['last_name'] + " \"" + stats['nickname'] + "\" " + stats['first_name']
+    header = f"👤 *Игрок:* {escape_md(full_name)}\n"
+    team_txt = f"🛡️ *Команда:* {escape_md(stats['current_team'])}\n"
+    rank_txt = f"🏆 *Ранг:* \\#{escape_md(stats['rank'])} \\(Очки: {escape_md(stats['score'])}\\)\n"
+    main_stats = (
+        f"📊 *Статистика:*\n"
+        f"🔫 K: {stats['kills']} \\| A: {stats['assists']} \\| D: {stats['deaths']}\n"
+        f"➕/➖: {escape_md(stats['diff'])} \\| Helps: {escape_md(stats['helps'])}\n"
+        f"💀 KD: {escape_md(stats['kd'])}\n"
+        f"🔫 KPR: {escape_md(stats['kpr'])} \\| 🛡 DPR: {escape_md(stats['dpr'])}\n"
+        f"❤️ SVR: {escape_md(stats['svr'])}\n"
+        f"💥 IMPACT: {escape_md(stats['impact'])}\n"
+        f"⭐ RATING: {escape_md(stats['avg_rating'])}\n"
+    )
+    last_games_txt = "\n📅 *Последние 3 игры:*\n"
+    if stats['last_3_games']:
+        for g in stats['last_3_games']:
+            last_games_txt += f"▫️ {escape_md(g)}\n"
+    else:
+        last_games_txt += "▫️ Нет сыгранных игр\n"
+    achievements_txt = "\n🏅 *Достижения:*\n"
+    if stats['achievements']:
+        for ach in stats['achievements']:
+            achievements_txt += f"{escape_md(ach)}\n"
+    else:
+        achievements_txt += "▫️ Нет\n"
+    transfers_txt = "\n🔄 *История трансферов:*\n"
+    if stats['transfers']:
+        for t in stats['transfers']:
+            old = escape_md(t['old_team'])
+            new = escape_md(t['new_team'])
+            date = escape_md(t['date'])
+            transfers_txt += f"▫️ {date}: {old} ➡️ {new}\n"
+    else:
+        transfers_txt += "▫️ Пусто\n"
+    return header + team_txt + rank_txt + "\n" + main_stats + last_games_txt + achievements_txt + transfers_txt
+
+def legacy_format_tournament_info(tour):
+    escape_md = legacy_escape_md
+    try:
+        pdata = json.loads(tour['prize_data'])
+    except:
+        pdata = None
+    try:
+        mdata = json.loads(tour['mvp_data'])
+    except:
+        mdata = None
+
+    p_str = "Нет фонда"
+    if pdata:
+        curr = pdata.get('currency', '?')
+        dist_raw = pdata.get('distribution', [])
+        if isinstance(dist_raw, dict):
+            dist_list = [{"place": k, "amount": v} for k, v in dist_raw.items()]
+        elif isinstance(dist_raw, list):
+            dist_list = dist_raw
+        else:
+            dist_list = []
+
+        def _to_float(val):
+            try:
+                return float(str(val).replace(',', '.'))
+            except Exception:
+                return 0.0
+
+        distributed_sum = sum(_to_float(x.get('amount', 0)) for x in dist_list if isinstance(x, dict))
+        total_fund_val = pdata.get('total_fund')
+        total_fund = _to_float(total_fund_val) if total_fund_val is not None else distributed_sum
+        lines = []
+        for item in dist_list:
+            if not isinstance(item, dict):
+                continue
+            place = escape_md(item.get('place', ''))
+            amount = escape_md(legacy_fmt_money(_to_float(item.get('amount', 0))))
+            lines.append(f"   🏅 {place}: {amount} {escape_md(curr)}")
+        p_str = f"*{escape_md(legacy_fmt_money(total_fund))} {escape_md(curr)}*"
+        if lines:
+            p_str += "\n" + "\n".join(lines)
+
+    m_str = "Нет"
+    if mdata:
+        amount = mdata.get('amount', '0')
+        currency = mdata.get('currency', '')
+        m_str = f"{escape_md(amount)} {escape_md(currency)}"
+
+    stg = []
+    if tour['has_qualifiers']: stg.append("Квалификации")
+    if tour['has_group_stage']: stg.append("Групповой этап")
+    stg.append("Плей-офф (Main)")
+    stg_str = " \\-\\> ".join([escape_md(s) for s in stg])
+    season_txt = f"❄️ *Сезон:* {escape_md(tour['season'])}\n" if tour['season'] else ""
+    try:
+        parts = json.loads(tour['participants'])
+    except:
+        parts = []
+    return (
+        f"🏆 *Турнир:* {escape_md(tour['full_name'])}\n"
+        f"{season_txt}"
+        f"📅 *Год:* {tour['year']}\n"
+        f"🚦 *Этапы:* {stg_str}\n"
+        f"👥 *Участников:* {len(parts)}\n\n"
+        f"💰 *Призовой фонд:*\n{p_str}\n\n"
+        f"⭐ *MVP Приз:* {m_str}"
+    )
+
+
+# --- ДАННЫЕ ---
+
+def sample_game(i=1, players=5):
+    stats = {
+        tag: [
+            {"nickname": f"pl_{tag}{n}`x", "K": 10 + n, "A": n, "D": 7, "KD": 1.43, "RATING": 1.12}
+            for n in range(players)
+        ]
+        for tag in ("A.B", "C-D")
+    }
+    return {
+        "id": i, "game_date": "2024.05.01", "map_name": "Zone 7", "score_t1": 13, "score_t2": 11,
+        "team1_tag": "A.B", "team2_tag": "C-D", "stats_json": json.dumps(stats),
+    }
+
+def sample_profile():
+    return {
+        "last_name": "Ivanov", "nickname": "x_Pro.1", "first_name": "Ivan",
+        "current_team": "Team [A.B]", "rank": 3, "score": 12.5,
+        "kills": 120, "assists": 40, "deaths": 90, "diff": 30, "helps": 0.4,
+        "kd": 1.33, "kpr": 0.85, "dpr": 0.64, "svr": 0.36, "impact": 1.2, "avg_rating": 1.11,
+        "last_3_games": [f"A.B vs C-D (2024.05.0{i}) 13-11" for i in range(3)],
+        "achievements": ["🥇 1st - Cup (2024)", "⭐ MVP - League (2023)"],
+        "transfers": [{"date": "2024-01-01", "old_team": "FA", "new_team": "A.B"}] * 3,
+    }
+
+def sample_tournament():
+    return {
+        "full_name": "Winter Cup #3 (Main)", "season": "S-2", "year": 2024,
+        "has_qualifiers": 1, "has_group_stage": 1,
+        "participants": json.dumps(list(range(16))),
+        "prize_data": json.dumps({"currency": "USD", "total_fund": "1000.5",
+                                  "distribution": [{"place": "1st", "amount": "500"}, {"place": "2nd", "amount": "300,25"}]}),
+        "mvp_data": json.dumps({"amount": "50.5", "currency": "USD"}),
+    }
+
+
+# Типичные поля сообщений: ники, числа, названия
+FIELDS = ["Ivanov", "x_Pro.1", 1.33, 12, "Winter Cup #3 (Main)", "2024-01-01", "Team Spirit"]
+
+def escape_fields(escape):
+    return [escape(f) for f in FIELDS]
+
+
+CASES = [
+    ("escape_md (7 полей)", lambda: escape_fields(legacy_escape_md), lambda: escape_fields(rendering.escape_md), ()),
+    ("format_game_stats", legacy_format_game_stats, rendering.format_game_stats, (sample_game(), "Season.1")),
+    ("format_player_profile", legacy_format_player_profile, rendering.format_player_profile, (sample_profile(),)),
+    ("format_tournament_info", legacy_format_tournament_info, rendering.format_tournament_info, (sample_tournament(),)),
+]
+
+
+def check_equal():
+    extra = [
+        (legacy_escape_md, rendering.escape_md, ("Plain text with _*[]()~`>#+-=|{}.! chars \\",)),
+        (legacy_format_game_stats, rendering.format_game_stats, (dict(sample_game(), score_t1=5), "")),
+        (legacy_format_game_stats, rendering.format_game_stats, (dict(sample_game(), stats_json="{bad"),)),
+        (legacy_format_player_profile, rendering.format_player_profile,
+         (dict(sample_profile(), last_3_games=[], achievements=[], transfers=[]),)),
+        (legacy_format_tournament_info, rendering.format_tournament_info,
+         (dict(sample_tournament(), prize_data=None, mvp_data="", season="", has_qualifiers=0, participants="x"),)),
+        (legacy_format_tournament_info, rendering.format_tournament_info,
+         (dict(sample_tournament(), prize_data=json.dumps({"distribution": {"1st": 10}})),)),
+    ]
+    for old, new, args in [(c[1], c[2], c[3]) for c in CASES] + extra:
+        assert old(*args) == new(*args), f"{getattr(new, '__name__', new)}: вывод отличается"
+
+
+def main(number=5000):
+    check_equal()
+    print(f"{'функция':<24} {'было, мкс':>10} {'стало, мкс':>11} {'ускорение':>10}")
+    for name, old, new, args in CASES:
+        t_old = timeit.timeit(lambda: old(*args), number=number) / number * 1e6
+        t_new = timeit.timeit(lambda: new(*args), number=number) / number * 1e6
+        print(f"{name:<24} {t_old:>10.2f} {t_new:>11.2f} {t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Локальная заглушка Bot API для нагрузочных прогонов.
+
+Отвечает на sendMessage/editMessageText/sendPhoto/... правдоподобными
+объектами Message, на остальные методы - true. Считает вызовы по методам
+и может добавлять искусственную задержку, имитируя сеть до Telegram.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "BannerBot", "username": "banner_bot"}
+
+# Методы, которые возвращают Message
+MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendDocument", "sendAnimation", "sendVideo", "sendSticker",
+    "editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup",
+}
+PHOTO_METHODS = {"sendPhoto", "editMessageMedia"}
+
+
+class FakeBotAPI:
+    def __init__(self, latency_ms=0.0, host="127.0.0.1"):
+        self.latency = latency_ms / 1000
+        self.host = host
+        self.port = None
+        self.calls = Counter()
+        self.last_message = {}      # chat_id -> message_id последнего сообщения бота
+        self._ids = itertools.count(1_000_000)
+        self._file_ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self, port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self.result(method, params)})
+
+    def result(self, method, params):
+        if method == "getMe":
+            return BOT_USER
+        if method not in MESSAGE_METHODS:
+            return True
+
+        chat_id = int(params.get("chat_id") or 0)
+        message_id = params.get("message_id")
+        message_id = int(message_id) if message_id else next(self._ids)
+        self.last_message[chat_id] = message_id
+
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if method in PHOTO_METHODS:
+            n = next(self._file_ids)
+            message["photo"] = [{"file_id": f"photo{n}", "file_unique_id": f"u{n}", "width": 640, "height": 640}]
+            message["caption"] = params.get("caption", "")
+        elif method == "sendDocument":
+            n = next(self._file_ids)
+            message["document"] = {"file_id": f"doc{n}", "file_unique_id": f"d{n}"}
+        else:
+            message["text"] = params.get("text", "")
+        if params.get("reply_markup"):
+            try:
+                message["reply_markup"] = json.loads(params["reply_markup"])
+            except (TypeError, ValueError):
+                # Клавиатура не в JSON - в ответе ее просто не будет
+                pass
+        return message
@@ -0,0 +1,173 @@
+"""
+Генератор синтетической лиги для бенчмарков.
+
+Создает базу той же схемы, что и init_db(), и заполняет ее командами,
+турнирами, играми с реалистичным stats_json и трансферами. Данные
+детерминированы (seed), так что одна и та же шкала дает одинаковую базу.
+
+    python -m benchmarks.league --scale small --out /tmp/league_small.db
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+
+import database
+from player_metrics import calculate_player_metrics
+
+MAPS = ["Sandstone", "Province", "Rust", "Zone 7", "Hanami", "Breeze", "Dune", "Sakura"]
+CURRENCIES = ["RUB", "EUR", "USD", "UAH", "G", "USDT", "TON"]
+
+SCALES = {
+    # команд, игр, турниров, трансферов, админов
+    "tiny":   dict(teams=20, games=200, tournaments=5, transfers=50, admins=5),
+    "small":  dict(teams=100, games=1_000, tournaments=20, transfers=500, admins=20),
+    "medium": dict(teams=1_000, games=50_000, tournaments=200, transfers=5_000, admins=50),
+    "large":  dict(teams=10_000, games=1_000_000, tournaments=2_000, transfers=50_000, admins=100),
+}
+
+PLAYERS_PER_TEAM = 5
+INSERT_BATCH = 10_000
+
+
+def team_tag(i):
+    # Уникальный тег из букв: 0 -> AAA, 1 -> AAB, ...
+    letters = []
+    for _ in range(3 if i < 26 ** 3 else 4):
+        i, r = divmod(i, 26)
+        letters.append(chr(65 + r))
+    return "".join(reversed(letters))
+
+
+def _team_rows(rng, count):
+    for i in range(count):
+        roster = "\n".join(f"p{i}_{n}" for n in range(PLAYERS_PER_TEAM))
+        yield (f"Team {i} {rng.choice(MAPS)}", team_tag(i), 0, roster, "", None, None)
+
+
+def _tournament_rows(rng, count, teams):
+    for i in range(count):
+        participants = rng.sample(range(1, teams + 1), min(teams, 16))
+        winners = {"1st": participants[0], "2nd": participants[1]} if i % 3 == 0 and len(participants) > 1 else {}
+        prize = {
+            "currency": rng.choice(CURRENCIES),
+            "total_fund": 1000,
+            "distribution": [{"place": "1st", "amount": 600}, {"place": "2nd", "amount": 400}],
+        }
+        yield (
+            f"Cup {i}", f"S{i % 4 + 1}", 2018 + i % 8, i % 2, (i + 1) % 2, "",
+            json.dumps(prize), json.dumps({"amount": 50, "currency": "USD"}) if i % 2 else None,
+            json.dumps(participants), json.dumps(winners),
+        )
+
+
+def _game_rows(rng, count, teams, tournaments):
+    for i in range(count):
+        t1, t2 = rng.sample(range(teams), 2)
+        s1 = 13
+        s2 = rng.randint(0, 11)
+        if rng.random() < 0.5:
+            s1, s2 = s2, s1
+        rounds = s1 + s2
+        stats = {}
+        for t in (t1, t2):
+            players = []
+            for n in range(PLAYERS_PER_TEAM):
+                k, a, d = rng.randint(2, 30), rng.randint(0, 12), rng.randint(5, 22)
+                metrics = calculate_player_metrics(k, a, d, rounds)
+                metrics["nickname"] = f"p{t}_{n}"
+                players.append(metrics)
+            stats[team_tag(t)] = players
+        yield (
+            rng.randint(1, tournaments), f"20{18 + i % 8}.{i % 12 + 1:02d}.{i % 28 + 1:02d}",
+            f"{PLAYERS_PER_TEAM}x{PLAYERS_PER_TEAM}", rng.choice(MAPS), team_tag(t1), team_tag(t2),
+            s1, s2, rounds, json.dumps(stats),
+            f"20{18 + i % 8}-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:{i % 60:02d}:00",
+        )
+
+
+def _transfer_rows(rng, count, teams):
+    for i in range(count):
+        t = rng.randrange(teams)
+        yield (f"p{t}_{rng.randrange(PLAYERS_PER_TEAM)}", team_tag(t), team_tag(rng.randrange(teams)), f"2024-{i % 12 + 1:02d}-01")
+
+
+def _insert(conn, sql, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            conn.executemany(sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(sql, batch)
+
+
+def generate_league(path, teams, games, tournaments, transfers, admins, seed=42):
+    """Создает (перезаписывает) базу по пути path"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    # Схему создает сам бот - так она не разойдется с database.py
+    old_name = database.DB_NAME
+    database.DB_NAME = path
+    try:
+        asyncio.run(database.init_db())
+    finally:
+        database.DB_NAME = old_name
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    # Журнал не трогаем: init_db включил WAL, и бенчмарки должны мерить базу
+    # в том же режиме, что и бот. Скорость дают одна транзакция и synchronous=OFF.
+    conn.execute("PRAGMA synchronous=OFF")
+    with conn:
+        # init_db уже добавил FFT первой командой; сгенерированные идут после нее
+        _insert(conn, "INSERT INTO teams (name, tag, rank, roster, logo_base64, games_ids, achievements) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                _team_rows(rng, teams))
+        _insert(conn, "INSERT INTO tournaments (full_name, season, year, has_qualifiers, has_group_stage, logo_base64, prize_data, mvp_data, participants, winners) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                _tournament_rows(rng, tournaments, teams))
+        _insert(conn, "INSERT INTO games (tournament_id, game_date, game_format, map_name, team1_tag, team2_tag, score_t1, score_t2, total_rounds, stats_json, created_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                _game_rows(rng, games, teams, tournaments))
+        _insert(conn, "INSERT INTO transfers (player_name, old_team, new_team, date) VALUES (?, ?, ?, ?)",
+                _transfer_rows(rng, transfers, teams))
+        _insert(conn, "INSERT INTO users (user_id, username, is_admin, promoted_by) VALUES (?, ?, ?, ?)",
+                ((1000 + i, f"admin{i}", 1 + i % 2, "SYSTEM") for i in range(admins)))
+    conn.close()
+    return path
+
+
+def league_path(scale, directory=None):
+    return os.path.join(directory or os.environ.get("BENCH_DIR", "/tmp"), f"bannerbot_league_{scale}.db")
+
+
+def ensure_league(scale, directory=None, rebuild=False):
+    """Путь к базе нужной шкалы; генерирует ее, если файла еще нет"""
+    path = league_path(scale, directory)
+    if rebuild or not os.path.exists(path):
+        generate_league(path, **SCALES[scale])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетической лиги")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--out", help="путь к базе (по умолчанию в $BENCH_DIR или /tmp)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    path = args.out or league_path(args.scale)
+    started = time.perf_counter()
+    generate_league(path, seed=args.seed, **SCALES[args.scale])
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"{path}: {SCALES[args.scale]}, {size_mb:.1f} МБ за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
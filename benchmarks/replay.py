@@ -0,0 +1,307 @@
+"""
+Прогон настоящего dp из bot.py без Telegram.
+
+Бот ходит в локальную заглушку Bot API (benchmarks/fake_api.py), база -
+копия синтетической лиги. Виртуальные пользователи по кругу проходят
+сценарии (листают карусели, открывают профили, регистрируют игру через
+GameRegister) или воспроизводится записанный поток апдейтов (JSONL).
+
+    python -m benchmarks.replay --scale small --users 20 --duration 30
+    python -m benchmarks.replay --scenarios wizard --users 4 --iterations 5
+    python -m benchmarks.replay --updates recorded.jsonl --users 50
+
+Задержка считается от передачи апдейта в dp до конца обработки,
+включая ожидание в очереди update_executor.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.bench_db import _percentile
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.league import SCALES, ensure_league, team_tag, PLAYERS_PER_TEAM
+
+ADMIN_BASE_ID = 1000    # админы синтетической лиги: 1000, 1001, ...
+USER_BASE_ID = 500_000
+UPDATE_TIMEOUT = 30     # апдейт, отброшенный до воркера (троттлинг), не должен вешать прогон
+
+
+# --- СЦЕНАРИИ ---
+# Сценарий - генератор шагов ("cb", callback_data) или ("msg", текст).
+
+def scenario_browse_teams(rng, scale):
+    teams = SCALES[scale]["teams"]
+    yield "msg", "/start"
+    yield "cb", "menu_teams_root"
+    yield "cb", "nav_teams_list"
+    for page in range(1, 4):
+        yield "cb", f"team_page_{page}"
+    yield "cb", "set_sort_name"
+    yield "cb", f"team_page_{rng.randrange(max(1, teams // 3))}"
+    yield "cb", f"view_team_{rng.randint(2, teams + 1)}"
+    yield "cb", "nav_main"
+
+
+def scenario_browse_tours(rng, scale):
+    tours = SCALES[scale]["tournaments"]
+    tid = rng.randint(1, tours)
+    yield "cb", "menu_tours_root"
+    yield "cb", "nav_tournaments"
+    yield "cb", "tour_page_1"
+    yield "cb", "set_toursort_year"
+    yield "cb", f"view_tour_{tid}"
+    yield "cb", f"list_games_{tid}"
+    yield "cb", f"game_page_{tid}_1"
+    yield "cb", f"view_game_{rng.randint(1, SCALES[scale]['games'])}"
+    yield "cb", "nav_main"
+
+
+def scenario_profiles(rng, scale):
+    teams = SCALES[scale]["teams"]
+    yield "cb", "nav_all_players_list"
+    yield "cb", f"roster_page_{rng.randrange(max(1, teams * PLAYERS_PER_TEAM // 10))}"
+    for _ in range(3):
+        yield "cb", f"roster_view_p{rng.randrange(teams)}_{rng.randrange(PLAYERS_PER_TEAM)}"
+    yield "cb", "roster_top_100_0"
+    yield "cb", "nav_main"
+
+
+def scenario_wizard(rng, scale):
+    """Регистрация игры по шагам GameRegister (пользователь должен быть админом)"""
+    from states import TournamentNav
+
+    teams, tours = SCALES[scale]["teams"], SCALES[scale]["tournaments"]
+    t1, t2 = rng.sample(range(teams), 2)
+    yield "cb", "nav_games_main"
+    yield "cb", "game_add_init"
+    yield "cb", TournamentNav(action="next", index=1, id=0).pack()
+    yield "cb", TournamentNav(action="select", index=1, id=rng.randint(1, tours)).pack()
+    yield "cb", "set_format_5x5"
+    yield "msg", "2024.05.20"
+    yield "cb", "set_reg_map_Rust"
+    yield "msg", "13-11"
+    for team in (t1, t2):
+        yield "msg", team_tag(team)
+        for _ in range(PLAYERS_PER_TEAM):
+            yield "msg", f"{rng.randint(5, 25)} {rng.randint(0, 10)} {rng.randint(5, 20)}"
+
+
+SCENARIOS = {
+    "teams": (scenario_browse_teams, False),
+    "tours": (scenario_browse_tours, False),
+    "profiles": (scenario_profiles, False),
+    "wizard": (scenario_wizard, True),
+}
+
+
+class Harness:
+    """Подключает dp из bot.py к заглушке API и временной базе, скармливает апдейты"""
+
+    def __init__(self, bot_module, api):
+        self.bm = bot_module
+        self.api = api
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._done = {}
+        self.latencies = defaultdict(list)  # сценарий -> [мс]
+        self.errors = 0
+        self.bm.dp.update.outer_middleware(self._completion_middleware)
+
+    async def _completion_middleware(self, handler, event, data):
+        # Регистрируется последним - выполняется в воркере update_executor
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            future = self._done.pop(event.update_id, None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def make_update(self, user_id, kind, payload):
+        chat = {"id": user_id, "type": "private"}
+        update = {"update_id": next(self._update_ids)}
+        if kind == "msg":
+            message = {"message_id": next(self._message_ids), "date": int(time.time()), "chat": chat,
+                       "from": self._user(user_id), "text": payload}
+            if payload.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(payload.split()[0])}]
+            update["message"] = message
+        else:
+            screen = {"message_id": self.api.last_message.get(user_id, 1), "date": int(time.time()), "chat": chat,
+                      "from": {"id": 1, "is_bot": True, "first_name": "BannerBot"}, "text": "screen"}
+            update["callback_query"] = {"id": str(update["update_id"]), "from": self._user(user_id),
+                                        "chat_instance": str(user_id), "message": screen, "data": payload}
+        return update
+
+    async def feed(self, raw, label):
+        from aiogram.types import Update
+
+        update = Update.model_validate(raw, context={"bot": self.bm.bot})
+        future = asyncio.get_running_loop().create_future()
+        self._done[update.update_id] = future
+        started = time.perf_counter()
+        await self.bm.dp.feed_update(self.bm.bot, update)
+        try:
+            finished = await asyncio.wait_for(future, UPDATE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._done.pop(update.update_id, None)
+            self.errors += 1
+            return
+        self.latencies[label].append((finished - started) * 1000)
+
+    async def run_user(self, user_id, names, rng, scale, deadline, iterations, think):
+        done = 0
+        while (iterations is None or done < iterations) and time.perf_counter() < deadline:
+            name = rng.choice(names)
+            for kind, payload in SCENARIOS[name][0](rng, scale):
+                await self.feed(self.make_update(user_id, kind, payload), name)
+                if think:
+                    await asyncio.sleep(think)
+            done += 1
+
+    async def replay_file(self, path, users):
+        """Записанные апдейты: порядок внутри чата сохраняется, чаты идут параллельно"""
+        by_chat = defaultdict(list)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    raw = json.loads(line)
+                    body = raw.get("message") or raw.get("callback_query") or {}
+                    by_chat[(body.get("from") or {}).get("id")].append(raw)
+
+        slots = asyncio.Semaphore(users)
+
+        async def run_chat(items):
+            async with slots:
+                for raw in items:
+                    raw = dict(raw, update_id=next(self._update_ids))
+                    await self.feed(raw, "recorded")
+
+        await asyncio.gather(*(run_chat(items) for items in by_chat.values()))
+
+
+async def run(scale="small", users=10, duration=30.0, iterations=None, scenarios=None,
+              updates_file=None, api_latency_ms=0.0, think_ms=0.0, seed=1, verbose=False):
+    workdir = tempfile.mkdtemp(prefix="bannerbot_replay_")
+    try:
+        # Копия лиги: мастер регистрации пишет в базу
+        db_path = os.path.join(workdir, "league.db")
+        shutil.copyfile(ensure_league(scale), db_path)
+
+        import database
+        database.DB_NAME = db_path
+        import bot as bm
+        from aiogram.client.telegram import TelegramAPIServer
+
+        # Лог каждого апдейта и предупреждения perf забивают вывод и сами стоят времени
+        logging.getLogger().setLevel(logging.INFO if verbose else logging.ERROR)
+        logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+        bm.sqlite_fsm.path = os.path.join(workdir, "fsm.db")
+        # Троттлинг рассчитан на живых людей, здесь он только исказит замер
+        bm.callback_throttle.rate = bm.callback_throttle.burst = 1e9
+
+        api = FakeBotAPI(api_latency_ms)
+        bm.session.api = TelegramAPIServer.from_base(await api.start())
+        harness = Harness(bm, api)
+
+        await bm.init_db()
+        await bm.dp.emit_startup(bot=bm.bot)
+        started = time.perf_counter()
+        try:
+            if updates_file:
+                await harness.replay_file(updates_file, users)
+            else:
+                names = scenarios or [n for n in SCENARIOS if n != "wizard"]
+                deadline = started + (duration if iterations is None else 1e9)
+                tasks = []
+                for i in range(users):
+                    admin_only = any(SCENARIOS[n][1] for n in names)
+                    user_id = (ADMIN_BASE_ID + i % SCALES[scale]["admins"]) if admin_only else USER_BASE_ID + i
+                    rng = random.Random(seed * 10_000 + i)
+                    tasks.append(harness.run_user(user_id, names, rng, scale, deadline, iterations, think_ms / 1000))
+                await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+        finally:
+            await bm.dp.emit_shutdown(bot=bm.bot)
+            await bm.session.close()
+            await api.stop()
+
+        return summarize(harness, api, elapsed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(harness, api, elapsed):
+    all_latencies = [x for values in harness.latencies.values() for x in values]
+
+    def describe(values):
+        return {
+            "updates": len(values),
+            "p50_ms": round(statistics.median(values), 2) if values else 0.0,
+            "p95_ms": round(_percentile(values, 95), 2),
+            "p99_ms": round(_percentile(values, 99), 2),
+            "max_ms": round(max(values), 2) if values else 0.0,
+        }
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "updates_per_s": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "errors": harness.errors,
+        "total": describe(all_latencies),
+        "scenarios": {name: describe(values) for name, values in harness.latencies.items()},
+        "api_calls": dict(api.calls.most_common()),
+    }
+
+
+def print_report(result):
+    print(f"{result['total']['updates']} апдейтов за {result['elapsed_s']} с: "
+          f"{result['updates_per_s']} апд/с, ошибок {result['errors']}")
+    print(f"\n{'сценарий':<12} {'апдейтов':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for name, r in [("ВСЕГО", result["total"])] + sorted(result["scenarios"].items()):
+        print(f"{name:<12} {r['updates']:>9} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['max_ms']:>9.2f}")
+    print("\nBot API: " + ", ".join(f"{k}={v}" for k, v in result["api_calls"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогон dp против заглушки Bot API")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--users", type=int, default=10, help="параллельных пользователей (чатов)")
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд на прогон")
+    parser.add_argument("--iterations", type=int, help="сценариев на пользователя вместо --duration")
+    parser.add_argument("--scenarios", help=f"через запятую из: {', '.join(SCENARIOS)}")
+    parser.add_argument("--updates", help="JSONL с записанными апдейтами вместо сценариев")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="задержка ответа заглушки API")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="пауза пользователя между действиями")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="не глушить логи бота")
+    args = parser.parse_args()
+
+    scenarios = [x.strip() for x in args.scenarios.split(",")] if args.scenarios else None
+    if scenarios and any(s not in SCENARIOS for s in scenarios):
+        parser.error(f"неизвестный сценарий; доступны: {', '.join(SCENARIOS)}")
+
+    result = asyncio.run(run(args.scale, args.users, args.duration, args.iterations, scenarios,
+                             args.updates, args.api_latency_ms, args.think_ms, verbose=args.verbose))
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,16 @@ import asyncio
 import logging
 import base64
 import json
-import math
 import os
 import datetime
+from collections import OrderedDict
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, FSInputFile
+from aiogram.filters import Command, CommandObject
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, FSInputFile, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramBadRequest
-from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import DeleteMessage, DeleteMessages, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, EditMessageText
 
 # --- ИМПОРТЫ ИЗ database.py ---
 from database import (
@@ -19,19 +20,40 @@ from database import (
     create_team, get_user_info, get_teams_paginated, get_team_by_id, get_team_by_tag,
     delete_team, update_team_field, check_team_exists, get_team_rank_alphabetical,
     create_tournament, check_tournament_exists, get_tournaments_paginated, get_tournament_by_id,
-    delete_tournament, update_tournament_field,
+    delete_tournament, update_tournament_field, get_tournament_choices,
     add_game_record, get_games_paginated,
     get_game_by_id, delete_game, update_game_field,
     get_all_roster_players_paginated, get_player_stats_and_rank, get_top_players_list,
     update_player_metadata, perform_player_transfer, update_player_nickname_in_roster,
-    add_team_to_tournament, get_tournament_participants, set_tournament_winner
+    add_team_to_tournament, get_tournament_participants, set_tournament_winner,
+    get_slow_queries, reset_slow_queries
 )
+import database
+
+from http_session import TunedAiohttpSession
+from callback_router import CallbackTrie
+from keyboard_cache import static_keyboard, dump_markup
+from player_metrics import expand_player_stats
+import game_import
+import exports
+from rendering import (
+    escape_md, escape_md_code, format_team_tag_md, format_team_name_and_tag_md, fmt_money,
+    format_game_stats, format_player_profile, format_tournament_info,
+)
+from update_executor import ChatSerialExecutor
+from callback_throttle import CallbackThrottleMiddleware
+from fsm_storage import SizeTrackingStorage, SQLiteStorage
+from perf import PerfRegistry
+import profiler
+from loop_monitor import LoopMonitor
+from db_maintenance import DBMaintenance
+from db_session import DBSessionMiddleware
 
 from states import (
     AdminTeamCreate, AdminAddAdmin, AdminAddOwner, AdminTeamEdit, 
     TeamListState, TournamentCreate, AdminTourEdit, GameRegister, 
     GameListState, TournamentNav, GameEditState, PlayerAdminState,
-    TourAddTeam, TourSetWinner
+    TourAddTeam, TourSetWinner, GameImportState
 )
 
 # --- КОНФИГ ---
@@ -39,37 +61,237 @@ TOKEN = "8405508314:AAG5mh-RlaLRnTc5Ss2pLGkwcssFbsTbgJY"
 
 logging.basicConfig(level=logging.INFO)
 
-# Увеличиваем тайм-аут
-session = AiohttpSession(timeout=60)
+# Пул соединений, раздельные тайм-ауты для загрузок и ретраи (см. http_session.py)
+session = TunedAiohttpSession()
 bot = Bot(token=TOKEN, session=session)
-dp = Dispatcher()
+# Хранилище FSM: SQLite с кэшем в памяти и учетом размера данных (см. fsm_storage.py)
+sqlite_fsm = SQLiteStorage()
+fsm_storage = SizeTrackingStorage(sqlite_fsm)
+dp = Dispatcher(storage=fsm_storage)
+
+# Callback-хендлеры маршрутизируются префиксным деревом (см. callback_router.py).
+# Регистрируется первым, чтобы callback_data из дерева не перебирала остальные фильтры.
+callbacks = CallbackTrie()
+callbacks.setup(dp)
+
+# Троттлинг нажатий и отбрасывание устаревших кликов (до update_executor!)
+callback_throttle = CallbackThrottleMiddleware(is_navigation=callbacks.is_navigation)
+callback_throttle.setup(dp)
+
+# Ограниченный пул обработки апдейтов: внутри чата строго по очереди (см. update_executor.py)
+update_executor = ChatSerialExecutor()
+update_executor.setup(dp)
+sqlite_fsm.setup(dp)
+
+# Латентность хендлеров, SQL и Bot API (см. perf.py). Строго после update_executor.
+# Метрики Prometheus отдаются, если задан PERF_METRICS_PORT.
+perf = PerfRegistry(route_key=callbacks.route_key)
+perf.setup(dp, bot)
+perf.add_source("executor", lambda: {**update_executor.stats, "pending": update_executor.pending})
+perf.add_source("throttle", lambda: callback_throttle.stats)
+perf.add_source("session", lambda: session.stats)
+perf.add_source("fsm", fsm_storage.summary)
+perf.add_source("fsm_sqlite", lambda: sqlite_fsm.stats)
+
+# Одно соединение и один снимок базы на апдейт (см. db_session.py). После perf:
+# соединение открывается уже с контекстом замера апдейта.
+db_session = DBSessionMiddleware()
+db_session.setup(dp)
+perf.add_source("db_session", db_session.summary)
+
+# Лаг цикла событий и дамп стека при блокировке синхронным кодом (см. loop_monitor.py)
+loop_monitor = LoopMonitor()
+loop_monitor.setup(dp)
+perf.add_source("loop", loop_monitor.summary)
+
+# Очередь записи с групповым коммитом (см. database.write): дописываем до финального чекпоинта db_maintenance
+dp.shutdown.register(database.close_writer)
+perf.add_source("writer", database.writer_summary)
+
+# Чекпоинты WAL, PRAGMA optimize и incremental_vacuum в тихие периоды (см. db_maintenance.py)
+db_maintenance = DBMaintenance(activity=lambda: update_executor.stats["processed"])
+db_maintenance.setup(dp)
+perf.add_source("db", db_maintenance.summary)
+PERF_METRICS_PORT = os.getenv("PERF_METRICS_PORT")
+if PERF_METRICS_PORT:
+    perf.setup_server(dp, int(PERF_METRICS_PORT))
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
-def escape_md(text):
-    if text is None: return ""
-    text = str(text)
-    # Экранируем все спецсимволы MarkdownV2
-    chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in chars:
-        text = text.replace(char, f"\\{char}")
-    return text
+# --- КЭШ ОТРИСОВАННЫХ СООБЩЕНИЙ ---
+# (chat_id, message_id) -> хэш последнего отправленного текста и клавиатуры.
+# Идентичные правки не отправляются, а частые правки одного сообщения
+# склеиваются: пока одна выполняется, в очереди остается только последняя.
+RENDER_CACHE_LIMIT = 5000
+_rendered_messages = OrderedDict()
+_edits_in_flight = set()
+_pending_edits = {}
+
+
+def _render_hash(text, reply_markup=None, parse_mode=None):
+    return hash((text, dump_markup(reply_markup), parse_mode))
+
+
+def _remember_render(chat_id, message_id, render_hash):
+    key = (chat_id, message_id)
+    _rendered_messages[key] = render_hash
+    _rendered_messages.move_to_end(key)
+    while len(_rendered_messages) > RENDER_CACHE_LIMIT:
+        _rendered_messages.popitem(last=False)
+
+
+class RenderCacheInvalidation(BaseRequestMiddleware):
+    """
+    Любая правка или удаление сообщения мимо coalesced_edit_text (message.edit_text
+    в хендлерах, отправка фото, удаление) сбрасывает запись кэша: иначе следующая
+    правка на «тот же» экран была бы пропущена, а на экране осталось бы чужое.
+    coalesced_edit_text записывает свой хэш уже после ответа, поверх сброса.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, (EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, DeleteMessage)):
+            if method.message_id is not None:
+                _rendered_messages.pop((method.chat_id, method.message_id), None)
+        elif isinstance(method, DeleteMessages):
+            for message_id in method.message_ids:
+                _rendered_messages.pop((method.chat_id, message_id), None)
+        return await make_request(bot, method)
+
+
+bot.session.middleware(RenderCacheInvalidation())
+
+
+def is_not_modified_error(e: Exception) -> bool:
+    return "message is not modified" in str(e)
+
+
+async def coalesced_edit_text(chat_id, message_id, text, reply_markup=None, parse_mode="MarkdownV2", fallback=None):
+    """Редактирует сообщение без лишних запросов.
+
+    Пропускает правку, если сообщение уже показывает этот текст, и склеивает
+    параллельные правки одного сообщения. Если редактирование невозможно,
+    вызывает fallback(text, reply_markup, parse_mode) с самым свежим состоянием.
+    Возвращает ID сообщения, которое показывает результат.
+    """
+    key = (chat_id, message_id)
+    payload = (text, reply_markup, parse_mode, _render_hash(text, reply_markup, parse_mode))
+    if _rendered_messages.get(key) == payload[3]:
+        return message_id
+    if key in _edits_in_flight:
+        _pending_edits[key] = payload
+        return message_id
+
+    _edits_in_flight.add(key)
+    try:
+        while payload:
+            p_text, p_markup, p_mode, p_hash = payload
+            if _rendered_messages.get(key) != p_hash:
+                try:
+                    await bot.edit_message_text(text=p_text, chat_id=chat_id, message_id=message_id, reply_markup=p_markup, parse_mode=p_mode)
+                except TelegramAPIError as e:
+                    # Любая ошибка, кроме «не изменилось» (в т.ч. сетевая), - отправляем заново
+                    if not is_not_modified_error(e):
+                        _rendered_messages.pop(key, None)
+                        # Отправляем самое свежее состояние, а не то, что не удалось применить
+                        p_text, p_markup, p_mode, p_hash = _pending_edits.pop(key, payload)
+                        if fallback is None:
+                            raise
+                        msg = await fallback(p_text, p_markup, p_mode)
+                        if msg is None:
+                            return None
+                        _remember_render(chat_id, msg.message_id, p_hash)
+                        return msg.message_id
+                _remember_render(chat_id, message_id, p_hash)
+            payload = _pending_edits.pop(key, None)
+    finally:
+        _edits_in_flight.discard(key)
+    return message_id
 
-def escape_md_code(text):
-    if text is None: return ""
-    text = str(text)
-    return text.replace('\\', '\\\\').replace('`', '\\`')
 
 async def safe_edit_or_send(callback, text, reply_markup=None, parse_mode="MarkdownV2"):
     """Безопасно редактирует сообщение или отправляет новое с proper error handling"""
-    try:
-        await callback.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
-    except TelegramBadRequest:
+    async def resend(text, reply_markup, parse_mode):
         try:
             await callback.message.delete()
         except:
             pass
-        await callback.message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        return await callback.message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    return await coalesced_edit_text(
+        callback.message.chat.id, callback.message.message_id,
+        text, reply_markup=reply_markup, parse_mode=parse_mode, fallback=resend,
+    )
+
+# --- НАВИГАЦИЯ С ФОТО ---
+# Ключ картинки -> (file_id, file_unique_id) после первой загрузки,
+# чтобы не загружать один и тот же логотип при каждом переходе.
+# Ключ включает хэш логотипа, поэтому старые версии вытесняются по LRU.
+PHOTO_CACHE_LIMIT = 2000
+_photo_file_ids = OrderedDict()
+
+
+def _photo_ids(key):
+    cached = _photo_file_ids.get(key)
+    if cached is not None:
+        _photo_file_ids.move_to_end(key)
+    return cached
+
+
+def cached_photo(key, factory):
+    """Возвращает file_id уже загруженной картинки или новый файл из factory()"""
+    cached = _photo_ids(key)
+    return cached[0] if cached else factory()
+
+
+def _remember_photo(key, msg):
+    if key is not None and isinstance(msg, types.Message) and msg.photo:
+        _photo_file_ids[key] = (msg.photo[-1].file_id, msg.photo[-1].file_unique_id)
+        _photo_file_ids.move_to_end(key)
+        while len(_photo_file_ids) > PHOTO_CACHE_LIMIT:
+            _photo_file_ids.popitem(last=False)
+
+
+async def navigate_screen(callback, text, reply_markup=None, photo=None, photo_key=None, parse_mode="MarkdownV2"):
+    """Показывает экран на месте текущего сообщения.
+
+    Фото -> фото: edit_message_media (или только подпись, если картинка та же).
+    Текст -> текст: обычное редактирование. Удаление и повторная отправка
+    остаются только для смены типа сообщения (текст <-> фото).
+    """
+    message = callback.message
+    has_photo = bool(getattr(message, 'photo', None))
+
+    if photo is None and not has_photo:
+        return await safe_edit_or_send(callback, text, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    if photo is not None and has_photo:
+        cached = _photo_ids(photo_key)
+        try:
+            if cached and message.photo[-1].file_unique_id == cached[1]:
+                await message.edit_caption(caption=text, reply_markup=reply_markup, parse_mode=parse_mode)
+            else:
+                edited = await message.edit_media(
+                    InputMediaPhoto(media=photo, caption=text, parse_mode=parse_mode),
+                    reply_markup=reply_markup,
+                )
+                _remember_photo(photo_key, edited)
+            return message.message_id
+        except TelegramBadRequest as e:
+            if is_not_modified_error(e):
+                return message.message_id
+
+    try:
+        await message.delete()
+    except:
+        pass
+    if photo is None:
+        msg = await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        _remember_render(msg.chat.id, msg.message_id, _render_hash(text, reply_markup, parse_mode))
+    else:
+        msg = await message.answer_photo(photo, caption=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        _remember_photo(photo_key, msg)
+    return msg.message_id
+
 
 async def safe_delete_message(chat_id, message_id):
     """Безопасно удаляет сообщение с обработкой ошибок"""
@@ -79,16 +301,6 @@ async def safe_delete_message(chat_id, message_id):
         pass
 
 
-def format_team_tag_md(tag: str) -> str:
-    if not tag:
-        return "\\[\\]"
-    return f"\\[{escape_md(tag)}\\]"
-
-
-def format_team_name_and_tag_md(name: str, tag: str) -> str:
-    return f"{escape_md(name)} {format_team_tag_md(tag)}"
-
-
 async def try_delete_user_message(message: types.Message):
     try:
         await message.delete()
@@ -102,22 +314,19 @@ async def fsm_edit_or_send(message: types.Message, state: FSMContext, text: str,
     chat_id = message.chat.id
     msg_id = data.get('last_bot_msg_id')
 
+    async def send_new(text, reply_markup, parse_mode):
+        msg = await bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
+        await state.update_data(last_bot_msg_id=msg.message_id, chat_id=chat_id)
+        return msg
+
     if msg_id:
-        try:
-            await bot.edit_message_text(
-                text=text,
-                chat_id=chat_id,
-                message_id=msg_id,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode,
-            )
+        shown_id = await coalesced_edit_text(chat_id, msg_id, text, reply_markup=reply_markup, parse_mode=parse_mode, fallback=send_new)
+        if shown_id == msg_id:
             await state.update_data(chat_id=chat_id)
-            return msg_id
-        except TelegramBadRequest:
-            pass
+        return shown_id
 
-    msg = await bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
-    await state.update_data(last_bot_msg_id=msg.message_id, chat_id=chat_id)
+    msg = await send_new(text, reply_markup, parse_mode)
+    _remember_render(chat_id, msg.message_id, _render_hash(text, reply_markup, parse_mode))
     return msg.message_id
 
 
@@ -129,92 +338,13 @@ async def delete_prev_bot_msg(state: FSMContext):
     if msg_id and chat_id:
         await safe_delete_message(chat_id, msg_id)
 
-def calculate_player_metrics(k, a, d, rounds):
-    if rounds == 0: rounds = 1
-    kd = k / d if d > 0 else k
-    kpr = k / rounds
-    helps = a / rounds
-    diff = k - d
-    svr = (rounds - d) / rounds
-    apr = a / rounds
-    impact = 2.13 * kpr + 0.42 * apr - 0.41
-    if impact < 0: impact = 0
-    x = (kd + impact * 1.5) / 2.5
-    if x < 0: x = 0
-    rating = math.sqrt(x) if x > 0 else 0.0
-
-    return {
-        "K": k, "A": a, "D": d,
-        "+/-": diff,
-        "KPR": round(kpr, 2),
-        "DPR": round(d / rounds, 2),
-        "SVR": round(svr, 2),
-        "IMPACT": round(impact, 2),
-        "RATING": round(rating, 2),
-        "KD": round(kd, 2),
-        "HELPS": a 
-    }
-
-def format_game_stats(game, tournament_season=""):
-    try:
-        stats = json.loads(game['stats_json'])
-    except:
-        return "⚠️ Ошибка загрузки статистики"
-
-    date_safe = escape_md_code(game['game_date'])
-    map_safe = escape_md_code(game['map_name'])
-    season_safe = escape_md(tournament_season)
-    
-    txt = f"⚔️ *Матч ID:* `{escape_md(game['id'])}`\n"
-    if season_safe:
-        txt += f"❄️ *Сезон:* {season_safe}\n"
-    txt += f"📅 `{date_safe}` \\| 🗺 `{map_safe}`\n"
-    txt += f"🏆 Счет: *{escape_md(game['score_t1'])} : {escape_md(game['score_t2'])}*\n"
-
-    winner_line = ""
-    try:
-        s1 = int(game.get('score_t1', 0))
-        s2 = int(game.get('score_t2', 0))
-    except Exception:
-        s1 = 0
-        s2 = 0
-
-    if s1 > s2:
-        winner_line = f"🏆 *Победитель:* {format_team_tag_md(game.get('team1_tag', ''))}\n"
-    elif s2 > s1:
-        winner_line = f"🏆 *Победитель:* {format_team_tag_md(game.get('team2_tag', ''))}\n"
-    else:
-        winner_line = "🏆 *Победитель:* Ничья\n"
-
-    txt += winner_line + "\n"
-
-    def draw_team_stats(tag, players):
-        res = f"🚩 *{format_team_tag_md(tag)}*\n"
-        res += "```\n"
-        res += f"{'Player':<10} {'K':>2} {'A':>2} {'D':>2} {'KD':>4} {'RTG':>4}\n"
-        res += "-" * 32 + "\n"
-
-        for p in players:
-            name = escape_md_code(p.get('nickname', 'Player')[:10])
-            k = p.get('K', 0)
-            a = p.get('A', 0)
-            d = p.get('D', 0)
-            kd = p.get('KD', 0.0)
-            rtg = p.get('RATING', 0.0)
-            res += f"{name:<10} {k:>2} {a:>2} {d:>2} {kd:>4} {rtg:>4}\n"
-
-        res += "```\n"
-        return res
-
-    for team_tag, players_list in stats.items():
-        txt += draw_team_stats(team_tag, players_list)
-
-    return txt
-
 # --- КЛАВИАТУРЫ ---
 
 async def get_main_kb(user_id):
-    is_admin = await check_is_admin(user_id)
+    return _build_main_kb(await check_is_admin(user_id))
+
+@static_keyboard
+def _build_main_kb(is_admin):
     kb = [
         [InlineKeyboardButton(text="🎨 Создать баннер", callback_data="nav_create_banner")],
         [
@@ -231,6 +361,7 @@ async def get_main_kb(user_id):
         kb.append([InlineKeyboardButton(text="⚙️ Админка", callback_data="nav_admin")])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@static_keyboard
 def get_sub_teams_kb(is_admin):
     kb = [
         [InlineKeyboardButton(text="📋 Список команд", callback_data="nav_teams_list")]
@@ -240,6 +371,7 @@ def get_sub_teams_kb(is_admin):
     kb.append([InlineKeyboardButton(text="🔙 Назад", callback_data="nav_main")])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@static_keyboard
 def get_sub_tours_kb(is_admin):
     kb = [
         [InlineKeyboardButton(text="📋 Список турниров", callback_data="nav_tournaments")]
@@ -249,6 +381,7 @@ def get_sub_tours_kb(is_admin):
     kb.append([InlineKeyboardButton(text="🔙 Назад", callback_data="nav_main")])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@static_keyboard
 def get_games_main_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➕ Добавить игру", callback_data="game_add_init")],
@@ -256,19 +389,25 @@ def get_games_main_kb():
         [InlineKeyboardButton(text="🔙 В главное меню", callback_data="nav_main")]
     ])
 
+@static_keyboard
 def get_back_kb(): return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 В главное меню", callback_data="nav_main")]])
 
+@static_keyboard
 def get_back_to_teams_kb():
     return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data="menu_teams_root")]])
 
+@static_keyboard
 def get_back_to_tours_kb():
     return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data="menu_tours_root")]])
 
+@static_keyboard
 def get_back_to_view_kb(prefix, view_id):
     return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔙 Назад", callback_data=f"{prefix}_{view_id}")]])
 
+@static_keyboard
 def get_yes_no_kb(prefix): return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Да", callback_data=f"{prefix}_yes"), InlineKeyboardButton(text="Нет", callback_data=f"{prefix}_no")]])
 
+@static_keyboard
 def get_currency_kb(prefix):
     curs = ["RUB", "EUR", "USD", "UAH", "G", "USDT", "TON"]
     kb = []
@@ -285,11 +424,19 @@ def get_currency_kb(prefix):
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
 
+@static_keyboard
+def get_bulk_stats_kb():
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="📋 Вся статистика одним сообщением", callback_data="game_bulk_stats")]]
+    )
+
+@static_keyboard
 def get_prize_finish_kb():
     return InlineKeyboardMarkup(
         inline_keyboard=[[InlineKeyboardButton(text="✅ Завершить", callback_data="prize_finish")]]
     )
 
+@static_keyboard
 def get_format_kb():
     formats = ["5x5", "4x4", "3x3", "2x2", "1x1"]
     kb = []
@@ -391,6 +538,7 @@ def get_all_roster_players_kb(players, page, total_pages):
     kb.append([InlineKeyboardButton(text="🔙 В меню", callback_data="nav_main")])
     return InlineKeyboardMarkup(inline_keyboard=kb)
 
+@static_keyboard
 def get_map_select_kb(mode="reg", game_id=None):
     maps = [
         ("🏜️ Sandstone", "Sandstone"),
@@ -428,7 +576,7 @@ async def cmd_start(message: types.Message):
     kb = await get_main_kb(message.from_user.id)
     await message.answer(f"👋 Привет, *{escape_md(message.from_user.first_name)}*\\!", reply_markup=kb, parse_mode="MarkdownV2")
 
-@dp.callback_query(F.data == "nav_main")
+@callbacks.exact("nav_main")
 async def nav_main(callback: types.CallbackQuery, state: FSMContext):
     await state.clear()
     kb = await get_main_kb(callback.from_user.id)
@@ -441,7 +589,7 @@ async def nav_main(callback: types.CallbackQuery, state: FSMContext):
             pass
         await callback.message.answer("🏠 *Главное меню:*", reply_markup=kb, parse_mode="MarkdownV2")
 
-@dp.callback_query(F.data == "nav_profile")
+@callbacks.exact("nav_profile", nav=True)
 async def nav_profile(callback: types.CallbackQuery):
     u = await get_user_info(callback.from_user.id)
     r_map = {0: "Пользователь 👤", 1: "Администратор 👮‍♂️", 2: "Владелец 👑"}
@@ -454,13 +602,13 @@ async def nav_profile(callback: types.CallbackQuery):
 #    НОВЫЕ ПРОМЕЖУТОЧНЫЕ МЕНЮ
 # ==========================================
 
-@dp.callback_query(F.data == "menu_teams_root")
+@callbacks.exact("menu_teams_root", nav=True)
 async def menu_teams_root(callback: types.CallbackQuery):
     is_admin = await check_is_admin(callback.from_user.id)
     kb = get_sub_teams_kb(is_admin)
     await safe_edit_or_send(callback, "🛡️ *Управление командами*\nВыберите действие:", reply_markup=kb)
 
-@dp.callback_query(F.data == "menu_tours_root")
+@callbacks.exact("menu_tours_root", nav=True)
 async def menu_tours_root(callback: types.CallbackQuery):
     is_admin = await check_is_admin(callback.from_user.id)
     kb = get_sub_tours_kb(is_admin)
@@ -470,13 +618,12 @@ async def menu_tours_root(callback: types.CallbackQuery):
 #    СПИСОК ИГРОКОВ (ИЗ СОСТАВОВ)
 # ==========================================
 
-@dp.callback_query(F.data == "nav_all_players_list")
+@callbacks.exact("nav_all_players_list", nav=True)
 async def nav_all_players_start(callback: types.CallbackQuery):
     await show_all_roster_players_page(callback, 0)
 
-@dp.callback_query(F.data.startswith("roster_page_"))
-async def nav_roster_players_pagination(callback: types.CallbackQuery):
-    page = int(callback.data.split("_")[-1])
+@callbacks.prefix("roster_page_", nav=True, page=int)
+async def nav_roster_players_pagination(callback: types.CallbackQuery, page: int):
     await show_all_roster_players_page(callback, page)
 
 async def show_all_roster_players_page(callback: types.CallbackQuery, page):
@@ -487,54 +634,10 @@ async def show_all_roster_players_page(callback: types.CallbackQuery, page):
     await safe_edit_or_send(callback, text, reply_markup=kb)
 
 # --- ПРОСМОТР ПРОФИЛЯ ИГРОКА ---
-@dp.callback_query(F.data.startswith("roster_view_"))
-async def view_roster_player_profile(callback: types.CallbackQuery):
-    nickname = callback.data.replace("roster_view_", "")
-    
+@callbacks.prefix("roster_view_", nav=True, nickname=str)
+async def view_roster_player_profile(callback: types.CallbackQuery, nickname: str):
     stats = await get_player_stats_and_rank(nickname)
-    
-    full_name = stats['last_name'] + " \"" + stats['nickname'] + "\" " + stats['first_name']
-    header = f"👤 *Игрок:* {escape_md(full_name)}\n"
-    
-    team_txt = f"🛡️ *Команда:* {escape_md(stats['current_team'])}\n"
-    rank_txt = f"🏆 *Ранг:* \\#{escape_md(stats['rank'])} \\(Очки: {escape_md(stats['score'])}\\)\n"
-    
-    main_stats = (
-        f"📊 *Статистика:*\n"
-        f"🔫 K: {stats['kills']} \\| A: {stats['assists']} \\| D: {stats['deaths']}\n"
-        f"➕/➖: {escape_md(stats['diff'])} \\| Helps: {escape_md(stats['helps'])}\n"
-        f"💀 KD: {escape_md(stats['kd'])}\n"
-        f"🔫 KPR: {escape_md(stats['kpr'])} \\| 🛡 DPR: {escape_md(stats['dpr'])}\n"
-        f"❤️ SVR: {escape_md(stats['svr'])}\n"
-        f"💥 IMPACT: {escape_md(stats['impact'])}\n"
-        f"⭐ RATING: {escape_md(stats['avg_rating'])}\n"
-    )
-    
-    last_games_txt = "\n📅 *Последние 3 игры:*\n"
-    if stats['last_3_games']:
-        for g in stats['last_3_games']:
-            last_games_txt += f"▫️ {escape_md(g)}\n"
-    else:
-        last_games_txt += "▫️ Нет сыгранных игр\n"
-        
-    achievements_txt = "\n🏅 *Достижения:*\n"
-    if stats['achievements']:
-        for ach in stats['achievements']:
-            achievements_txt += f"{escape_md(ach)}\n"
-    else:
-        achievements_txt += "▫️ Нет\n"
-
-    transfers_txt = "\n🔄 *История трансферов:*\n"
-    if stats['transfers']:
-        for t in stats['transfers']:
-            old = escape_md(t['old_team'])
-            new = escape_md(t['new_team'])
-            date = escape_md(t['date'])
-            transfers_txt += f"▫️ {date}: {old} ➡️ {new}\n"
-    else:
-        transfers_txt += "▫️ Пусто\n"
-        
-    full_text = header + team_txt + rank_txt + "\n" + main_stats + last_games_txt + achievements_txt + transfers_txt
+    full_text = format_player_profile(stats)
     
     kb_rows = []
     if await check_is_admin(callback.from_user.id):
@@ -547,20 +650,15 @@ async def view_roster_player_profile(callback: types.CallbackQuery):
     kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
     
     photo_path = "assets/photo.png"
-    
-    try: await callback.message.delete()
-    except: pass
-    
+    photo = None
     if os.path.exists(photo_path):
-        photo = FSInputFile(photo_path)
-        await callback.message.answer_photo(photo, caption=full_text, reply_markup=kb, parse_mode="MarkdownV2")
-    else:
-        await callback.message.answer(full_text, reply_markup=kb, parse_mode="MarkdownV2")
+        photo = cached_photo(photo_path, lambda: FSInputFile(photo_path))
+
+    await navigate_screen(callback, full_text, reply_markup=kb, photo=photo, photo_key=photo_path)
 
 # --- РЕДАКТИРОВАНИЕ ИГРОКА И ТРАНСФЕРЫ ---
-@dp.callback_query(F.data.startswith("adm_p_name_"))
-async def admin_edit_player_name(callback: types.CallbackQuery, state: FSMContext):
-    nick = callback.data.replace("adm_p_name_", "")
+@callbacks.prefix("adm_p_name_", nick=str)
+async def admin_edit_player_name(callback: types.CallbackQuery, state: FSMContext, nick: str):
     await state.update_data(target_player_nick=nick)
     msg = await callback.message.answer("✏️ Введите новое *Имя* и *Фамилию* через пробел \\(например `Ivan Ivanov`\\):", parse_mode="MarkdownV2")
     await state.update_data(last_bot_msg_id=msg.message_id, chat_id=callback.message.chat.id)
@@ -582,7 +680,7 @@ async def admin_save_player_name(message: types.Message, state: FSMContext):
     await update_player_metadata(nick, first_name=first_name, last_name=last_name)
     
     fake_cb = types.CallbackQuery(id='0', from_user=message.from_user, chat_instance='0', message=message, data=f"roster_view_{nick}")
-    await view_roster_player_profile(fake_cb)
+    await view_roster_player_profile(fake_cb, nick)
     
     cnf = await message.answer("✅ Данные обновлены!")
     await asyncio.sleep(2)
@@ -590,9 +688,8 @@ async def admin_save_player_name(message: types.Message, state: FSMContext):
     except: pass
     await state.clear()
 
-@dp.callback_query(F.data.startswith("adm_p_nick_"))
-async def admin_edit_player_nick(callback: types.CallbackQuery, state: FSMContext):
-    nick = callback.data.replace("adm_p_nick_", "")
+@callbacks.prefix("adm_p_nick_", nick=str)
+async def admin_edit_player_nick(callback: types.CallbackQuery, state: FSMContext, nick: str):
     await state.update_data(target_player_nick=nick)
     msg = await callback.message.answer("✏️ Введите новый *Никнейм* \\(Внимание: статистика старого ника останется привязанной к старому имени в истории игр\\):", parse_mode="MarkdownV2")
     await state.update_data(last_bot_msg_id=msg.message_id, chat_id=callback.message.chat.id)
@@ -611,7 +708,7 @@ async def admin_save_player_nick(message: types.Message, state: FSMContext):
     await update_player_nickname_in_roster(old_nick, new_nick)
     
     fake_cb = types.CallbackQuery(id='0', from_user=message.from_user, chat_instance='0', message=message, data=f"roster_view_{new_nick}")
-    await view_roster_player_profile(fake_cb)
+    await view_roster_player_profile(fake_cb, new_nick)
     
     cnf = await message.answer("✅ Никнейм обновлен в составах!")
     await asyncio.sleep(2)
@@ -619,9 +716,8 @@ async def admin_save_player_nick(message: types.Message, state: FSMContext):
     except: pass
     await state.clear()
 
-@dp.callback_query(F.data.startswith("adm_p_trans_"))
-async def admin_transfer_start(callback: types.CallbackQuery, state: FSMContext):
-    nick = callback.data.replace("adm_p_trans_", "")
+@callbacks.prefix("adm_p_trans_", nick=str)
+async def admin_transfer_start(callback: types.CallbackQuery, state: FSMContext, nick: str):
     await state.update_data(target_player_nick=nick)
     
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -635,7 +731,7 @@ async def admin_transfer_start(callback: types.CallbackQuery, state: FSMContext)
         await safe_delete_message(callback.message.chat.id, callback.message.message_id)
         await callback.message.answer("🔄 Выберите тип трансфера:", reply_markup=kb)
 
-@dp.callback_query(F.data == "trans_fft")
+@callbacks.exact("trans_fft")
 async def admin_transfer_fft(callback: types.CallbackQuery, state: FSMContext):
     data = await state.get_data()
     nick = data['target_player_nick']
@@ -659,11 +755,11 @@ async def admin_transfer_fft(callback: types.CallbackQuery, state: FSMContext):
     if success:
         await callback.answer("Успешно!")
         fake_cb = types.CallbackQuery(id='0', from_user=callback.from_user, chat_instance='0', message=callback.message, data=f"roster_view_{nick}")
-        await view_roster_player_profile(fake_cb)
+        await view_roster_player_profile(fake_cb, nick)
     else:
         await callback.answer(f"Ошибка: {msg}", show_alert=True)
 
-@dp.callback_query(F.data == "trans_team_select")
+@callbacks.exact("trans_team_select")
 async def admin_transfer_select_team(callback: types.CallbackQuery, state: FSMContext):
     await show_transfer_teams_page(callback, 0)
     await state.set_state(PlayerAdminState.selecting_transfer_team)
@@ -688,14 +784,12 @@ async def show_transfer_teams_page(callback: types.CallbackQuery, page):
         await safe_delete_message(callback.message.chat.id, callback.message.message_id)
         await callback.message.answer("Выберите новую команду:", reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
 
-@dp.callback_query(F.data.startswith("trans_page_"))
-async def admin_transfer_pagination(callback: types.CallbackQuery):
-    page = int(callback.data.split("_")[-1])
+@callbacks.prefix("trans_page_", nav=True, page=int)
+async def admin_transfer_pagination(callback: types.CallbackQuery, page: int):
     await show_transfer_teams_page(callback, page)
 
-@dp.callback_query(F.data.startswith("do_trans_"))
-async def admin_transfer_execute(callback: types.CallbackQuery, state: FSMContext):
-    new_team_id = int(callback.data.split("_")[-1])
+@callbacks.prefix("do_trans_", new_team_id=int)
+async def admin_transfer_execute(callback: types.CallbackQuery, state: FSMContext, new_team_id: int):
     data = await state.get_data()
     nick = data['target_player_nick']
     
@@ -712,17 +806,14 @@ async def admin_transfer_execute(callback: types.CallbackQuery, state: FSMContex
     if success:
         await callback.answer("Трансфер успешен!")
         fake_cb = types.CallbackQuery(id='0', from_user=callback.from_user, chat_instance='0', message=callback.message, data=f"roster_view_{nick}")
-        await view_roster_player_profile(fake_cb)
+        await view_roster_player_profile(fake_cb, nick)
         await state.clear()
     else:
         await callback.answer(f"Ошибка: {msg}", show_alert=True)
 
 # --- ТОП ИГРОКОВ (С ПЛЕЙСХОЛДЕРАМИ ДО 100) ---
-@dp.callback_query(F.data.startswith("roster_top_100_"))
-async def show_top_players(callback: types.CallbackQuery):
-    parts = callback.data.split("_")
-    page = int(parts[-1])
-    
+@callbacks.prefix("roster_top_100_", nav=True, page=int)
+async def show_top_players(callback: types.CallbackQuery, page: int):
     top_100 = await get_top_players_list(100)
     
     PAGE_SIZE = 10
@@ -766,7 +857,7 @@ async def show_top_players(callback: types.CallbackQuery):
 #    АДМИНКА: ПЕРСОНАЛ
 # ==========================================
 
-@dp.callback_query(F.data == "nav_admin")
+@callbacks.exact("nav_admin", nav=True)
 async def nav_admin(callback: types.CallbackQuery):
     if not await check_is_admin(callback.from_user.id): return
     is_owner = await check_is_owner(callback.from_user.id)
@@ -778,10 +869,9 @@ async def nav_admin(callback: types.CallbackQuery):
     kb_rows.append([InlineKeyboardButton(text="🔙 В меню", callback_data="nav_main")])
     await safe_edit_or_send(callback, "⚙️ *Админка*", reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows))
 
-@dp.callback_query(F.data.startswith("admin_add_role_"))
-async def start_add_any_admin(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("admin_add_role_", role_level=int)
+async def start_add_any_admin(callback: types.CallbackQuery, state: FSMContext, role_level: int):
     if not await check_is_owner(callback.from_user.id): return
-    role_level = int(callback.data.split("_")[-1])
     role_name = "Админа" if role_level == 1 else "Владельца"
     await safe_edit_or_send(callback, f"✍️ Введите *Username* нового {role_name}:", reply_markup=get_back_kb())
     if role_level == 1: await state.set_state(AdminAddAdmin.waiting_for_username)
@@ -799,22 +889,22 @@ async def process_add_admin_lvl2(message: types.Message, state: FSMContext):
     await message.answer(f"✅ Пользователь *{escape_md(t)}* теперь Владелец\\.", reply_markup=await get_main_kb(message.from_user.id), parse_mode="MarkdownV2")
     await state.clear()
 
-@dp.callback_query(F.data == "admin_list_start")
+@callbacks.exact("admin_list_start", nav=True)
 async def admin_list_start(callback: types.CallbackQuery):
     await show_admins_page(callback, 0)
 
-@dp.callback_query(F.data.startswith("admin_page_"))
-async def admin_list_pagination(callback: types.CallbackQuery):
-    await show_admins_page(callback, int(callback.data.split("_")[-1]))
+@callbacks.prefix("admin_page_", nav=True, page=int)
+async def admin_list_pagination(callback: types.CallbackQuery, page: int):
+    await show_admins_page(callback, page)
 
 async def show_admins_page(callback: types.CallbackQuery, page):
     admins, pages, count = await get_admins_paginated(page, 5)
     text = f"👥 *Список персонала* \\(Всего: {count}\\)"
     await safe_edit_or_send(callback, text, reply_markup=get_admins_carousel_kb(admins, page, pages))
 
-@dp.callback_query(F.data.startswith("view_admin_"))
-async def view_specific_admin(callback: types.CallbackQuery):
-    target_id = int(callback.data.split("_")[-1]); viewer_id = callback.from_user.id
+@callbacks.prefix("view_admin_", nav=True, target_id=int)
+async def view_specific_admin(callback: types.CallbackQuery, target_id: int):
+    viewer_id = callback.from_user.id
     target_user = await get_user_by_db_id(target_id)
     if not target_user: await callback.answer("Пользователь не найден", show_alert=True); return
     is_viewer_owner = await check_is_owner(viewer_id)
@@ -827,11 +917,10 @@ async def view_specific_admin(callback: types.CallbackQuery):
     kb_rows.append([InlineKeyboardButton(text="🔙 Назад к списку", callback_data="admin_list_start")])
     await safe_edit_or_send(callback, info, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows))
 
-@dp.callback_query(F.data.startswith("del_admin_confirm_"))
-async def delete_admin_handler(callback: types.CallbackQuery):
+@callbacks.prefix("del_admin_confirm_", target_id=int)
+async def delete_admin_handler(callback: types.CallbackQuery, target_id: int):
     if not await check_is_owner(callback.from_user.id):
         await callback.answer("❌ У вас нет прав!", show_alert=True); return
-    target_id = int(callback.data.split("_")[-1])
     await remove_admin_role(target_id)
     await callback.answer("✅ Сотрудник разжалован!", show_alert=True)
     await admin_list_start(callback)
@@ -840,7 +929,7 @@ async def delete_admin_handler(callback: types.CallbackQuery):
 #    АДМИНКА: КОМАНДЫ (СОЗДАНИЕ И РЕДАКТИРОВАНИЕ)
 # ==========================================
 
-@dp.callback_query(F.data == "admin_create_team")
+@callbacks.exact("admin_create_team")
 async def admin_team_start(callback: types.CallbackQuery, state: FSMContext):
     if not await check_is_admin(callback.from_user.id): return
     msg = await callback.message.edit_text("⚡ *Создание команды*\n\n1️⃣ Введите название команды:", reply_markup=get_back_to_teams_kb(), parse_mode="MarkdownV2")
@@ -951,18 +1040,18 @@ async def admin_team_logo(message: types.Message, state: FSMContext):
     await state.clear()
 
 # --- ПРОСМОТР И РЕДАКТИРОВАНИЕ КОМАНД ---
-@dp.callback_query(F.data == "nav_teams_list")
+@callbacks.exact("nav_teams_list")
 async def nav_teams_list_start(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(team_sort_mode='tag')
     await show_teams_page(callback, 0, state)
 
-@dp.callback_query(F.data.startswith("team_page_"))
-async def nav_teams_pagination(callback: types.CallbackQuery, state: FSMContext):
-    await show_teams_page(callback, int(callback.data.split("_")[-1]), state)
+@callbacks.prefix("team_page_", nav=True, page=int)
+async def nav_teams_pagination(callback: types.CallbackQuery, state: FSMContext, page: int):
+    await show_teams_page(callback, page, state)
 
-@dp.callback_query(F.data.startswith("set_sort_"))
-async def change_team_sort(callback: types.CallbackQuery, state: FSMContext):
-    await state.update_data(team_sort_mode=callback.data.split("_")[-1])
+@callbacks.prefix("set_sort_", sort=str)
+async def change_team_sort(callback: types.CallbackQuery, state: FSMContext, sort: str):
+    await state.update_data(team_sort_mode=sort)
     await show_teams_page(callback, 0, state)
 
 async def show_teams_page(callback: types.CallbackQuery, page, state: FSMContext):
@@ -975,9 +1064,8 @@ async def show_teams_page(callback: types.CallbackQuery, page, state: FSMContext
     text = f"🛡️ *Список команд* \\(Всего: {count}\\)\n🗂 Сортировка: _{escape_md(mode_text)}_"
     await safe_edit_or_send(callback, text, reply_markup=get_teams_carousel_kb(teams, page, pages, sort))
 
-@dp.callback_query(F.data.startswith("view_team_"))
-async def view_specific_team(callback: types.CallbackQuery):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("view_team_", nav=True, tid=int)
+async def view_specific_team(callback: types.CallbackQuery, tid: int):
     team = await get_team_by_id(tid)
     if not team: 
         await callback.answer("Команда не найдена", show_alert=True)
@@ -1008,46 +1096,33 @@ async def view_specific_team(callback: types.CallbackQuery):
         kb_rows.append([InlineKeyboardButton(text="❌ УДАЛИТЬ", callback_data=f"del_team_confirm_{tid}")])
         
     kb_rows.append([InlineKeyboardButton(text="🔙 К списку", callback_data="nav_teams_list")])
+    kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
 
+    # Ключ зависит от содержимого логотипа: после смены лого картинка загрузится заново
+    logo_key = ("team", tid, hash(team['logo_base64']))
     try:
-        await callback.message.delete()
-        await callback.message.answer_photo(
-            BufferedInputFile(base64.b64decode(team['logo_base64']), filename="l.png"), 
-            caption=info, 
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows), 
-            parse_mode="MarkdownV2"
-        )
+        photo = cached_photo(logo_key, lambda: BufferedInputFile(base64.b64decode(team['logo_base64']), filename="l.png"))
+        await navigate_screen(callback, info, reply_markup=kb, photo=photo, photo_key=logo_key)
     except Exception as e: 
-        # Если ошибка (например, сообщение уже удалено), пробуем отправить текст
-        err_msg = escape_md(f"Ошибка: {e}")
         # Тут мы не добавляем info, так как если info кривое, оно снова вызовет ошибку
-        if "message to delete not found" in str(e):
-             await callback.message.answer_photo(
-                 BufferedInputFile(base64.b64decode(team['logo_base64']), filename="l.png"), 
-                 caption=info, 
-                 reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows), 
-                 parse_mode="MarkdownV2"
-             )
-        else:
-             await callback.message.answer(err_msg, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows), parse_mode="MarkdownV2")
+        err_msg = escape_md(f"Ошибка: {e}")
+        await navigate_screen(callback, err_msg, reply_markup=kb)
 
-@dp.callback_query(F.data.startswith("del_team_confirm_"))
-async def delete_team_handler(callback: types.CallbackQuery):
+@callbacks.prefix("del_team_confirm_", tid=int)
+async def delete_team_handler(callback: types.CallbackQuery, tid: int):
     uid = callback.from_user.id
     if not await check_is_admin(uid): return
-    await delete_team(int(callback.data.split("_")[-1]))
+    await delete_team(tid)
     await safe_delete_message(callback.message.chat.id, callback.message.message_id)
     await callback.message.answer("🗑️ Команда удалена!\nВы перемещены в главное меню.", reply_markup=await get_main_kb(uid))
 
 # Хендлеры редактирования команды
-@dp.callback_query(F.data.startswith("edit_team_"))
-async def edit_team_start(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("edit_team_", field=str, tid=int)
+async def edit_team_start(callback: types.CallbackQuery, state: FSMContext, field: str, tid: int):
+    # field: name, tag, roster, logo_base64
     if not await check_is_admin(callback.from_user.id): return
-    parts = callback.data.split("_")
-    field = parts[2] # name, tag, roster
-    tid = int(parts[-1])
     
-    if field == "logo": 
+    if field == "logo_base64": 
         # Логотип (base64) обрабатывается отдельно
         await callback.message.answer("🖼️ Отправьте новое *Логотип* (картинку):", parse_mode="MarkdownV2")
         await state.update_data(edit_team_id=tid, edit_field="logo_base64")
@@ -1087,7 +1162,7 @@ async def edit_team_finish(message: types.Message, state: FSMContext):
 #    АДМИНКА: ТУРНИРЫ (СОЗДАНИЕ И РЕДАКТИРОВАНИЕ) 
 # ==========================================
 
-@dp.callback_query(F.data == "admin_create_tournament")
+@callbacks.exact("admin_create_tournament")
 async def admin_tour_start(callback: types.CallbackQuery, state: FSMContext):
     if not await check_is_admin(callback.from_user.id):
         return
@@ -1185,12 +1260,6 @@ async def admin_tour_logo(message: types.Message, state: FSMContext):
     )
     await state.set_state(TournamentCreate.waiting_for_prize_currency)
 
-def _fmt_money(val: float) -> str:
-    if val.is_integer():
-        return str(int(val))
-    return f"{val:.2f}".rstrip("0").rstrip(".")
-
-
 async def _render_prize_place_prompt(message: types.Message, state: FSMContext):
     data = await state.get_data()
     curr = data.get('p_curr', '')
@@ -1201,16 +1270,16 @@ async def _render_prize_place_prompt(message: types.Message, state: FSMContext):
     remain = max(total - current_sum, 0)
 
     lines = [
-        f"💰 Фонд: *{escape_md(_fmt_money(total))} {escape_md(curr)}*",
-        f"Распределено: *{escape_md(_fmt_money(current_sum))} {escape_md(curr)}*",
-        f"Остаток: *{escape_md(_fmt_money(remain))} {escape_md(curr)}*",
+        f"💰 Фонд: *{escape_md(fmt_money(total))} {escape_md(curr)}*",
+        f"Распределено: *{escape_md(fmt_money(current_sum))} {escape_md(curr)}*",
+        f"Остаток: *{escape_md(fmt_money(remain))} {escape_md(curr)}*",
     ]
 
     if dist:
         lines.append("\n📌 Уже добавлено:")
         for idx, item in enumerate(dist, 1):
             place = escape_md(item.get('place', ''))
-            amount = escape_md(_fmt_money(float(item.get('amount', 0) or 0)))
+            amount = escape_md(fmt_money(float(item.get('amount', 0) or 0)))
             lines.append(f"{idx}\\. {place} — {amount} {escape_md(curr)}")
 
     lines.append("\nНазвание места (например: 1 место)?")
@@ -1344,7 +1413,7 @@ async def admin_tour_prize_place_amount(message: types.Message, state: FSMContex
         await fsm_edit_or_send(
             message,
             state,
-            f"❌ Сумма больше остатка\\. Осталось: *{escape_md(_fmt_money(max(remain, 0)))} {escape_md(curr)}*",
+            f"❌ Сумма больше остатка\\. Осталось: *{escape_md(fmt_money(max(remain, 0)))} {escape_md(curr)}*",
         )
         return
 
@@ -1426,17 +1495,17 @@ async def finish_create_tournament(message: types.Message, state: FSMContext):
         await state.clear()
 
 # --- ПРОСМОТР ТУРНИРОВ И УПРАВЛЕНИЕ УЧАСТНИКАМИ/ПОБЕДИТЕЛЯМИ ---
-@dp.callback_query(F.data == "nav_tournaments")
+@callbacks.exact("nav_tournaments")
 async def nav_tournaments_start(callback: types.CallbackQuery, state: FSMContext):
     await state.update_data(tour_sort_mode='alpha'); await show_tours_page(callback, 0, state)
 
-@dp.callback_query(F.data.startswith("tour_page_"))
-async def nav_tours_pagination(callback: types.CallbackQuery, state: FSMContext):
-    await show_tours_page(callback, int(callback.data.split("_")[-1]), state)
+@callbacks.prefix("tour_page_", nav=True, page=int)
+async def nav_tours_pagination(callback: types.CallbackQuery, state: FSMContext, page: int):
+    await show_tours_page(callback, page, state)
 
-@dp.callback_query(F.data.startswith("set_toursort_"))
-async def change_tour_sort(callback: types.CallbackQuery, state: FSMContext):
-    await state.update_data(tour_sort_mode=callback.data.split("_")[-1]); await show_tours_page(callback, 0, state)
+@callbacks.prefix("set_toursort_", sort=str)
+async def change_tour_sort(callback: types.CallbackQuery, state: FSMContext, sort: str):
+    await state.update_data(tour_sort_mode=sort); await show_tours_page(callback, 0, state)
 
 async def show_tours_page(callback: types.CallbackQuery, page, state: FSMContext):
     data = await state.get_data(); sort = data.get('tour_sort_mode', 'alpha')
@@ -1448,9 +1517,8 @@ async def show_tours_page(callback: types.CallbackQuery, page, state: FSMContext
     text = f"🏆 *Список турниров* \\(Всего: {count}\\)\n🗂 Сортировка: _{escape_md(mode_text)}_"
     await safe_edit_or_send(callback, text, reply_markup=get_tournaments_carousel_kb(tours, page, pages, sort))
 
-@dp.callback_query(F.data.startswith("view_tour_"))
-async def view_specific_tour(callback: types.CallbackQuery):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("view_tour_", nav=True, tid=int)
+async def view_specific_tour(callback: types.CallbackQuery, tid: int):
     # Импортируем внутри функции или используем глобальный импорт, если он есть
     from database import get_tournament_by_id
     tour = await get_tournament_by_id(tid)
@@ -1459,91 +1527,7 @@ async def view_specific_tour(callback: types.CallbackQuery):
         await callback.answer("Турнир не найден", show_alert=True)
         return
 
-    # Обработка призового фонда
-    try: 
-        pdata = json.loads(tour['prize_data'])
-    except: 
-        pdata = None
-    
-    # Обработка MVP
-    try: 
-        mdata = json.loads(tour['mvp_data'])
-    except: 
-        mdata = None
-
-    # Формирование строки призового фонда
-    p_str = "Нет фонда"
-    if pdata:
-        curr = pdata.get('currency', '?')
-        dist_raw = pdata.get('distribution', [])
-
-        if isinstance(dist_raw, dict):
-            dist_list = [{"place": k, "amount": v} for k, v in dist_raw.items()]
-        elif isinstance(dist_raw, list):
-            dist_list = dist_raw
-        else:
-            dist_list = []
-
-        def _to_float(val):
-            try:
-                return float(str(val).replace(',', '.'))
-            except Exception:
-                return 0.0
-
-        distributed_sum = sum(_to_float(x.get('amount', 0)) for x in dist_list if isinstance(x, dict))
-        total_fund_val = pdata.get('total_fund')
-        total_fund = _to_float(total_fund_val) if total_fund_val is not None else distributed_sum
-
-        lines = []
-        for item in dist_list:
-            if not isinstance(item, dict):
-                continue
-            place = escape_md(item.get('place', ''))
-            amount = escape_md(_fmt_money(_to_float(item.get('amount', 0))))
-            lines.append(f"   🏅 {place}: {amount} {escape_md(curr)}")
-
-        p_str = f"*{escape_md(_fmt_money(total_fund))} {escape_md(curr)}*"
-        if lines:
-            p_str += "\n" + "\n".join(lines)
-
-    # Формирование строки MVP
-    m_str = "Нет"
-    if mdata: 
-        amount = mdata.get('amount', '0')
-        currency = mdata.get('currency', '')
-        m_str = f"{escape_md(amount)} {escape_md(currency)}"
-
-    # Формирование этапов
-    stg = []
-    if tour['has_qualifiers']: stg.append("Квалификации")
-    if tour['has_group_stage']: stg.append("Групповой этап")
-    stg.append("Плей-офф (Main)") # Здесь обычные дефисы и скобки
-    
-    # Экранируем каждый этап и соединяем экранированной стрелочкой
-    # escape_md превратит "Плей-офф (Main)" в "Плей\-офф \(Main\)"
-    stg_escaped = [escape_md(s) for s in stg]
-    stg_str = " \\-\\> ".join(stg_escaped)
-
-    # Сезон
-    season_txt = f"❄️ *Сезон:* {escape_md(tour['season'])}\n" if tour['season'] else ""
-    
-    # Подсчет участников
-    try: 
-        parts = json.loads(tour['participants'])
-    except: 
-        parts = []
-    parts_count = len(parts)
-
-    # Итоговый текст
-    info = (
-        f"🏆 *Турнир:* {escape_md(tour['full_name'])}\n"
-        f"{season_txt}"
-        f"📅 *Год:* {tour['year']}\n"
-        f"🚦 *Этапы:* {stg_str}\n"
-        f"👥 *Участников:* {parts_count}\n\n"
-        f"💰 *Призовой фонд:*\n{p_str}\n\n"
-        f"⭐ *MVP Приз:* {m_str}"
-    )
+    info = format_tournament_info(tour)
 
     kb_rows = []
     if await check_is_admin(callback.from_user.id):
@@ -1566,25 +1550,17 @@ async def view_specific_tour(callback: types.CallbackQuery):
         ])
         
     kb_rows.append([InlineKeyboardButton(text="🔙 К списку", callback_data="nav_tournaments")])
-    
+    kb = InlineKeyboardMarkup(inline_keyboard=kb_rows)
+
+    logo_key = ("tour", tid, hash(tour['logo_base64']))
     try:
-        await safe_delete_message(callback.message.chat.id, callback.message.message_id)
-        # Отправка фото с подписью
-        await callback.message.answer_photo(
-            BufferedInputFile(base64.b64decode(tour['logo_base64']), filename="l.png"), 
-            caption=info, 
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows), 
-            parse_mode="MarkdownV2"
-        )
+        # Отправка фото с подписью (на месте текущего сообщения)
+        photo = cached_photo(logo_key, lambda: BufferedInputFile(base64.b64decode(tour['logo_base64']), filename="l.png"))
+        await navigate_screen(callback, info, reply_markup=kb, photo=photo, photo_key=logo_key)
     except Exception as e: 
         # Если ошибка (например, слишком длинный текст или битая картинка), отправляем текстом
         err_msg = escape_md(f"Ошибка отображения: {e}")
-        # Если картинка битая, отправляем просто текст
-        await callback.message.answer(
-            err_msg + "\n\n" + info, 
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows), 
-            parse_mode="MarkdownV2"
-        )
+        await navigate_screen(callback, err_msg + "\n\n" + info, reply_markup=kb)
 
 # --- УПРАВЛЕНИЕ УЧАСТНИКАМИ ТУРНИРА ---
 
@@ -1634,26 +1610,20 @@ async def build_participants_delete_menu(tid: int):
     return text, InlineKeyboardMarkup(inline_keyboard=kb_rows)
 
 
-@dp.callback_query(F.data.startswith("manage_tour_participants_"))
-async def manage_tour_participants(callback: types.CallbackQuery):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("manage_tour_participants_", nav=True, tid=int)
+async def manage_tour_participants(callback: types.CallbackQuery, tid: int):
     text, kb = await build_participants_menu(tid)
     await safe_edit_or_send(callback, text, reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("tour_parts_del_"))
-async def manage_tour_participants_delete_menu(callback: types.CallbackQuery):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("tour_parts_del_", nav=True, tid=int)
+async def manage_tour_participants_delete_menu(callback: types.CallbackQuery, tid: int):
     text, kb = await build_participants_delete_menu(tid)
     await safe_edit_or_send(callback, text, reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("tour_parts_remove_"))
-async def remove_team_from_tour(callback: types.CallbackQuery):
-    parts = callback.data.split("_")
-    tid = int(parts[3])
-    team_id = int(parts[4])
-
+@callbacks.prefix("tour_parts_remove_", tid=int, team_id=int)
+async def remove_team_from_tour(callback: types.CallbackQuery, tid: int, team_id: int):
     from database import remove_team_from_tournament
     success = await remove_team_from_tournament(tid, team_id)
 
@@ -1666,10 +1636,8 @@ async def remove_team_from_tour(callback: types.CallbackQuery):
     await safe_edit_or_send(callback, text, reply_markup=kb)
 
 
-@dp.callback_query(F.data.startswith("tour_parts_add_"))
-async def add_tour_team_start(callback: types.CallbackQuery, state: FSMContext):
-    tid = int(callback.data.split("_")[-1])
-
+@callbacks.prefix("tour_parts_add_", tid=int)
+async def add_tour_team_start(callback: types.CallbackQuery, state: FSMContext, tid: int):
     await state.update_data(
         target_tour_id=tid,
         initiator_id=callback.from_user.id,
@@ -1724,9 +1692,8 @@ async def add_tour_team_process(message: types.Message, state: FSMContext):
     await state.clear()
 
 # --- ВЫБОР ПОБЕДИТЕЛЯ ТУРНИРА ---
-@dp.callback_query(F.data.startswith("set_winner_tour_"))
-async def set_tour_winner_start(callback: types.CallbackQuery, state: FSMContext):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("set_winner_tour_", tid=int)
+async def set_tour_winner_start(callback: types.CallbackQuery, state: FSMContext, tid: int):
     await state.update_data(target_tour_id=tid)
     
     # Получаем турнир и призы
@@ -1762,9 +1729,8 @@ async def set_tour_winner_start(callback: types.CallbackQuery, state: FSMContext
     kb.append([InlineKeyboardButton(text="🔙 Отмена", callback_data=f"view_tour_{tid}")])
     await callback.message.answer("🏆 Выберите, какое место вы хотите назначить:", reply_markup=InlineKeyboardMarkup(inline_keyboard=kb))
 
-@dp.callback_query(F.data.startswith("win_place_"))
-async def set_tour_winner_place(callback: types.CallbackQuery, state: FSMContext):
-    place = callback.data.replace("win_place_", "")
+@callbacks.prefix("win_place_", place=str)
+async def set_tour_winner_place(callback: types.CallbackQuery, state: FSMContext, place: str):
     await state.update_data(target_place=place)
     
     # Показываем список участников
@@ -1787,9 +1753,8 @@ async def set_tour_winner_place(callback: types.CallbackQuery, state: FSMContext
     await callback.message.edit_text(f"🏆 Выберите команду, занявшую *{escape_md(place)}* место:", reply_markup=InlineKeyboardMarkup(inline_keyboard=kb), parse_mode="MarkdownV2")
     await state.set_state(TourSetWinner.selecting_team)
 
-@dp.callback_query(F.data.startswith("confirm_winner_"))
-async def set_tour_winner_confirm(callback: types.CallbackQuery, state: FSMContext):
-    team_id = int(callback.data.split("_")[-1])
+@callbacks.prefix("confirm_winner_", team_id=int)
+async def set_tour_winner_confirm(callback: types.CallbackQuery, state: FSMContext, team_id: int):
     data = await state.get_data()
     tid = data['target_tour_id']
     place = data['target_place']
@@ -1801,28 +1766,23 @@ async def set_tour_winner_confirm(callback: types.CallbackQuery, state: FSMConte
     
     # Возврат
     fake_cb = types.CallbackQuery(id='0', from_user=callback.from_user, chat_instance='0', message=callback.message, data=f"view_tour_{tid}")
-    await view_specific_tour(fake_cb)
+    await view_specific_tour(fake_cb, tid)
     await state.clear()
 
-@dp.callback_query(F.data.startswith("del_tour_confirm_"))
-async def delete_tour_handler(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("del_tour_confirm_", tid=int)
+async def delete_tour_handler(callback: types.CallbackQuery, state: FSMContext, tid: int):
     uid = callback.from_user.id
-    await delete_tournament(int(callback.data.split("_")[-1]))
+    await delete_tournament(tid)
     await safe_delete_message(callback.message.chat.id, callback.message.message_id)
     await callback.message.answer("🗑️ Турнир удален!\nВы перемещены в главное меню.", reply_markup=await get_main_kb(uid))
 
 # Хендлеры редактирования турнира
-@dp.callback_query(F.data.startswith("edit_tour_"))
-async def edit_tour_start(callback: types.CallbackQuery, state: FSMContext):
-    if not await check_is_admin(callback.from_user.id): return
-    parts = callback.data.split("_")
-    
+@callbacks.prefix("edit_tour_", field=str, tid=int)
+async def edit_tour_start(callback: types.CallbackQuery, state: FSMContext, field: str, tid: int):
     # Структура callback: edit_tour_{FIELD}_{ID}
-    # Но FIELD может содержать подчеркивания (например, full_name, prize_data)
-    # Поэтому ID берем с конца, а поле собираем из середины
-    tid = int(parts[-1])
-    field_parts = parts[2:-1]
-    field = "_".join(field_parts)
+    # FIELD может содержать подчеркивания (например, full_name, prize_data) -
+    # роутер берет ID с конца, а поле собирает из середины
+    if not await check_is_admin(callback.from_user.id): return
     
     if field == "logo_base64":
         await callback.message.answer("🖼️ Отправьте новый *Логотип* \\(картинку\\):", parse_mode="MarkdownV2")
@@ -1863,7 +1823,7 @@ async def edit_tour_finish(message: types.Message, state: FSMContext):
 #    МЕНЮ ИГР (ФУНКЦИОНАЛ НА МЕСТЕ)
 # =======================
 
-@dp.callback_query(F.data == "nav_games_main")
+@callbacks.exact("nav_games_main", nav=True)
 async def nav_games_menu(callback: types.CallbackQuery):
     await callback.message.edit_text(
         "🎮 *Управление играми*\n\nВыберите действие:",
@@ -1873,32 +1833,33 @@ async def nav_games_menu(callback: types.CallbackQuery):
 
 # --- ВЫБОР ТУРНИРА ---
 async def start_tournament_selection(callback: types.CallbackQuery, state: FSMContext, next_state_obj):
-    tours, _, _ = await get_tournaments_paginated(0, 100, 'year')
+    # Сам список в состояние не кладем: он общий и берется из кэша, в кнопках только индекс
+    tours = await get_tournament_choices()
     if not tours:
         await callback.answer("Нет активных турниров!", show_alert=True)
         return
 
     await state.update_data(
-        tournaments_cache=tours,
         initiator_id=callback.from_user.id,
         last_bot_msg_id=callback.message.message_id,
         chat_id=callback.message.chat.id,
     )
-    await show_tour_select_page(callback, 0, state)
+    await show_tour_select_page(callback, 0)
     await state.set_state(next_state_obj)
 
-@dp.callback_query(F.data == "game_add_init")
+@callbacks.exact("game_add_init")
 async def game_add_init(callback: types.CallbackQuery, state: FSMContext):
     await start_tournament_selection(callback, state, GameRegister.selecting_tournament)
 
-@dp.callback_query(F.data == "game_list_init")
+@callbacks.exact("game_list_init")
 async def game_list_init(callback: types.CallbackQuery, state: FSMContext):
     await start_tournament_selection(callback, state, GameListState.selecting_tournament_for_list)
 
-async def show_tour_select_page(callback: types.CallbackQuery, index: int, state: FSMContext):
-    data = await state.get_data()
-    tours = data.get('tournaments_cache', [])
+async def show_tour_select_page(callback: types.CallbackQuery, index: int):
+    tours = await get_tournament_choices()
     if not tours: return
+    # Список мог измениться, пока пользователь листал
+    index = max(0, min(index, len(tours) - 1))
     t = tours[index]
     total = len(tours)
     text = (f"🏆 *Выберите турнир:*\n\n📌 Название: *{escape_md(t['full_name'])}*\n📅 Год: {t['year']}\n🆔 ID: `{t['id']}`")
@@ -1908,7 +1869,7 @@ async def show_tour_select_page(callback: types.CallbackQuery, index: int, state
 
 @dp.callback_query(TournamentNav.filter(F.action.in_({"prev", "next"})))
 async def navigate_tour_select(callback: types.CallbackQuery, callback_data: TournamentNav, state: FSMContext):
-    await show_tour_select_page(callback, callback_data.index, state)
+    await show_tour_select_page(callback, callback_data.index)
     await callback.answer()
 
 @dp.callback_query(TournamentNav.filter(F.action == "select"))
@@ -1994,6 +1955,7 @@ async def game_reg_score(message: types.Message, state: FSMContext):
             message,
             state,
             f"✅ Счет: {escape_md(s1)}:{escape_md(s2)}\n\n4️⃣ Введите *ТЕГ* первой команды \\(команда должна быть зарегистрирована\\):",
+            reply_markup=get_bulk_stats_kb(),
         )
         await state.set_state(GameRegister.waiting_for_team1_tag)
 
@@ -2007,13 +1969,13 @@ async def game_reg_t1_tag(message: types.Message, state: FSMContext):
     team = await get_team_by_tag(tag)
 
     if not team:
-        await fsm_edit_or_send(message, state, f"❌ Команда {format_team_tag_md(tag)} не найдена\\! Введите существующий тег:")
+        await fsm_edit_or_send(message, state, f"❌ Команда {format_team_tag_md(tag)} не найдена\\! Введите существующий тег:", reply_markup=get_bulk_stats_kb())
         return
 
     roster_raw = team['roster']
     roster_list = [name.strip() for name in roster_raw.split('\n') if name.strip()]
     if not roster_list:
-        await fsm_edit_or_send(message, state, f"❌ У команды {format_team_tag_md(tag)} пустой состав\\!")
+        await fsm_edit_or_send(message, state, f"❌ У команды {format_team_tag_md(tag)} пустой состав\\!", reply_markup=get_bulk_stats_kb())
         return
 
     await state.update_data(
@@ -2026,6 +1988,7 @@ async def game_reg_t1_tag(message: types.Message, state: FSMContext):
 
     await ask_next_player_stats(message, state)
 
+
 async def ask_next_player_stats(message: types.Message, state: FSMContext):
     data = await state.get_data()
     roster = data['current_roster']
@@ -2042,12 +2005,8 @@ async def ask_next_player_stats(message: types.Message, state: FSMContext):
             text = "✅ Статистика Команды 1 сохранена\\.\n\n5️⃣ Введите *ТЕГ* второй команды:"
             
             # Редактируем старое сообщение
-            try:
-                await bot.edit_message_text(text=text, chat_id=chat_id, message_id=msg_id, parse_mode="MarkdownV2")
-            except:
-                msg = await bot.send_message(chat_id, text, parse_mode="MarkdownV2")
-                await state.update_data(last_bot_msg_id=msg.message_id)
-                
+            await _edit_stats_prompt(chat_id, msg_id, text, None, state)
+
             await state.set_state(GameRegister.waiting_for_team2_tag)
         else:
             await finish_game_registration(message, state)
@@ -2059,14 +2018,20 @@ async def ask_next_player_stats(message: types.Message, state: FSMContext):
     kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🚫 Не участвовал", callback_data="player_dnp")]])
     
     # Пытаемся редактировать, если не выйдет - отправляем новое
-    try:
-        await bot.edit_message_text(text=text, chat_id=chat_id, message_id=msg_id, reply_markup=kb, parse_mode="MarkdownV2")
-    except:
-        msg = await bot.send_message(chat_id, text, reply_markup=kb, parse_mode="MarkdownV2")
-        await state.update_data(last_bot_msg_id=msg.message_id)
-        
+    await _edit_stats_prompt(chat_id, msg_id, text, kb, state)
     await state.set_state(GameRegister.waiting_for_player_stats)
 
+async def _edit_stats_prompt(chat_id, msg_id, text, kb, state: FSMContext):
+    async def send_new(text, reply_markup, parse_mode):
+        msg = await bot.send_message(chat_id, text, reply_markup=reply_markup, parse_mode=parse_mode)
+        await state.update_data(last_bot_msg_id=msg.message_id)
+        return msg
+
+    if msg_id:
+        await coalesced_edit_text(chat_id, msg_id, text, reply_markup=kb, fallback=send_new)
+    else:
+        await send_new(text, kb, "MarkdownV2")
+
 @dp.callback_query(GameRegister.waiting_for_player_stats, F.data == "player_dnp")
 async def process_player_dnp(callback: types.CallbackQuery, state: FSMContext):
     # Не удаляем сообщение, так как оно будет отредактировано в ask_next_player_stats
@@ -2088,19 +2053,13 @@ async def process_player_stats_text(message: types.Message, state: FSMContext):
         k, a, d = map(int, parts)
         
         data = await state.get_data()
-        current_roster = data['current_roster']
         idx = data['current_player_idx']
-        player_name = current_roster[idx]
-        rounds = data['rounds']
-        
-        metrics = calculate_player_metrics(k, a, d, rounds)
-        metrics['nickname'] = player_name
-        
-        stats_list = data['current_stats']
-        stats_list.append(metrics)
-        await state.update_data(current_stats=stats_list)
-        
-        await state.update_data(current_player_idx=idx + 1)
+        player_name = data['current_roster'][idx]
+
+        await state.update_data(
+            current_stats=data['current_stats'] + [[player_name, k, a, d]],
+            current_player_idx=idx + 1,
+        )
         await ask_next_player_stats(message, state)
         
     except ValueError:
@@ -2162,9 +2121,117 @@ async def game_reg_t2_tag(message: types.Message, state: FSMContext):
     )
     await ask_next_player_stats(message, state)
 
+# --- ВВОД ВСЕЙ СТАТИСТИКИ ОДНИМ СООБЩЕНИЕМ ---
+
+BULK_STATS_HELP = (
+    "📋 Отправьте статистику матча *одним сообщением*:\n\n"
+    "Первая строка — теги команд, дальше по строке на игрока: `ник K A D`\n"
+    "```\n"
+    "TAG1 TAG2\n"
+    "player1 15 4 10\n"
+    "player2 9 7 12\n"
+    "...\n"
+    "```\n"
+    "Команду игрока бот определит по составам\\. Кого нет в списке — не участвовал\\."
+)
+
+def _roster_names(team):
+    return [name.strip() for name in team['roster'].split('\n') if name.strip()]
+
+def parse_bulk_scoreboard(text):
+    """
+    Разбирает сообщение 'TAG1 TAG2' + строки 'ник K A D'.
+    Возвращает (tag1, tag2, [(ник, k, a, d), ...], ошибки).
+    """
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        return None, None, [], ["Пустое сообщение"]
+
+    tags = lines[0].split()
+    if len(tags) != 2:
+        return None, None, [], ["Первая строка должна содержать два тега: `TAG1 TAG2`"]
+
+    rows, errors = [], []
+    for num, line in enumerate(lines[1:], 2):
+        # Ник может содержать пробелы, поэтому числа берем с конца
+        parts = line.rsplit(maxsplit=3)
+        try:
+            if len(parts) != 4:
+                raise ValueError
+            k, a, d = (int(x) for x in parts[1:])
+            if min(k, a, d) < 0:
+                raise ValueError
+        except ValueError:
+            errors.append(f"Строка {num}: ожидается `ник K A D`")
+            continue
+        rows.append((parts[0], k, a, d))
+    return tags[0], tags[1], rows, errors
+
+def split_scoreboard_by_rosters(rows, roster1, roster2):
+    """Раскладывает строки по составам. Порядок внутри команды - как в составе."""
+    index1 = {name.lower(): name for name in roster1}
+    index2 = {name.lower(): name for name in roster2}
+    found1, found2, errors = {}, {}, []
+
+    for nick, k, a, d in rows:
+        key = nick.lower()
+        if key in index1 and key in index2:
+            errors.append(f"{nick}: есть в составах обеих команд")
+        elif key in index1 or key in index2:
+            found = found1 if key in index1 else found2
+            if key in found:
+                errors.append(f"{nick}: указан дважды")
+            found[key] = [(index1 if key in index1 else index2)[key], k, a, d]
+        else:
+            errors.append(f"{nick}: нет в составах")
+
+    stats1 = [found1[name.lower()] for name in roster1 if name.lower() in found1]
+    stats2 = [found2[name.lower()] for name in roster2 if name.lower() in found2]
+    if not errors and not stats1:
+        errors.append("Нет ни одного игрока первой команды")
+    if not errors and not stats2:
+        errors.append("Нет ни одного игрока второй команды")
+    return stats1, stats2, errors
+
+@dp.callback_query(GameRegister.waiting_for_team1_tag, F.data == "game_bulk_stats")
+async def game_reg_bulk_start(callback: types.CallbackQuery, state: FSMContext):
+    await callback.message.edit_text(BULK_STATS_HELP, parse_mode="MarkdownV2")
+    await state.update_data(last_bot_msg_id=callback.message.message_id, chat_id=callback.message.chat.id)
+    await state.set_state(GameRegister.waiting_for_bulk_stats)
+    await callback.answer()
+
+@dp.message(GameRegister.waiting_for_bulk_stats)
+async def game_reg_bulk_stats(message: types.Message, state: FSMContext):
+    await try_delete_user_message(message)
+
+    tag1, tag2, rows, errors = parse_bulk_scoreboard(message.text)
+    if not errors and tag1.lower() == tag2.lower():
+        errors.append("Команды должны быть разными")
+
+    team1 = team2 = None
+    if not errors:
+        team1 = await get_team_by_tag(tag1)
+        team2 = await get_team_by_tag(tag2)
+        if not team1: errors.append(f"Команда [{tag1}] не найдена")
+        if not team2: errors.append(f"Команда [{tag2}] не найдена")
+
+    if not errors:
+        stats1, stats2, errors = split_scoreboard_by_rosters(rows, _roster_names(team1), _roster_names(team2))
+
+    if errors:
+        error_txt = "\n".join(f"▫️ {escape_md(e)}" for e in errors[:10])
+        await fsm_edit_or_send(message, state, f"❌ *Ошибки:*\n{error_txt}\n\n{BULK_STATS_HELP}")
+        return
+
+    await state.update_data(t1_tag=tag1, t2_tag=tag2, t1_stats_final=stats1, current_stats=stats2)
+    await finish_game_registration(message, state)
+
 async def finish_game_registration(message: types.Message, state: FSMContext):
     data = await state.get_data()
-    full_stats = {data['t1_tag']: data['t1_stats_final'], data['t2_tag']: data['current_stats']}
+    full_stats = {
+        data['t1_tag']: expand_player_stats(data['t1_stats_final'], data['rounds']),
+        data['t2_tag']: expand_player_stats(data['current_stats'], data['rounds']),
+    }
 
     initiator_id = data.get('initiator_id')
     if not initiator_id and getattr(message, 'from_user', None):
@@ -2204,9 +2271,8 @@ async def finish_game_registration(message: types.Message, state: FSMContext):
 #    ПРОСМОТР, УДАЛЕНИЕ И РЕДАКТИРОВАНИЕ
 # ==========================================
 
-@dp.callback_query(F.data.startswith("view_game_"))
-async def view_game_handler(callback: types.CallbackQuery, state: FSMContext):
-    game_id = int(callback.data.split("_")[-1])
+@callbacks.prefix("view_game_", nav=True, game_id=int)
+async def view_game_handler(callback: types.CallbackQuery, state: FSMContext, game_id: int):
     game = await get_game_by_id(game_id)
     if not game:
         await callback.answer("Игра не найдена!", show_alert=True)
@@ -2233,10 +2299,9 @@ async def view_game_handler(callback: types.CallbackQuery, state: FSMContext):
 
     await safe_edit_or_send(callback, text, reply_markup=InlineKeyboardMarkup(inline_keyboard=kb_rows))
 
-@dp.callback_query(F.data.startswith("del_game_confirm_"))
-async def delete_game_handler(callback: types.CallbackQuery):
+@callbacks.prefix("del_game_confirm_", game_id=int)
+async def delete_game_handler(callback: types.CallbackQuery, game_id: int):
     if not await check_is_admin(callback.from_user.id): return
-    game_id = int(callback.data.split("_")[-1])
     game = await get_game_by_id(game_id)
     tour_id = game['tournament_id'] if game else 0
     await delete_game(game_id)
@@ -2246,10 +2311,9 @@ async def delete_game_handler(callback: types.CallbackQuery):
     else:
         await callback.message.edit_text("Игра удалена", reply_markup=get_back_kb())
 
-@dp.callback_query(F.data.startswith("edit_game_date_"))
-async def edit_game_date_start(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("edit_game_date_", gid=int)
+async def edit_game_date_start(callback: types.CallbackQuery, state: FSMContext, gid: int):
     if not await check_is_admin(callback.from_user.id): return
-    gid = int(callback.data.split("_")[-1])
     await state.update_data(edit_game_id=gid)
     msg = await callback.message.edit_text("✏️ Введите новую *дату* \\(YYYY\\.MM\\.DD\\):", reply_markup=get_back_to_view_kb("view_game", gid), parse_mode="MarkdownV2")
     await state.update_data(last_bot_msg_id=msg.message_id, chat_id=callback.message.chat.id)
@@ -2268,10 +2332,9 @@ async def edit_game_date_finish(message: types.Message, state: FSMContext):
     await update_game_field(gid, 'game_date', message.text)
     await return_to_game_view(message, gid, state)
 
-@dp.callback_query(F.data.startswith("edit_game_map_"))
-async def edit_game_map_start(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("edit_game_map_", gid=int)
+async def edit_game_map_start(callback: types.CallbackQuery, state: FSMContext, gid: int):
     if not await check_is_admin(callback.from_user.id): return
-    gid = int(callback.data.split("_")[-1])
     await state.update_data(edit_game_id=gid)
     
     msg = await callback.message.edit_text(
@@ -2283,13 +2346,10 @@ async def edit_game_map_start(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(GameEditState.waiting_for_new_map)
 
 # ОБРАБОТЧИК КНОПКИ КАРТЫ ПРИ РЕДАКТИРОВАНИИ
-@dp.callback_query(F.data.startswith("set_edit_map_"))
-async def process_edit_map_btn(callback: types.CallbackQuery, state: FSMContext):
-    if not await check_is_admin(callback.from_user.id): return
+@callbacks.prefix("set_edit_map_", gid=int, map_name=str)
+async def process_edit_map_btn(callback: types.CallbackQuery, state: FSMContext, gid: int, map_name: str):
     # set_edit_map_{gid}_{map_name}
-    parts = callback.data.split("_")
-    gid = int(parts[3])
-    map_name = parts[4]
+    if not await check_is_admin(callback.from_user.id): return
     
     await update_game_field(gid, 'map_name', map_name)
     await callback.answer("Карта обновлена")
@@ -2305,10 +2365,9 @@ async def edit_game_map_finish_text(message: types.Message, state: FSMContext):
     await update_game_field(gid, 'map_name', message.text)
     await return_to_game_view(message, gid, state)
 
-@dp.callback_query(F.data.startswith("edit_game_score_"))
-async def edit_game_score_start(callback: types.CallbackQuery, state: FSMContext):
+@callbacks.prefix("edit_game_score_", gid=int)
+async def edit_game_score_start(callback: types.CallbackQuery, state: FSMContext, gid: int):
     if not await check_is_admin(callback.from_user.id): return
-    gid = int(callback.data.split("_")[-1])
     await state.update_data(edit_game_id=gid)
     msg = await callback.message.edit_text("✏️ Введите новый *счет* \\(например `13-11`\\):", reply_markup=get_back_to_view_kb("view_game", gid), parse_mode="MarkdownV2")
     await state.update_data(last_bot_msg_id=msg.message_id, chat_id=callback.message.chat.id)
@@ -2353,19 +2412,16 @@ async def return_to_game_view(message, game_id, state):
 
 # --- СПИСОК ИГР (ПРОСМОТР) ---
 
-@dp.callback_query(F.data.startswith("list_games_"))
-async def start_games_list(callback: types.CallbackQuery, state: FSMContext):
-    tid = int(callback.data.split("_")[-1])
+@callbacks.prefix("list_games_", tid=int)
+async def start_games_list(callback: types.CallbackQuery, state: FSMContext, tid: int):
     await state.update_data(current_tour_id=tid, date_filter=None)
     await show_games_page(callback, 0, state)
 
-@dp.callback_query(F.data.startswith("game_page_"))
-async def games_pagination(callback: types.CallbackQuery, state: FSMContext):
-    parts = callback.data.split("_")
-    page = int(parts[-1])
+@callbacks.prefix("game_page_", nav=True, tid=int, page=int)
+async def games_pagination(callback: types.CallbackQuery, state: FSMContext, page: int):
     await show_games_page(callback, page, state)
 
-@dp.callback_query(F.data.startswith("filter_games_date_"))
+@callbacks.prefix("filter_games_date_", tid=int)
 async def games_filter_date_ask(callback: types.CallbackQuery, state: FSMContext):
     await callback.message.answer("📅 Введите дату для фильтрации в формате `YYYY.MM.DD` (например `2024.01.25`):", parse_mode="MarkdownV2")
     await state.set_state(GameListState.filter_date)
@@ -2389,15 +2445,177 @@ async def show_games_page(callback: types.CallbackQuery, page, state: FSMContext
     text = f"📜 *Список игр* турнира \\#{tid}\nВсего: {count}{filter_txt}"
     
     kb = get_games_carousel_kb(games, page, pages, tid)
-    
-    try: await callback.message.delete()
-    except: pass
-    await callback.message.answer(text, reply_markup=kb, parse_mode="MarkdownV2")
+    await navigate_screen(callback, text, reply_markup=kb)
+
+# ==========================================
+#    ИМПОРТ ИГР ИЗ CSV / JSON
+# ==========================================
+
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024   # больше Bot API скачать не даст
+
+async def run_game_import(message: types.Message, document: types.Document):
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await message.answer("❌ Файл больше 20 МБ — разбейте его на части.")
+        return
+
+    progress_msg = await message.answer("⏳ Загружаю файл...")
+    chat_id, msg_id = progress_msg.chat.id, progress_msg.message_id
+
+    async def progress(done, errors):
+        # Прогресс не важен: неудачная правка не должна прерывать импорт
+        try:
+            await coalesced_edit_text(chat_id, msg_id, f"⏳ Импортировано игр: {done}\nОшибок: {errors}", parse_mode=None)
+        except TelegramAPIError as e:
+            logging.warning("Импорт игр: прогресс не обновлен: %s", e)
+
+    try:
+        data = (await bot.download(document)).getvalue()
+        imported, errors = await game_import.import_games(data, document.file_name, progress=progress)
+    except (ValueError, UnicodeDecodeError) as e:
+        await coalesced_edit_text(chat_id, msg_id, f"❌ Не удалось прочитать файл: {e}", parse_mode=None)
+        return
+    except Exception as e:
+        # Игры из уже записанных пачек остаются в базе
+        logging.exception("Импорт игр прерван")
+        await coalesced_edit_text(chat_id, msg_id, f"❌ Импорт прерван: {e}", parse_mode=None)
+        return
+
+    await coalesced_edit_text(chat_id, msg_id, f"✅ Импорт завершен.\nИмпортировано игр: {imported}\nОшибок: {len(errors)}", parse_mode=None)
+    if errors:
+        report = BufferedInputFile(game_import.build_error_report(errors), filename="import_errors.csv")
+        await message.answer_document(report, caption="Строки с ошибками")
+
+@dp.message(Command("import_games"))
+async def cmd_import_games(message: types.Message, state: FSMContext):
+    if not await check_is_admin(message.from_user.id): return
+    if message.document:
+        await state.clear()
+        await run_game_import(message, message.document)
+        return
+    await message.answer(game_import.HELP_TEXT, parse_mode="MarkdownV2", reply_markup=get_back_kb())
+    await state.set_state(GameImportState.waiting_for_document)
+
+@dp.message(GameImportState.waiting_for_document, F.document)
+async def import_games_document(message: types.Message, state: FSMContext):
+    await state.clear()
+    await run_game_import(message, message.document)
+
+# ==========================================
+#    ЭКСПОРТ ДАННЫХ
+# ==========================================
+
+EXPORT_HELP = (
+    "📤 *Экспорт данных*\n\n"
+    "`/export games <ID турнира|all> [csv|json]`\n"
+    "`/export players [csv|json]`\n"
+    "`/export transfers [csv|json]`"
+)
+
+@dp.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject):
+    if not await check_is_admin(message.from_user.id): return
+    args = (command.args or "").split()
+    fmt = args[-1].lower() if args and args[-1].lower() in exports.FORMATS else "csv"
+    if args and args[-1].lower() in exports.FORMATS:
+        args = args[:-1]
+
+    kind = args[0].lower() if args else ""
+    try:
+        if kind == "games" and len(args) == 2:
+            tour_id = None if args[1].lower() == "all" else int(args[1])
+            document, rows = await exports.export_games(tour_id, fmt)
+        elif kind == "players" and len(args) == 1:
+            document, rows = await exports.export_players(fmt)
+        elif kind == "transfers" and len(args) == 1:
+            document, rows = await exports.export_transfers(fmt)
+        else:
+            await message.answer(EXPORT_HELP, parse_mode="MarkdownV2")
+            return
+    except ValueError:
+        await message.answer(EXPORT_HELP, parse_mode="MarkdownV2")
+        return
+
+    try:
+        await message.answer_document(document, caption=f"📤 Строк: {rows}")
+    finally:
+        document.close()
+
+# --- ПРОИЗВОДИТЕЛЬНОСТЬ ---
+
+PERF_REPORT_LIMIT = 3800
+
+def format_slow_queries(top=10):
+    items = get_slow_queries()
+    if not items:
+        return f"Медленных запросов (> {database.SLOW_QUERY_MS} мс) нет"
+    lines = [f"Медленные запросы (> {database.SLOW_QUERY_MS} мс), по суммарному времени:"]
+    for sql, q in items[:top]:
+        lines.append(f"\n{q['count']} × до {q['max_ms']:.0f} мс, всего {q['total_ms']:.0f} мс {q['shape']}")
+        lines.append(sql[:200])
+        for flag in q['flags']:
+            lines.append(f"  ⚠ {flag}")
+    return "\n".join(lines)
+
+@dp.message(Command("perf"))
+async def cmd_perf(message: types.Message, command: CommandObject):
+    if not await check_is_admin(message.from_user.id): return
+    arg = (command.args or "").strip().lower()
+    if arg == "reset":
+        perf.reset()
+        reset_slow_queries()
+        await message.answer("🧹 Статистика производительности сброшена")
+        return
+    report = format_slow_queries() if arg == "slow" else perf.report()
+    if len(report) > PERF_REPORT_LIMIT:
+        report = report[:PERF_REPORT_LIMIT] + "\n…"
+    await message.answer(f"```\n{escape_md_code(report)}\n```", parse_mode="MarkdownV2")
+
+_profile_tasks = set()
+
+@dp.message(Command("profile"))
+async def cmd_profile(message: types.Message, command: CommandObject):
+    if not await check_is_owner(message.from_user.id): return
+    try:
+        seconds, mode = profiler.parse_args(command.args)
+    except ValueError:
+        await message.answer(profiler.HELP_TEXT, parse_mode="MarkdownV2")
+        return
+    if profiler.busy():
+        await message.answer("⏳ Профилирование уже идет, дождитесь результата")
+        return
+
+    await message.answer(f"🔬 Профилирую {seconds} с \\(режим `{mode}`\\)\\.\\.\\.", parse_mode="MarkdownV2")
+    # В фоне: иначе воркер и очередь этого чата простаивали бы все N секунд
+    task = asyncio.create_task(run_profile(message.chat.id, seconds, mode))
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
+
+async def run_profile(chat_id, seconds, mode):
+    stamp = profiler.timestamp()
+    try:
+        if mode == "cpu":
+            report, dump = await profiler.profile_cpu(seconds)
+            files = [(f"profile_{stamp}.txt", report.encode()), (f"profile_{stamp}.prof", dump)]
+        elif mode == "mem":
+            extra = {"fsm": fsm_storage.summary(), "fsm_sqlite": sqlite_fsm.stats,
+                     "caches": {"rendered_messages": len(_rendered_messages), "photo_file_ids": len(_photo_file_ids)}}
+            report = await profiler.profile_memory(seconds, extra)
+            files = [(f"memory_{stamp}.txt", report.encode())]
+        else:
+            report, collapsed = await profiler.profile_sample(seconds)
+            files = [(f"profile_{stamp}.txt", report.encode()), (f"stacks_{stamp}.collapsed", collapsed.encode())]
+        for filename, data in files:
+            await bot.send_document(chat_id, BufferedInputFile(data, filename=filename))
+    except Exception as e:
+        logging.exception("Ошибка профилирования")
+        try: await bot.send_message(chat_id, f"❌ Ошибка профилирования: {e}")
+        except: pass
 
 async def main():
     await init_db()
     print("🚀 Бот запущен!")
-    await dp.start_polling(bot)
+    # handle_as_tasks=False: апдейты раздает update_executor, поллинг ждет при полной очереди
+    await dp.start_polling(bot, handle_as_tasks=False)
 
 if __name__ == "__main__":
     try: asyncio.run(main())
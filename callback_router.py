@@ -0,0 +1,137 @@
+from aiogram.dispatcher.event.handler import CallableObject
+
+
+class _Route:
+    __slots__ = ("key", "handler", "params", "nav")
+
+    def __init__(self, key, func, params, nav=False):
+        self.key = key
+        self.handler = CallableObject(callback=func)
+        self.params = params
+        self.nav = nav
+
+    def parse(self, rest):
+        """
+        Разбирает хвост callback_data на аргументы. Подчеркивания может содержать
+        только первый строковый параметр: 'a_b_5' при (field=str, id=int) -> field='a_b', id=5
+        """
+        if not self.params:
+            return {} if not rest else None
+        names = list(self.params)
+        # Параметры до первого строкового отделяются слева, остальные - справа
+        head = next((i for i, name in enumerate(names) if self.params[name] is str), len(names) - 1)
+        left = rest.split("_", head) if head else [rest]
+        if len(left) != head + 1:
+            return None
+        tail = len(names) - head - 1
+        right = left.pop().rsplit("_", tail) if tail else [left.pop()]
+        parts = left + right
+        if len(parts) != len(names) or not all(parts):
+            return None
+        try:
+            return {name: self.params[name](part) for name, part in zip(names, parts)}
+        except ValueError:
+            return None
+
+
+class _Node:
+    __slots__ = ("children", "exact", "prefix")
+
+    def __init__(self):
+        self.children = {}
+        self.exact = None    # маршрут для callback_data, совпадающей целиком
+        self.prefix = None   # маршрут для callback_data, начинающейся с этого пути
+
+
+class CallbackTrie:
+    """
+    Маршрутизация callback_data по префиксному дереву.
+
+    Вместо перебора сотни фильтров F.data.startswith(...) один проход по строке
+    находит самый длинный подходящий префикс (или точное совпадение), а хвост
+    разбирается в именованные аргументы и передается в хендлер:
+
+        @callbacks.prefix("game_page_", tid=int, page=int)
+        async def games_pagination(callback, state, page): ...
+
+    Хендлер получает только те аргументы, которые объявлены в его сигнатуре.
+
+    nav=True помечает чисто навигационные маршруты (листание, просмотр): только
+    их более новое нажатие на том же сообщении может заменить ожидающее
+    (см. callback_throttle.py).
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    def _node(self, key):
+        node = self._root
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+        return node
+
+    def exact(self, data, nav=False):
+        def decorator(func):
+            node = self._node(data)
+            if node.exact is not None:
+                raise ValueError(f"Маршрут '{data}' уже зарегистрирован")
+            node.exact = _Route(data, func, {}, nav)
+            return func
+        return decorator
+
+    def prefix(self, prefix, nav=False, **params):
+        def decorator(func):
+            node = self._node(prefix)
+            if node.prefix is not None:
+                raise ValueError(f"Префикс '{prefix}' уже зарегистрирован")
+            node.prefix = _Route(prefix, func, params, nav)
+            return func
+        return decorator
+
+    def match(self, data):
+        """Возвращает (маршрут, аргументы) или None"""
+        node = self._root
+        best = None
+        for pos, ch in enumerate(data):
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.prefix is not None:
+                best = (node.prefix, pos + 1)
+        else:
+            if node.exact is not None:
+                return node.exact, {}
+
+        if best is None:
+            return None
+        route, pos = best
+        args = route.parse(data[pos:])
+        if args is None:
+            return None
+        return route, args
+
+    def is_navigation(self, data):
+        """True, если callback_data ведет на маршрут с nav=True"""
+        found = self.match(data) if data else None
+        return found is not None and found[0].nav
+
+    def route_key(self, data):
+        """Ключ маршрута ('view_team_' для 'view_team_12') или None, если не из дерева"""
+        found = self.match(data) if data else None
+        return found[0].key if found is not None else None
+
+    async def _filter(self, callback):
+        if not callback.data:
+            return False
+        found = self.match(callback.data)
+        if found is None:
+            return False
+        return {"callback_route": found[0], "callback_args": found[1]}
+
+    async def _dispatch(self, callback, callback_route, callback_args, **data):
+        return await callback_route.handler.call(callback, **data, **callback_args)
+
+    def setup(self, dp):
+        # Регистрировать раньше остальных callback-хендлеров: не найденная в дереве
+        # callback_data проходит дальше к хендлерам с фильтрами по состоянию
+        dp.callback_query.register(self._dispatch, self._filter)
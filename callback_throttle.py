@@ -0,0 +1,107 @@
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+
+# --- НАСТРОЙКИ ---
+RATE = 3.0          # нажатий в секунду на пользователя (скорость пополнения)
+BURST = 6           # сколько нажатий можно сделать подряд
+BUCKETS_LIMIT = 10000
+THROTTLE_TEXT = "⏳ Не так быстро"
+
+
+class CallbackThrottleMiddleware(BaseMiddleware):
+    """
+    Троттлинг нажатий на кнопки по пользователю + отбрасывание устаревших нажатий.
+
+    Если по одному сообщению пришло новое нажатие, пока старое еще ждет
+    обработки (например, быстрые клики по стрелкам пагинации), старое
+    отбрасывается: на него сразу отвечаем, чтобы у клиента пропала крутилка.
+    Только когда оба нажатия навигационные (is_navigation(data)): действия,
+    шаги мастеров и подтверждения всегда обрабатываются по очереди.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, is_navigation=None):
+        self.rate = rate
+        self.burst = burst
+        self.is_navigation = is_navigation or (lambda data: False)
+        self._buckets = {}   # user_id -> [токены, время последнего пополнения]
+        self._latest = {}    # (chat_id, message_id) -> id последнего нажатия
+        self._waiting = {}   # id нажатия -> (bot, CallbackQuery, навигационное ли), принятые и еще не обработанные
+        self.stats = {"passed": 0, "throttled": 0, "superseded": 0}
+
+    def setup(self, dp):
+        # Регистрировать ДО update_executor: отметка ставится в момент получения апдейта,
+        # а проверка - перед самим хендлером
+        dp.update.outer_middleware(self._on_receive)
+        dp.callback_query.outer_middleware(self)
+
+    def _take_token(self, user_id):
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= BUCKETS_LIMIT:
+                self._prune(now)
+            bucket = self._buckets[user_id] = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _prune(self, now):
+        # Пользователи, у которых корзина уже полностью восстановилась, ничего не теряют
+        full_after = self.burst / self.rate
+        for user_id in [u for u, (_, ts) in self._buckets.items() if now - ts >= full_after]:
+            del self._buckets[user_id]
+
+    @staticmethod
+    async def _answer(bot, callback, text=None):
+        try:
+            await bot.answer_callback_query(callback.id, text=text)
+        except TelegramAPIError:
+            pass
+
+    async def _on_receive(self, handler, event, data):
+        callback = event.callback_query
+        if callback is None:
+            return await handler(event, data)
+
+        bot = data["bot"]
+        if not self._take_token(callback.from_user.id):
+            self.stats["throttled"] += 1
+            await self._answer(bot, callback, THROTTLE_TEXT)
+            return None
+
+        if callback.message is not None:
+            key = (callback.message.chat.id, callback.message.message_id)
+            prev_id = self._latest.get(key)
+            self._latest[key] = callback.id
+            nav = self.is_navigation(callback.data)
+            prev = self._waiting.get(prev_id) if prev_id and nav else None
+            if prev is not None and prev[2]:
+                del self._waiting[prev_id]
+                self.stats["superseded"] += 1
+                await self._answer(prev[0], prev[1])
+            self._waiting[callback.id] = (bot, callback, nav)
+
+        return await handler(event, data)
+
+    async def __call__(self, handler, event, data):
+        if event.message is None:
+            self.stats["passed"] += 1
+            return await handler(event, data)
+
+        if self._waiting.pop(event.id, None) is None:
+            # Нажатие уже заменено более новым и отвечено в _on_receive
+            return None
+
+        key = (event.message.chat.id, event.message.message_id)
+        self.stats["passed"] += 1
+        try:
+            return await handler(event, data)
+        finally:
+            if self._latest.get(key) == event.id:
+                del self._latest[key]
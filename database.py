@@ -1,11 +1,481 @@
 import aiosqlite
+import asyncio
+import contextlib
+import contextvars
+import functools
 import json
+import logging
 import math
+import re
+import sqlite3
+import threading
+import time
 
 DB_NAME = 'bot_database.db'
 
+# --- ТРАССИРОВКА ЗАПРОСОВ ---
+# Фабрика слушателя: вызывается в цикле событий при открытии соединения и
+# возвращает listener(sql, params, seconds, fetch) или None. Сам listener
+# вызывается уже в потоке aiosqlite после каждого execute/fetch* и commit.
+# Так слушатель может запомнить контекст апдейта, открывшего соединение.
+# Если у слушателя есть rebind(), Session вызывает его (тоже в цикле событий),
+# когда общее соединение апдейта берет следующий хелпер.
+statement_listener = None
+
+# --- ЖУРНАЛ МЕДЛЕННЫХ ЗАПРОСОВ ---
+# Запрос, на который (вместе с выборкой строк) ушло больше SLOW_QUERY_MS,
+# пишется в лог с формой параметров и EXPLAIN QUERY PLAN. 0 - выключено.
+SLOW_QUERY_MS = 50
+SLOW_QUERIES_LIMIT = 200
+
+slow_log = logging.getLogger("slow_query")
+_slow_queries = {}          # нормализованный SQL -> сводка (см. get_slow_queries)
+_slow_lock = threading.Lock()
+_SPACES = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "WITH")
+
+
+def _param_shape(params):
+    """Типы параметров без значений: (str[5], int, None)"""
+    if params is None:
+        return "many"
+    if isinstance(params, dict):
+        params = params.values()
+    parts = []
+    for p in params:
+        if isinstance(p, (str, bytes)):
+            parts.append(f"{type(p).__name__}[{len(p)}]")
+        else:
+            parts.append(type(p).__name__ if p is not None else "None")
+    return "(" + ", ".join(parts) + ")"
+
+
+def _query_plan(conn, sql, params):
+    """Строки EXPLAIN QUERY PLAN и флаги: полные сканы и временные B-деревья"""
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return [], []
+    try:
+        # Обычный курсор, чтобы сам EXPLAIN не попадал в трассировку
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"EXPLAIN не выполнен: {e}"], []
+    plan, flags = [], []
+    for row in rows:
+        detail = row[-1]
+        plan.append(detail)
+        if detail.startswith("SCAN ") and "USING" not in detail:
+            flags.append("FULL " + detail)
+        elif detail.startswith("SCAN "):
+            flags.append(detail)
+        elif "TEMP B-TREE" in detail:
+            flags.append(detail)
+    return plan, flags
+
+
+def _record_slow_query(conn, sql, params, seconds):
+    key = _SPACES.sub(" ", sql).strip()
+    ms = seconds * 1000
+    with _slow_lock:
+        entry = _slow_queries.get(key)
+        if entry is not None:
+            entry["count"] += 1
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["total_ms"] += ms
+            return
+        if len(_slow_queries) >= SLOW_QUERIES_LIMIT:
+            return
+
+    # План снимается один раз на запрос: он не зависит от значений параметров
+    plan, flags = _query_plan(conn, sql, params)
+    entry = {"count": 1, "max_ms": ms, "total_ms": ms, "shape": _param_shape(params), "plan": plan, "flags": flags}
+    with _slow_lock:
+        _slow_queries.setdefault(key, entry)
+    slow_log.warning(
+        "Медленный запрос %.1f мс%s: %s\n  параметры: %s\n  план:\n    %s",
+        ms, " [SCAN]" if any(f.startswith("FULL") for f in flags) else "", key[:300],
+        entry["shape"], "\n    ".join(plan) or "-",
+    )
+
+
+def get_slow_queries():
+    """Медленные запросы с момента запуска: [(sql, сводка)], самые затратные первыми"""
+    with _slow_lock:
+        items = [(k, dict(v)) for k, v in _slow_queries.items()]
+    return sorted(items, key=lambda kv: kv[1]["total_ms"], reverse=True)
+
+
+def reset_slow_queries():
+    with _slow_lock:
+        _slow_queries.clear()
+
+
+class _TracedCursor(sqlite3.Cursor):
+    _sql = None
+    _params = None
+    _spent = 0.0
+    _slow = False
+
+    def _start(self, sql, params):
+        self._sql, self._params = sql, params
+        self._spent, self._slow = 0.0, False
+
+    def _report(self, started, fetch=False):
+        elapsed = time.perf_counter() - started
+        self._spent += elapsed
+        listener = self.connection._listener
+        if listener is not None:
+            try: listener(self._sql, self._params, elapsed, fetch)
+            except: pass
+        if SLOW_QUERY_MS and not self._slow and self._spent * 1000 >= SLOW_QUERY_MS:
+            # Отмечаем один раз на выполнение, даже если выборка идет кусками
+            self._slow = True
+            try: _record_slow_query(self.connection, self._sql, self._params, self._spent)
+            except: pass
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._report(started)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._report(started)
+
+    # SQLite выполняет запрос лениво: время выборки строк тоже относим к запросу
+    def fetchone(self):
+        started = time.perf_counter()
+        try: return super().fetchone()
+        finally: self._report(started, True)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try: return super().fetchmany(self.arraysize if size is None else size)
+        finally: self._report(started, True)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try: return super().fetchall()
+        finally: self._report(started, True)
+
+
+# --- ПРОФИЛЬ ХРАНИЛИЩА ---
+# WAL: читатели не ждут писателя, коммит пишет только в журнал (без fsync
+# основного файла). Режим хранится в самом файле базы - ставится в init_db.
+JOURNAL_MODE = "WAL"
+# Применяются к каждому новому соединению (см. _Connection)
+CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",        # в WAL fsync только на чекпоинте; при сбое питания теряется лишь хвост журнала
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",         # 16 МБ страничного кэша
+    "PRAGMA mmap_size=268435456",       # 256 МБ файла читаются через mmap
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3-соединение с CONNECTION_PRAGMAS (создается в потоке aiosqlite)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for pragma in CONNECTION_PRAGMAS:
+            sqlite3.Connection.execute(self, pragma)
+
+
+class _TracedConnection(_Connection):
+    def __init__(self, *args, listener=None, **kwargs):
+        self._listener = None
+        super().__init__(*args, **kwargs)
+        self._listener = listener
+
+    def cursor(self, factory=_TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            if self._listener is not None:
+                try: self._listener("COMMIT", None, time.perf_counter() - started, False)
+                except: pass
+
+
+def connect():
+    """aiosqlite.connect(DB_NAME) с профилем хранилища и трассировкой (слушатель, медленные запросы)"""
+    return _open(statement_listener() if statement_listener is not None else None)
+
+
+def _open(listener):
+    if listener is None and not SLOW_QUERY_MS:
+        return aiosqlite.connect(DB_NAME, factory=_Connection)
+    return aiosqlite.connect(DB_NAME, factory=functools.partial(_TracedConnection, listener=listener))
+
+# --- ОЧЕРЕДЬ ЗАПИСИ ---
+# Все изменения идут через одну задачу-писателя с собственным соединением:
+# операции, пришедшие в пределах WRITE_BATCH_WINDOW, выполняются в одной
+# транзакции (один COMMIT и один fsync журнала на пачку), каждая - в своем
+# SAVEPOINT, так что ошибка одной не откатывает соседей.
+
+WRITE_BATCH_WINDOW = 0.003      # сколько ждать попутчиков после первой операции, секунды (только при наплыве)
+WRITE_BATCH_LIMIT = 64          # операций в одной транзакции
+WRITER_IDLE_CLOSE = 30          # соединение писателя закрывается после простоя, секунды
+
+write_stats = {"ops": 0, "batches": 0, "max_batch": 0, "errors": 0, "commit_failures": 0,
+               "connection_failures": 0, "commit_max_ms": 0.0}
+_writer = None
+_STOP = object()
+
+
+class _Writer:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.last_batch = 0
+        # Чистый контекст: иначе задача унаследует апдейт, который ее запустил (см. perf.py)
+        self.task = self.loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _next(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    async def _run(self):
+        item = None
+        while item is not _STOP:
+            if item is None:
+                item = await self.queue.get()
+                continue
+            try:
+                async with connect() as db:
+                    while item is not None and item is not _STOP:
+                        item = await self._batch(db, item)
+                        if item is None:
+                            item = await self._next(WRITER_IDLE_CLOSE)
+            except Exception as e:
+                # База не открылась или соединение сломалось: ждущие сразу получают
+                # ошибку, а следующая запись попробует подключиться заново
+                write_stats["connection_failures"] += 1
+                logging.exception("Писатель базы: ошибка соединения")
+                item = self._fail_pending(item, e)
+
+    def _fail_pending(self, item, error):
+        """Отдает error item и всем операциям в очереди; возвращает _STOP, если он там был"""
+        pending = [item]
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        stop = None
+        for entry in pending:
+            if entry is _STOP:
+                stop = _STOP
+            elif entry is not None and not entry[1].done():
+                entry[1].set_exception(error)
+        return stop
+
+    async def _apply(self, db, op, future):
+        db.row_factory = None
+        await db.execute("SAVEPOINT op")
+        try:
+            result = await op(db)
+        except Exception as e:
+            await db.execute("ROLLBACK TO op")
+            await db.execute("RELEASE op")
+            write_stats["errors"] += 1
+            if not future.done():
+                future.set_exception(e)
+            return
+        await db.execute("RELEASE op")
+        return result
+
+    async def _batch(self, db, item):
+        """Пачка операций в одной транзакции, начиная с item; возвращает уже взятый из очереди следующий элемент"""
+        done = []
+        # Одиночную запись не задерживаем: окно ждем, только если и прошлая пачка была не из одной операции
+        deadline = time.monotonic() + (WRITE_BATCH_WINDOW if self.last_batch > 1 else 0)
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            # База занята дольше busy_timeout или ошибка ввода-вывода: операция
+            # уже взята из очереди - отдаем ошибку ей, иначе _run повторял бы ее вечно
+            write_stats["commit_failures"] += 1
+            future = item[1]
+            if not future.done():
+                future.set_exception(e)
+            return None
+        try:
+            while True:
+                op, future = item
+                item = None
+                if not future.cancelled():
+                    done.append([future, None])
+                    done[-1][1] = await self._apply(db, op, future)
+                if len(done) >= WRITE_BATCH_LIMIT:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    item = await self._next(deadline - time.monotonic())
+                if item is None or item is _STOP:
+                    break
+            self.last_batch = len(done)
+            started = time.perf_counter()
+            await db.commit()
+        except Exception as e:
+            write_stats["commit_failures"] += 1
+            try: await db.rollback()
+            except: pass
+            for future, _ in done:
+                if not future.done():
+                    future.set_exception(e)
+            return item
+        ms = (time.perf_counter() - started) * 1000
+        write_stats["commit_max_ms"] = round(max(write_stats["commit_max_ms"], ms), 1)
+        write_stats["batches"] += 1
+        write_stats["ops"] += len(done)
+        write_stats["max_batch"] = max(write_stats["max_batch"], len(done))
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+        return item
+
+
+async def write(op, session=None):
+    """
+    Выполняет op(db) в транзакции писателя и возвращает ее результат после COMMIT.
+    op не коммитит сам и не должен вызывать write() - писатель один.
+    Снимок сессии апдейта после этого обновляется: хендлер видит свою запись.
+    """
+    global _writer
+    if _writer is None or _writer.loop is not asyncio.get_running_loop() or _writer.task.done():
+        _writer = _Writer()
+    future = _writer.loop.create_future()
+    _writer.queue.put_nowait((op, future))
+    try:
+        return await future
+    finally:
+        session = session or current_session.get()
+        if session is not None:
+            session.stale = True
+
+
+async def close_writer():
+    """Дописывает очередь и закрывает соединение писателя (при остановке бота)"""
+    global _writer
+    writer, _writer = _writer, None
+    if writer is None or writer.task.done() or writer.loop is not asyncio.get_running_loop():
+        return
+    writer.queue.put_nowait(_STOP)
+    await writer.task
+
+
+def writer_summary():
+    return {**write_stats, "queued": _writer.queue.qsize() if _writer is not None else 0}
+
+# --- СЕССИЯ АПДЕЙТА ---
+# Одно соединение на апдейт (ставит db_session.DBSessionMiddleware): все
+# хелперы чтения экрана идут через него и видят один снимок базы. Хелперы
+# принимают session=None и тогда берут сессию текущего апдейта, а вне
+# апдейта (фоновые задачи, скрипты) открывают соединение сами.
+
+current_session = contextvars.ContextVar("db_session", default=None)
+session_stats = {"sessions": 0, "connections": 0, "refreshes": 0}
+
+
+class Session:
+    """Соединение открывается при первом запросе и держит читающую транзакцию (снимок)"""
+
+    def __init__(self):
+        self._db = None
+        self._listener = None
+        self.stale = False
+        self.closed = False
+        session_stats["sessions"] += 1
+
+    async def connection(self):
+        if self._db is None:
+            self._listener = statement_listener() if statement_listener is not None else None
+            self._db = await _open(self._listener)
+            await self._db.execute("BEGIN")
+            session_stats["connections"] += 1
+        else:
+            # Запросы дальше относятся к хелперу, который взял соединение сейчас
+            rebind = getattr(self._listener, "rebind", None)
+            if rebind is not None:
+                rebind()
+        if self.stale:
+            # Была запись через write(): начинаем новый снимок
+            await self._db.rollback()
+            await self._db.execute("BEGIN")
+            session_stats["refreshes"] += 1
+        self.stale = False
+        self._db.row_factory = None
+        return self._db
+
+    async def close(self):
+        self.closed = True
+        db, self._db = self._db, None
+        if db is not None:
+            try: await db.rollback()
+            except: pass
+            await db.close()
+
+
+@contextlib.asynccontextmanager
+async def reading(session=None):
+    """Соединение для чтения: сессии апдейта, если она есть, иначе отдельное"""
+    session = session or current_session.get()
+    if session is None or session.closed:
+        async with connect() as db:
+            yield db
+    else:
+        yield await session.connection()
+
+# --- ИНДЕКСЫ ---
+# Под конкретные запросы ниже; выражения должны совпадать с запросами буквально,
+# иначе SQLite индекс по выражению не использует.
+INDEXES = [
+    # get_team_by_tag, check_team_exists, get_team_rank_alphabetical, сортировка по тегу
+    "CREATE INDEX IF NOT EXISTS idx_teams_tag_lower ON teams(LOWER(tag))",
+    # check_team_exists, сортировка по имени
+    "CREATE INDEX IF NOT EXISTS idx_teams_name_lower ON teams(LOWER(name))",
+    # get_games_paginated: WHERE tournament_id = ? ORDER BY created_at DESC, COUNT(*) по турниру
+    "CREATE INDEX IF NOT EXISTS idx_games_tournament_created ON games(tournament_id, created_at)",
+    # get_games_paginated с фильтром по дате
+    "CREATE INDEX IF NOT EXISTS idx_games_tournament_date ON games(tournament_id, game_date, created_at)",
+    # get_player_stats_and_rank: все игры ORDER BY created_at DESC без временной сортировки
+    "CREATE INDEX IF NOT EXISTS idx_games_created ON games(created_at)",
+    # get_player_stats_and_rank, update_player_nickname_in_roster
+    "CREATE INDEX IF NOT EXISTS idx_transfers_player ON transfers(player_name)",
+    # get_tournaments_paginated и get_tournament_choices: ORDER BY year DESC, full_name ASC
+    "CREATE INDEX IF NOT EXISTS idx_tournaments_year ON tournaments(year DESC, full_name)",
+    # check_tournament_exists, сортировка по алфавиту
+    "CREATE INDEX IF NOT EXISTS idx_tournaments_name_lower ON tournaments(LOWER(full_name))",
+    # set_admin_role: UPDATE ... WHERE username = ? (users растет с каждым /start)
+    "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+    # get_admins_paginated: частичный индекс только по админам
+    "CREATE INDEX IF NOT EXISTS idx_users_admins ON users(is_admin DESC, username) WHERE is_admin > 0",
+]
+
 async def init_db():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
+        # auto_vacuum применяется только к новой базе (до первой таблицы); у старой
+        # ничего не меняет - ее переводят разово: python db_maintenance.py --enable-incremental-vacuum
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+
         # 1. Юзеры
         await db.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -103,6 +573,10 @@ async def init_db():
         try: await db.execute("ALTER TABLE games ADD COLUMN game_format TEXT")
         except: pass
 
+        # Индексы (CREATE INDEX IF NOT EXISTS - миграция для старых баз тоже)
+        for sql in INDEXES:
+            await db.execute(sql)
+
         await db.commit()
 
     await ensure_fft_team()
@@ -115,10 +589,10 @@ async def ensure_fft_team():
 #        ЮЗЕРЫ
 # =======================
 
-async def add_user(user_id, username):
+async def add_user(user_id, username, session=None):
     role = 2 if username == "matvei_dev" else 0
     sys_promo = "SYSTEM" if role == 2 else None
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute('''
             INSERT INTO users (user_id, username, is_admin, promoted_by)
             VALUES (?, ?, ?, ?)
@@ -127,41 +601,41 @@ async def add_user(user_id, username):
                 is_admin = CASE WHEN username = 'matvei_dev' THEN 2 ELSE is_admin END,
                 promoted_by = CASE WHEN username = 'matvei_dev' AND promoted_by IS NULL THEN 'SYSTEM' ELSE promoted_by END
         ''', (user_id, username, role, sys_promo))
-        await db.commit()
+    await write(op, session)
 
-async def get_user_info(user_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_user_info(user_id, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM users WHERE user_id=?',(user_id,)) as cur:
             row = await cur.fetchone()
             return dict(row) if row else None
 
-async def check_is_admin(uid):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def check_is_admin(uid, session=None):
+    async with reading(session) as db:
         async with db.execute('SELECT is_admin FROM users WHERE user_id=?',(uid,)) as cur:
             res = await cur.fetchone()
             return (res[0] >= 1) if res else False
 
-async def check_is_owner(uid):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def check_is_owner(uid, session=None):
+    async with reading(session) as db:
         async with db.execute('SELECT is_admin FROM users WHERE user_id=?',(uid,)) as cur:
             res = await cur.fetchone()
             return (res[0] >= 2) if res else False
 
-async def set_admin_role(target_username, promoter, role_level):
+async def set_admin_role(target_username, promoter, role_level, session=None):
     target_clean = target_username.replace("@", "")
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute('UPDATE users SET is_admin=?, promoted_by=? WHERE username=?', (role_level, promoter, target_clean))
-        await db.commit()
+    await write(op, session)
 
-async def remove_admin_role(user_db_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def remove_admin_role(user_db_id, session=None):
+    async def op(db):
         await db.execute('UPDATE users SET is_admin=0, promoted_by=NULL WHERE user_id=?', (user_db_id,))
-        await db.commit()
+    await write(op, session)
 
-async def get_admins_paginated(page=0, limit=3):
+async def get_admins_paginated(page=0, limit=3, session=None):
     offset = page * limit
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT COUNT(*) FROM users WHERE is_admin > 0') as cur:
             total_count = (await cur.fetchone())[0]
@@ -171,8 +645,8 @@ async def get_admins_paginated(page=0, limit=3):
     total_pages = math.ceil(total_count / limit)
     return admins, total_pages, total_count
 
-async def get_user_by_db_id(id_val):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_user_by_db_id(id_val, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM users WHERE user_id=?',(id_val,)) as cur:
             row = await cur.fetchone()
@@ -182,50 +656,56 @@ async def get_user_by_db_id(id_val):
 #       КОМАНДЫ
 # =======================
 
-async def check_team_exists(name, tag):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def check_team_exists(name, tag, session=None):
+    async with reading(session) as db:
         sql = 'SELECT id FROM teams WHERE LOWER(name) = LOWER(?) OR LOWER(tag) = LOWER(?)'
         async with db.execute(sql, (name, tag)) as cursor:
             return True if await cursor.fetchone() else False
 
-async def get_team_by_tag(tag):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_team_by_tag(tag, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         sql = 'SELECT * FROM teams WHERE LOWER(tag) = LOWER(?)'
         async with db.execute(sql, (tag,)) as cursor:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
-async def create_team(name, tag, roster, logo_base64):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_team_tags(session=None):
+    """LOWER(tag) -> tag как записан в базе"""
+    async with reading(session) as db:
+        async with db.execute('SELECT tag FROM teams') as cursor:
+            return {row[0].lower(): row[0] for row in await cursor.fetchall() if row[0]}
+
+async def create_team(name, tag, roster, logo_base64, session=None):
+    async def op(db):
         await db.execute('''
             INSERT INTO teams (name, tag, rank, roster, logo_base64, games_ids, achievements)
             VALUES (?, ?, 0, ?, ?, "[]", "[]")
         ''', (name, tag, roster, logo_base64))
-        await db.commit()
+    await write(op, session)
 
-async def get_team_by_id(team_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_team_by_id(team_id, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM teams WHERE id = ?', (team_id,)) as cursor:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
-async def delete_team(team_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def delete_team(team_id, session=None):
+    async def op(db):
         await db.execute('DELETE FROM teams WHERE id = ?', (team_id,))
-        await db.commit()
+    await write(op, session)
 
-async def update_team_field(team_id, field, val):
+async def update_team_field(team_id, field, val, session=None):
     if field not in ['name', 'tag', 'roster', 'logo_base64']: return False
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute(f'UPDATE teams SET {field}=? WHERE id=?', (val, team_id))
-        await db.commit()
+    await write(op, session)
     return True
 
-async def get_teams_paginated(page=0, limit=3, sort_by='tag'):
+async def get_teams_paginated(page=0, limit=3, sort_by='tag', session=None):
     offset = page * limit
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT COUNT(*) FROM teams') as cur:
             total_count = (await cur.fetchone())[0]
@@ -238,9 +718,9 @@ async def get_teams_paginated(page=0, limit=3, sort_by='tag'):
     return teams, total_pages, total_count
 
 # --- ФУНКЦИИ ДЛЯ УПРАВЛЕНИЯ УЧАСТНИКАМИ ТУРНИРА ---
-async def add_team_to_tournament(tournament_id: int, team_id: int):
+async def add_team_to_tournament(tournament_id: int, team_id: int, session=None):
     """Добавляет команду в список участников турнира"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         # Получаем текущих участников
         async with db.execute('SELECT participants FROM tournaments WHERE id=?', (tournament_id,)) as cur:
             row = await cur.fetchone()
@@ -262,12 +742,12 @@ async def add_team_to_tournament(tournament_id: int, team_id: int):
         # Обновляем в БД
         await db.execute('UPDATE tournaments SET participants=? WHERE id=?',
                         (json.dumps(participants), tournament_id))
-        await db.commit()
         return True
+    return await write(op, session)
 
-async def remove_team_from_tournament(tournament_id: int, team_id: int):
+async def remove_team_from_tournament(tournament_id: int, team_id: int, session=None):
     """Удаляет команду из списка участников турнира"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         async with db.execute('SELECT participants FROM tournaments WHERE id=?', (tournament_id,)) as cur:
             row = await cur.fetchone()
             if not row:
@@ -285,14 +765,14 @@ async def remove_team_from_tournament(tournament_id: int, team_id: int):
             # Обновляем в БД
             await db.execute('UPDATE tournaments SET participants=? WHERE id=?',
                             (json.dumps(participants), tournament_id))
-            await db.commit()
             return True
 
         return False
+    return await write(op, session)
 
-async def get_tournament_participants(tournament_id: int):
+async def get_tournament_participants(tournament_id: int, session=None):
     """Возвращает список участников турнира с полной информацией о командах"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         # Получаем участников турнира
         async with db.execute('SELECT participants FROM tournaments WHERE id=?', (tournament_id,)) as cur:
             row = await cur.fetchone()
@@ -319,9 +799,9 @@ async def get_tournament_participants(tournament_id: int):
 
         return sorted_teams
 
-async def set_tournament_winner(tournament_id: int, place: str, team_id: int):
+async def set_tournament_winner(tournament_id: int, place: str, team_id: int, session=None):
     """Устанавливает победителя турнира для определенного места"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         # Получаем текущих победителей
         async with db.execute('SELECT winners FROM tournaments WHERE id=?', (tournament_id,)) as cur:
             row = await cur.fetchone()
@@ -339,11 +819,11 @@ async def set_tournament_winner(tournament_id: int, place: str, team_id: int):
         # Обновляем в БД
         await db.execute('UPDATE tournaments SET winners=? WHERE id=?',
                         (json.dumps(winners), tournament_id))
-        await db.commit()
         return True
+    return await write(op, session)
 
-async def get_team_rank_alphabetical(team_tag):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_team_rank_alphabetical(team_tag, session=None):
+    async with reading(session) as db:
         query = 'SELECT COUNT(*) FROM teams WHERE LOWER(tag) < LOWER(?)'
         async with db.execute(query, (team_tag,)) as cursor:
             count_before = (await cursor.fetchone())[0]
@@ -353,8 +833,8 @@ async def get_team_rank_alphabetical(team_tag):
 #   ИГРОКИ
 # =======================
 
-async def update_player_metadata(nickname, first_name=None, last_name=None, photo_id=None):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def update_player_metadata(nickname, first_name=None, last_name=None, photo_id=None, session=None):
+    async def op(db):
         async with db.execute('SELECT nickname FROM player_metadata WHERE nickname = ?', (nickname,)) as cur:
             exists = await cur.fetchone()
 
@@ -365,17 +845,17 @@ async def update_player_metadata(nickname, first_name=None, last_name=None, phot
         else:
             await db.execute('INSERT INTO player_metadata (nickname, first_name, last_name, photo_file_id) VALUES (?, ?, ?, ?)',
                              (nickname, first_name or "", last_name or "", photo_id))
-        await db.commit()
+    await write(op, session)
 
-async def get_player_metadata(nickname):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_player_metadata(nickname, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM player_metadata WHERE nickname = ?', (nickname,)) as cur:
             row = await cur.fetchone()
             return dict(row) if row else {}
 
-async def perform_player_transfer(player_nickname, old_team_id, new_team_id, date_str):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def perform_player_transfer(player_nickname, old_team_id, new_team_id, date_str, session=None):
+    async def op(db):
         async with db.execute('SELECT id, roster, name, tag FROM teams WHERE id=?', (old_team_id,)) as cur:
             old_team_row = await cur.fetchone()
         async with db.execute('SELECT id, roster, name, tag FROM teams WHERE id=?', (new_team_id,)) as cur:
@@ -399,11 +879,11 @@ async def perform_player_transfer(player_nickname, old_team_id, new_team_id, dat
 
         await db.execute('INSERT INTO transfers (player_name, old_team, new_team, date) VALUES (?, ?, ?, ?)',
                          (player_nickname, old_team_display, new_team_display, date_str))
-        await db.commit()
         return True, f"Переведен в {new_team_display}"
+    return await write(op, session)
 
-async def update_player_nickname_in_roster(old_nick, new_nick):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def update_player_nickname_in_roster(old_nick, new_nick, session=None):
+    async def op(db):
         await db.execute('UPDATE player_metadata SET nickname=? WHERE nickname=?', (new_nick, old_nick))
         await db.execute('UPDATE transfers SET player_name=? WHERE player_name=?', (new_nick, old_nick))
         async with db.execute('SELECT id, roster FROM teams') as cur:
@@ -413,10 +893,10 @@ async def update_player_nickname_in_roster(old_nick, new_nick):
             if old_nick in lines:
                 new_lines = [new_nick if x == old_nick else x for x in lines]
                 await db.execute('UPDATE teams SET roster=? WHERE id=?', ("\n".join(new_lines), tid))
-        await db.commit()
+    await write(op, session)
 
-async def get_all_roster_players_paginated(page=0, limit=10):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_all_roster_players_paginated(page=0, limit=10, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT roster, name, tag, id FROM teams') as cursor:
             rows = await cursor.fetchall()
@@ -441,13 +921,13 @@ async def get_all_roster_players_paginated(page=0, limit=10):
     return all_players[start:end], total_pages, total_count, all_players
 
 # --- ОБНОВЛЕННАЯ ФУНКЦИЯ ДЛЯ ДОСТИЖЕНИЙ С ПРИЗОВЫМИ ---
-async def get_player_achievements(player_nickname, current_team_id):
+async def get_player_achievements(player_nickname, current_team_id, session=None):
     """
     Возвращает список достижений (если текущая команда игрока выигрывала турниры)
     Формат: "🥇 GTC SEASON 1 - 1st (4000 RUB)"
     """
     achievements = []
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         # Ищем турниры с победителями
         async with db.execute("SELECT full_name, season, winners, prize_data FROM tournaments WHERE winners IS NOT NULL AND winners != '{}'") as cur:
@@ -495,15 +975,15 @@ async def get_player_achievements(player_nickname, current_team_id):
 
     return achievements
 
-async def get_player_stats_and_rank(player_nickname):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_player_stats_and_rank(player_nickname, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM games ORDER BY created_at DESC') as cursor:
             all_games = [dict(row) for row in await cursor.fetchall()]
         async with db.execute('SELECT * FROM transfers WHERE player_name = ?', (player_nickname,)) as cursor:
             transfers = [dict(row) for row in await cursor.fetchall()]
 
-    meta = await get_player_metadata(player_nickname)
+    meta = await get_player_metadata(player_nickname, session=session)
 
     global_scores = {}
     target_stats = {
@@ -559,7 +1039,7 @@ async def get_player_stats_and_rank(player_nickname):
             player_score = item['score']
             break
 
-    _, _, _, all_roster = await get_all_roster_players_paginated(0, 99999)
+    _, _, _, all_roster = await get_all_roster_players_paginated(0, 99999, session=session)
     current_team = "Без команды"
     current_team_id = 0
     for p in all_roster:
@@ -580,7 +1060,7 @@ async def get_player_stats_and_rank(player_nickname):
     kd = target_stats['k'] / target_stats['d'] if target_stats['d'] > 0 else target_stats['k']
 
     # Получаем достижения
-    achievements = await get_player_achievements(player_nickname, current_team_id)
+    achievements = await get_player_achievements(player_nickname, current_team_id, session=session)
 
     return {
         'nickname': player_nickname,
@@ -609,8 +1089,8 @@ async def get_player_stats_and_rank(player_nickname):
         'achievements': achievements
     }
 
-async def get_top_players_list(limit=10):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_top_players_list(limit=10, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT stats_json FROM games') as cursor:
             all_games = [dict(row) for row in await cursor.fetchall()]
@@ -644,47 +1124,73 @@ async def get_top_players_list(limit=10):
 #       ТУРНИРЫ
 # =======================
 
-async def check_tournament_exists(name):
-    async with aiosqlite.connect(DB_NAME) as db:
+# Список турниров для выбора в мастерах игр. Один на всех пользователей,
+# сбрасывается при создании, удалении и изменении турнира.
+TOURNAMENT_CHOICES_LIMIT = 100
+_tournament_choices = None
+
+def invalidate_tournament_choices():
+    global _tournament_choices
+    _tournament_choices = None
+
+async def get_tournament_choices(session=None):
+    global _tournament_choices
+    if _tournament_choices is None:
+        async with reading(session) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute('SELECT id, full_name, year FROM tournaments ORDER BY year DESC, full_name ASC LIMIT ?', (TOURNAMENT_CHOICES_LIMIT,)) as cursor:
+                _tournament_choices = tuple(dict(row) for row in await cursor.fetchall())
+    return _tournament_choices
+
+async def get_tournament_ids(session=None):
+    async with reading(session) as db:
+        async with db.execute('SELECT id FROM tournaments') as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+async def check_tournament_exists(name, session=None):
+    async with reading(session) as db:
         async with db.execute('SELECT id FROM tournaments WHERE LOWER(full_name) = LOWER(?)', (name,)) as cursor:
             return True if await cursor.fetchone() else False
 
-async def create_tournament(full_name, season, year, has_qualifiers, has_group_stage, logo_base64, prize_data, mvp_data):
+async def create_tournament(full_name, season, year, has_qualifiers, has_group_stage, logo_base64, prize_data, mvp_data, session=None):
     prize_json = json.dumps(prize_data) if prize_data else None
     mvp_json = json.dumps(mvp_data) if mvp_data else None
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute('''
             INSERT INTO tournaments
             (full_name, season, year, has_qualifiers, has_group_stage, logo_base64, prize_data, mvp_data, participants, winners)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, '[]', '{}')
         ''', (full_name, season, year, has_qualifiers, has_group_stage, logo_base64, prize_json, mvp_json))
-        await db.commit()
+    await write(op, session)
+    invalidate_tournament_choices()
 
-async def delete_tournament(tour_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def delete_tournament(tour_id, session=None):
+    async def op(db):
         await db.execute('DELETE FROM tournaments WHERE id = ?', (tour_id,))
-        await db.commit()
+    await write(op, session)
+    invalidate_tournament_choices()
 
-async def update_tournament_field(tour_id, field, val):
+async def update_tournament_field(tour_id, field, val, session=None):
     allowed = ['full_name', 'season', 'year', 'logo_base64', 'prize_data', 'mvp_data']
     if field not in allowed: return False
     if field in ['prize_data', 'mvp_data'] and not isinstance(val, str) and val is not None:
         val = json.dumps(val)
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute(f'UPDATE tournaments SET {field}=? WHERE id=?', (val, tour_id))
-        await db.commit()
+    await write(op, session)
+    invalidate_tournament_choices()
     return True
 
-async def get_tournament_by_id(tour_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_tournament_by_id(tour_id, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM tournaments WHERE id = ?', (tour_id,)) as cursor:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
-async def get_tournaments_paginated(page=0, limit=3, sort_by='alpha'):
+async def get_tournaments_paginated(page=0, limit=3, sort_by='alpha', session=None):
     offset = page * limit
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT COUNT(*) FROM tournaments') as cursor:
             total_count = (await cursor.fetchone())[0]
@@ -700,20 +1206,57 @@ async def get_tournaments_paginated(page=0, limit=3, sort_by='alpha'):
 #       ИГРЫ
 # =======================
 
-async def add_game_record(tour_id, game_date, game_format, map_name, t1_tag, t2_tag, s1, s2, rounds, stats_dict):
+async def add_game_record(tour_id, game_date, game_format, map_name, t1_tag, t2_tag, s1, s2, rounds, stats_dict, session=None):
     stats_json = json.dumps(stats_dict)
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         cursor = await db.execute('''
             INSERT INTO games (tournament_id, game_date, game_format, map_name, team1_tag, team2_tag, score_t1, score_t2, total_rounds, stats_json)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (tour_id, game_date, game_format, map_name, t1_tag, t2_tag, s1, s2, rounds, stats_json))
         new_id = cursor.lastrowid
-        await db.commit()
         return new_id
+    return await write(op, session)
 
-async def get_games_paginated(tour_id, page=0, limit=3, date_filter=None):
+async def add_game_records_many(records, session=None):
+    """records: кортежи (tour_id, game_date, game_format, map_name, t1_tag, t2_tag, s1, s2, rounds, stats_json)"""
+    async def op(db):
+        await db.executemany('''
+            INSERT INTO games (tournament_id, game_date, game_format, map_name, team1_tag, team2_tag, score_t1, score_t2, total_rounds, stats_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', records)
+    await write(op, session)
+    return len(records)
+
+# --- ПОТОКОВОЕ ЧТЕНИЕ ДЛЯ ЭКСПОРТА ---
+# Строки отдаются по одной, курсор читает их пачками по STREAM_CHUNK
+
+STREAM_CHUNK = 500
+
+async def iter_games(tour_id=None):
+    sql = 'SELECT id, tournament_id, game_date, game_format, map_name, team1_tag, team2_tag, score_t1, score_t2, total_rounds, stats_json, created_at FROM games'
+    params = ()
+    if tour_id is not None:
+        sql += ' WHERE tournament_id = ?'
+        params = (tour_id,)
+    sql += ' ORDER BY id'
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(sql, params) as cursor:
+            cursor.arraysize = STREAM_CHUNK
+            async for row in cursor:
+                yield dict(row)
+
+async def iter_transfers():
+    async with connect() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute('SELECT id, player_name, old_team, new_team, date FROM transfers ORDER BY id') as cursor:
+            cursor.arraysize = STREAM_CHUNK
+            async for row in cursor:
+                yield dict(row)
+
+async def get_games_paginated(tour_id, page=0, limit=3, date_filter=None, session=None):
     offset = page * limit
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
 
         where_sql = "WHERE tournament_id = ?"
@@ -734,22 +1277,22 @@ async def get_games_paginated(tour_id, page=0, limit=3, date_filter=None):
     total_pages = math.ceil(total_count / limit)
     return games, total_pages, total_count
 
-async def get_game_by_id(game_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def get_game_by_id(game_id, session=None):
+    async with reading(session) as db:
         db.row_factory = aiosqlite.Row
         async with db.execute('SELECT * FROM games WHERE id = ?', (game_id,)) as cursor:
             row = await cursor.fetchone()
             return dict(row) if row else None
 
-async def delete_game(game_id):
-    async with aiosqlite.connect(DB_NAME) as db:
+async def delete_game(game_id, session=None):
+    async def op(db):
         await db.execute('DELETE FROM games WHERE id = ?', (game_id,))
-        await db.commit()
+    await write(op, session)
 
-async def update_game_field(game_id, field, value):
+async def update_game_field(game_id, field, value, session=None):
     allowed = ['game_date', 'map_name', 'score_t1', 'score_t2', 'total_rounds']
     if field not in allowed: return False
-    async with aiosqlite.connect(DB_NAME) as db:
+    async def op(db):
         await db.execute(f'UPDATE games SET {field}=? WHERE id=?', (value, game_id))
-        await db.commit()
+    await write(op, session)
     return True
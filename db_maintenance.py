@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import database
+
+# --- НАСТРОЙКИ ---
+TICK_INTERVAL = 30              # как часто проверять, что пора делать, секунды
+QUIET_TICKS = 2                 # столько проверок подряд без апдейтов = «тихий период»
+CHECKPOINT_INTERVAL = 300       # плановый чекпоинт WAL
+WAL_SIZE_LIMIT = 32 * 1024 * 1024   # журнал больше этого - чекпоинт сразу, не дожидаясь тишины
+OPTIMIZE_INTERVAL = 6 * 3600    # PRAGMA optimize
+VACUUM_INTERVAL = 24 * 3600     # PRAGMA incremental_vacuum
+VACUUM_MIN_FREE_PAGES = 256     # меньше свободных страниц - не трогаем
+VACUUM_PAGES = 2000             # страниц за один проход (короткая блокировка записи)
+
+
+class DBMaintenance:
+    """
+    Фоновое обслуживание основной базы: чекпоинты WAL, PRAGMA optimize
+    и постепенный incremental_vacuum. Тяжелые операции - только в тихие
+    периоды (activity() не менялось QUIET_TICKS проверок подряд), чекпоинт
+    слишком большого журнала (PASSIVE, без ожидания читателей) - сразу.
+    """
+
+    def __init__(self, activity=None):
+        self.activity = activity    # функция -> счетчик обработанных апдейтов
+        self._task = None
+        self._last_activity = None
+        self._quiet_ticks = 0
+        now = time.monotonic()
+        self._last = {"checkpoint": now, "optimize": now, "vacuum": now}
+        self.stats = {
+            "wal_bytes": 0, "checkpoints": 0, "checkpoint_last_ms": 0.0, "checkpoint_max_ms": 0.0,
+            "checkpoint_busy": 0, "optimize_runs": 0, "vacuumed_pages": 0, "errors": 0,
+        }
+
+    @staticmethod
+    def wal_size():
+        try:
+            return os.path.getsize(database.DB_NAME + "-wal")
+        except OSError:
+            return 0
+
+    def _is_quiet(self):
+        if self.activity is None:
+            return True
+        current = self.activity()
+        if current == self._last_activity:
+            self._quiet_ticks += 1
+        else:
+            self._quiet_ticks = 0
+        self._last_activity = current
+        return self._quiet_ticks >= QUIET_TICKS
+
+    def _due(self, name, interval, now):
+        return now - self._last[name] >= interval
+
+    async def checkpoint(self, mode="PASSIVE"):
+        """Чекпоинт WAL; возвращает (busy, страниц в журнале, перенесено страниц)"""
+        started = time.perf_counter()
+        async with database.connect() as db:
+            async with db.execute(f"PRAGMA wal_checkpoint({mode})") as cur:
+                busy, log_pages, moved = await cur.fetchone()
+        ms = (time.perf_counter() - started) * 1000
+        self.stats["checkpoints"] += 1
+        self.stats["checkpoint_last_ms"] = round(ms, 1)
+        self.stats["checkpoint_max_ms"] = round(max(self.stats["checkpoint_max_ms"], ms), 1)
+        self.stats["checkpoint_busy"] += bool(busy)
+        self._last["checkpoint"] = time.monotonic()
+        return busy, log_pages, moved
+
+    async def optimize(self):
+        async with database.connect() as db:
+            await db.execute("PRAGMA optimize")
+        self.stats["optimize_runs"] += 1
+        self._last["optimize"] = time.monotonic()
+
+    async def incremental_vacuum(self):
+        async with database.connect() as db:
+            async with db.execute("PRAGMA auto_vacuum") as cur:
+                incremental = (await cur.fetchone())[0] == 2
+            async with db.execute("PRAGMA freelist_count") as cur:
+                free = (await cur.fetchone())[0]
+            # Без auto_vacuum=INCREMENTAL (старая база, см. enable_incremental_vacuum) прагма ничего не делает
+            if incremental and free >= VACUUM_MIN_FREE_PAGES:
+                pages = min(free, VACUUM_PAGES)
+                # incremental_vacuum возвращает строки по мере работы - их надо дочитать
+                async with db.execute(f"PRAGMA incremental_vacuum({pages})") as cur:
+                    await cur.fetchall()
+                await db.commit()
+                self.stats["vacuumed_pages"] += pages
+        self._last["vacuum"] = time.monotonic()
+
+    async def tick(self):
+        now = time.monotonic()
+        quiet = self._is_quiet()
+        wal = self.stats["wal_bytes"] = self.wal_size()
+
+        if wal > WAL_SIZE_LIMIT:
+            await self.checkpoint("PASSIVE")
+        if not quiet:
+            return
+        if self._due("checkpoint", CHECKPOINT_INTERVAL, now) and wal:
+            # В тишине можно дождаться читателей и обрезать файл журнала
+            await self.checkpoint("TRUNCATE")
+        if self._due("optimize", OPTIMIZE_INTERVAL, now):
+            await self.optimize()
+        if self._due("vacuum", VACUUM_INTERVAL, now):
+            await self.incremental_vacuum()
+        self.stats["wal_bytes"] = self.wal_size()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            try:
+                await self.tick()
+            except Exception:
+                self.stats["errors"] += 1
+                logging.exception("Ошибка обслуживания базы")
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try: await self._task
+        except asyncio.CancelledError: pass
+        self._task = None
+        # Перед выходом переносим журнал в основной файл
+        try: await self.checkpoint("TRUNCATE")
+        except Exception: pass
+
+    def setup(self, dp):
+        dp.startup.register(self.start)
+        dp.shutdown.register(self.stop)
+
+    def summary(self):
+        return {**self.stats, "wal_bytes": self.wal_size(), "quiet": self.activity is None or self._quiet_ticks >= QUIET_TICKS}
+
+
+async def enable_incremental_vacuum(path=None):
+    """
+    Разовый перевод существующей базы на auto_vacuum=INCREMENTAL. Это полный
+    VACUUM: база переписывается целиком (нужно ~2x ее размера на диске),
+    запись на это время заблокирована - запускать при остановленном боте.
+    Возвращает True, если база была переведена.
+    """
+    old_name = database.DB_NAME
+    database.DB_NAME = path or old_name
+    try:
+        async with database.connect() as db:
+            async with db.execute("PRAGMA auto_vacuum") as cur:
+                if (await cur.fetchone())[0] == 2:
+                    return False
+            await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await db.execute("VACUUM")
+        return True
+    finally:
+        database.DB_NAME = old_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание базы бота")
+    parser.add_argument("--db", default=database.DB_NAME, help="путь к базе")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="разово перевести базу на auto_vacuum=INCREMENTAL (полный VACUUM, бот должен быть остановлен)")
+    args = parser.parse_args()
+    if not args.enable_incremental_vacuum:
+        parser.print_help()
+        return 0
+    changed = asyncio.run(enable_incremental_vacuum(args.db))
+    print("auto_vacuum=INCREMENTAL включен" if changed else "auto_vacuum=INCREMENTAL уже включен")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
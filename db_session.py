@@ -0,0 +1,32 @@
+from aiogram import BaseMiddleware
+
+import database
+
+
+class DBSessionMiddleware(BaseMiddleware):
+    """
+    Сессия базы на апдейт: database.Session кладется в data["db_session"] и в
+    database.current_session, так что все хелперы database.py, вызванные при
+    обработке апдейта, читают через одно соединение и видят один снимок.
+    Соединение открывается только при первом запросе и закрывается после хендлера.
+
+    Регистрировать после update_executor (и perf): сессия должна жить в задаче
+    воркера, который выполняет хендлер.
+    """
+
+    async def __call__(self, handler, event, data):
+        session = database.Session()
+        token = database.current_session.set(session)
+        data["db_session"] = session
+        try:
+            return await handler(event, data)
+        finally:
+            database.current_session.reset(token)
+            await session.close()
+
+    def setup(self, dp):
+        dp.update.outer_middleware(self)
+
+    @staticmethod
+    def summary():
+        return dict(database.session_stats)
@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+
+from aiogram.types import InputFile
+
+from database import iter_games, iter_transfers
+
+# --- НАСТРОЙКИ ---
+SPOOL_MAX_SIZE = 4 * 1024 * 1024   # до этого размера файл живет в памяти, дальше - на диске
+GZIP_THRESHOLD = 1024 * 1024       # файлы больше этого отправляются сжатыми
+YIELD_EVERY = 500                  # строк между передачей управления циклу событий
+
+FORMATS = ("csv", "json")
+
+GAME_COLUMNS = [
+    "id", "tournament_id", "game_date", "game_format", "map_name",
+    "team1_tag", "team2_tag", "score_t1", "score_t2", "total_rounds", "created_at",
+]
+GAME_PLAYER_COLUMNS = ["game_id", "team_tag", "nickname", "K", "A", "D", "KD", "KPR", "DPR", "SVR", "IMPACT", "RATING"]
+PLAYER_COLUMNS = ["nickname", "matches", "rounds", "K", "A", "D", "diff", "KD", "KPR", "avg_rating", "score"]
+TRANSFER_COLUMNS = ["id", "player_name", "old_team", "new_team", "date"]
+
+
+class SpooledInputFile(InputFile):
+    """Отдает содержимое SpooledTemporaryFile кусками, не читая его целиком"""
+
+    def __init__(self, spool, filename, chunk_size=64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.spool = spool
+
+    async def read(self, bot):
+        # С начала при каждом чтении: сессия может повторить отправку
+        self.spool.seek(0)
+        while chunk := self.spool.read(self.chunk_size):
+            yield chunk
+
+    def close(self):
+        self.spool.close()
+
+
+class _Writer:
+    """Пишет строки в CSV или JSON-массив поверх временного файла"""
+
+    def __init__(self, fmt, columns):
+        self.fmt = fmt
+        self.columns = columns
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.text = io.TextIOWrapper(self.spool, encoding="utf-8", newline="", write_through=True)
+        self.rows = 0
+        self.yielded_at = 0
+        if fmt == "csv":
+            self.csv = csv.writer(self.text)
+            self.csv.writerow(columns)
+        else:
+            self.text.write("[\n")
+
+    def write(self, row):
+        if self.fmt == "csv":
+            self.csv.writerow([row.get(c) for c in self.columns])
+        else:
+            if self.rows:
+                self.text.write(",\n")
+            self.text.write(json.dumps({c: row.get(c) for c in self.columns}, ensure_ascii=False))
+        self.rows += 1
+
+    def finish(self):
+        if self.fmt == "json":
+            self.text.write("\n]\n")
+        self.text.flush()
+        # Отвязываем обертку, чтобы ее закрытие не закрыло сам файл
+        self.text.detach()
+        return self.spool
+
+    def close(self):
+        """Удаляет временный файл, если экспорт не дошел до отправки"""
+        self.spool.close()
+
+
+def _gzip_spool(spool):
+    spool.seek(0)
+    packed = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with gzip.GzipFile(fileobj=packed, mode="wb", compresslevel=6) as gz:
+            shutil.copyfileobj(spool, gz, 64 * 1024)
+    except BaseException:
+        packed.close()
+        raise
+    finally:
+        spool.close()
+    return packed
+
+
+async def _finish(writer, basename):
+    spool = writer.finish()
+    filename = f"{basename}.{writer.fmt}"
+    if spool.tell() > GZIP_THRESHOLD:
+        # Сжатие большого файла - в отдельном потоке, чтобы не блокировать бота
+        spool = await asyncio.to_thread(_gzip_spool, spool)
+        filename += ".gz"
+    return SpooledInputFile(spool, filename), writer.rows
+
+
+async def _export(writer, basename, rows):
+    """
+    Пишет строки асинхронного генератора rows и готовит файл к отправке.
+    При любой ошибке или отмене временный файл удаляется, а генератор
+    строк закрывается сразу - вместе с ним и соединение с базой.
+    """
+    try:
+        async with contextlib.aclosing(rows):
+            async for row in rows:
+                writer.write(row)
+                await _maybe_yield(writer)
+        return await _finish(writer, basename)
+    except BaseException:
+        writer.close()
+        raise
+
+
+async def _maybe_yield(writer):
+    if writer.rows - writer.yielded_at >= YIELD_EVERY:
+        writer.yielded_at = writer.rows
+        await asyncio.sleep(0)
+
+
+async def export_games(tour_id=None, fmt="csv"):
+    """Игры турнира (или все). В CSV - по строке на игрока, в JSON - игра со статистикой."""
+    if fmt == "csv":
+        writer = _Writer(fmt, GAME_COLUMNS + GAME_PLAYER_COLUMNS[1:])
+    else:
+        writer = _Writer(fmt, GAME_COLUMNS + ["stats"])
+
+    async def rows():
+        async with contextlib.aclosing(iter_games(tour_id)) as games:
+            async for game in games:
+                try:
+                    stats = json.loads(game['stats_json'])
+                except:
+                    stats = {}
+                if fmt == "json":
+                    yield dict(game, stats=stats)
+                else:
+                    for team_tag, players in stats.items():
+                        for p in players:
+                            yield {**game, **p, 'team_tag': team_tag}
+
+    name = f"games_tour_{tour_id}" if tour_id is not None else "games_all"
+    return await _export(writer, name, rows())
+
+
+async def export_players(fmt="csv"):
+    """Суммарная статистика игроков по всем играм (очки - как в топе игроков)"""
+    totals = {}
+    async with contextlib.aclosing(iter_games()) as games:
+        async for game in games:
+            try:
+                stats = json.loads(game['stats_json'])
+            except:
+                continue
+            for players in stats.values():
+                for p in players:
+                    nick = p.get('nickname')
+                    if not nick: continue
+                    s = totals.setdefault(nick, {'k': 0, 'a': 0, 'd': 0, 'r': 0.0, 'm': 0, 'rounds': 0})
+                    s['k'] += p.get('K', 0)
+                    s['a'] += p.get('A', 0)
+                    s['d'] += p.get('D', 0)
+                    s['r'] += p.get('RATING', 0.0)
+                    s['m'] += 1
+                    s['rounds'] += game['total_rounds'] or 0
+
+    rows = []
+    for nick, s in totals.items():
+        avg = s['r'] / s['m'] if s['m'] else 0
+        rows.append({
+            "nickname": nick,
+            "matches": s['m'],
+            "rounds": s['rounds'],
+            "K": s['k'], "A": s['a'], "D": s['d'],
+            "diff": s['k'] - s['d'],
+            "KD": round(s['k'] / s['d'], 2) if s['d'] else s['k'],
+            "KPR": round(s['k'] / s['rounds'], 2) if s['rounds'] else 0,
+            "avg_rating": round(avg, 2),
+            "score": round((s['k'] * 2) + (s['a'] * 1) - (s['d'] * 0.5) + (avg * 100), 2),
+        })
+    rows.sort(key=lambda x: x['score'], reverse=True)
+
+    async def sorted_rows():
+        for row in rows:
+            yield row
+
+    return await _export(_Writer(fmt, PLAYER_COLUMNS), "players", sorted_rows())
+
+
+async def export_transfers(fmt="csv"):
+    return await _export(_Writer(fmt, TRANSFER_COLUMNS), "transfers", iter_transfers())
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+# --- НАСТРОЙКИ ---
+FSM_DB_NAME = 'fsm_states.db'   # отдельно от основной базы: частые мелкие записи
+CACHE_LIMIT = 2000              # записей в памяти (LRU)
+FLUSH_INTERVAL = 1.0            # как часто сбрасывать накопленные изменения в базу, сек
+STATE_TTL = 24 * 3600           # брошенный мастер живет сутки с последнего действия
+TOUCH_INTERVAL = 60             # чтение продлевает TTL в базе не чаще раза в минуту на ключ
+SWEEP_INTERVAL = 600
+
+
+def _data_size(data):
+    """Размер данных FSM в байтах JSON (так же их хранило бы любое внешнее хранилище)"""
+    if not data:
+        return 0
+    try:
+        return len(json.dumps(data, ensure_ascii=False, default=str).encode())
+    except (TypeError, ValueError):
+        return 0
+
+
+class SizeTrackingStorage(BaseStorage):
+    """
+    Обертка над FSM-хранилищем, которая считает размер данных каждого пользователя.
+
+    Нужна, чтобы видеть, если в состояние снова начнут складывать что-то,
+    растущее вместе с размером лиги (списки турниров, команд и т.п.).
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.sizes = {}        # (chat_id, user_id) -> байт в данных сейчас
+        self.max_size = 0      # максимум за все время
+        self.writes = 0
+
+    def _track(self, key, data):
+        size = _data_size(data)
+        user_key = (key.chat_id, key.user_id)
+        if size:
+            self.sizes[user_key] = size
+        else:
+            self.sizes.pop(user_key, None)
+        self.max_size = max(self.max_size, size)
+        self.writes += 1
+
+    def summary(self):
+        total = sum(self.sizes.values())
+        count = len(self.sizes)
+        return {
+            "users": count,
+            "total_bytes": total,
+            "avg_bytes": total // count if count else 0,
+            "max_bytes_now": max(self.sizes.values(), default=0),
+            "max_bytes_ever": self.max_size,
+            "writes": self.writes,
+        }
+
+    async def set_state(self, key, state=None):
+        await self.storage.set_state(key, state)
+
+    async def get_state(self, key):
+        return await self.storage.get_state(key)
+
+    async def set_data(self, key, data):
+        await self.storage.set_data(key, data)
+        self._track(key, data)
+
+    async def get_data(self, key):
+        return await self.storage.get_data(key)
+
+    async def get_value(self, storage_key, dict_key, default=None):
+        return await self.storage.get_value(storage_key, dict_key, default)
+
+    async def close(self):
+        await self.storage.close()
+
+
+def _storage_key(key):
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.business_connection_id or ''}:{key.destiny}"
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в SQLite: незавершенные мастера переживают перезапуск.
+
+    Чтение идет из LRU-кэша в памяти, изменения копятся и пишутся в базу
+    одной транзакцией раз в FLUSH_INTERVAL. Состояния, которых не касались
+    (не писали и не читали) дольше STATE_TTL, удаляет фоновая задача.
+    """
+
+    def __init__(self, path=FSM_DB_NAME, ttl=STATE_TTL, cache_limit=CACHE_LIMIT):
+        self.path = path
+        self.ttl = ttl
+        self.cache_limit = cache_limit
+        self._db = None
+        self._cache = OrderedDict()   # ключ -> [state, data, updated_at]
+        self._dirty = {}              # ключ -> (state, data_json, updated_at); state и data пустые = удалить
+        self._touched = {}            # ключ -> updated_at: чтение, обновить только время
+        self._tasks = []
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "rows_written": 0, "expired": 0}
+
+    async def _connect(self):
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.path)
+            await self._db.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            await self._db.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)')
+            await self._db.commit()
+        return self._db
+
+    async def _record(self, key):
+        skey = _storage_key(key)
+        record = self._cache.get(skey)
+        if record is not None:
+            self._cache.move_to_end(skey)
+            self.stats["hits"] += 1
+            return skey, record
+
+        self.stats["misses"] += 1
+        pending = self._dirty.get(skey)
+        if pending is not None:
+            record = [pending[0], json.loads(pending[1]) if pending[1] else {}, pending[2]]
+        else:
+            db = await self._connect()
+            async with db.execute('SELECT state, data, updated_at FROM fsm_states WHERE key=?', (skey,)) as cur:
+                row = await cur.fetchone()
+            if skey in self._cache:
+                # Пока ждали базу, запись уже загрузил другой апдейт этого пользователя
+                return skey, self._cache[skey]
+            if row and time.time() - row[2] <= self.ttl:
+                record = [row[0], json.loads(row[1]) if row[1] else {}, row[2]]
+            else:
+                record = [None, {}, time.time()]
+
+        self._cache[skey] = record
+        while len(self._cache) > self.cache_limit:
+            # Вытесняем без потерь: несохраненное лежит в _dirty
+            self._cache.popitem(last=False)
+        return skey, record
+
+    def _mark_dirty(self, skey, record):
+        record[2] = time.time()
+        data_json = json.dumps(record[1], ensure_ascii=False, default=str) if record[1] else None
+        self._dirty[skey] = (record[0], data_json, record[2])
+
+    def _touch(self, skey, record):
+        # Идущий мастер только читают (например, листают выбор) - TTL считаем и от чтения.
+        # В базу уходит одно время, вместе с ближайшим сбросом изменений.
+        now = time.time()
+        if (record[0] is not None or record[1]) and now - record[2] >= TOUCH_INTERVAL:
+            record[2] = now
+            self._touched[skey] = now
+
+    async def set_state(self, key, state=None):
+        skey, record = await self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._mark_dirty(skey, record)
+
+    async def get_state(self, key):
+        skey, record = await self._record(key)
+        self._touch(skey, record)
+        return record[0]
+
+    async def set_data(self, key, data):
+        skey, record = await self._record(key)
+        record[1] = dict(data)
+        self._mark_dirty(skey, record)
+
+    async def get_data(self, key):
+        skey, record = await self._record(key)
+        self._touch(skey, record)
+        return record[1].copy()
+
+    async def flush(self):
+        if not self._dirty and not self._touched:
+            return
+        async with self._lock:
+            batch, self._dirty = self._dirty, {}
+            touched, self._touched = self._touched, {}
+            # Записанное целиком уже несет свежее время
+            touches = [(ts, k) for k, ts in touched.items() if k not in batch]
+            upserts = [(k, s, d, ts) for k, (s, d, ts) in batch.items() if s is not None or d is not None]
+            deletes = [(k,) for k, (s, d, ts) in batch.items() if s is None and d is None]
+            db = await self._connect()
+            try:
+                if upserts:
+                    await db.executemany(
+                        'INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data, updated_at=excluded.updated_at',
+                        upserts,
+                    )
+                if deletes:
+                    await db.executemany('DELETE FROM fsm_states WHERE key=?', deletes)
+                if touches:
+                    await db.executemany('UPDATE fsm_states SET updated_at=MAX(updated_at, ?) WHERE key=?', touches)
+                await db.commit()
+            except Exception:
+                # Вернем в очередь то, что не успели перезаписать новыми изменениями
+                for k, v in batch.items():
+                    self._dirty.setdefault(k, v)
+                for k, ts in touched.items():
+                    self._touched.setdefault(k, ts)
+                raise
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch) + len(touches)
+
+    async def sweep(self):
+        """Удаляет состояния, которых не касались дольше ttl"""
+        # Сначала сбрасываем продления от чтения: иначе удалили бы только что прочитанное
+        await self.flush()
+        deadline = time.time() - self.ttl
+        for skey in [k for k, rec in self._cache.items() if rec[2] < deadline and k not in self._dirty]:
+            del self._cache[skey]
+        async with self._lock:
+            db = await self._connect()
+            cur = await db.execute('DELETE FROM fsm_states WHERE updated_at < ?', (deadline,))
+            await db.commit()
+            self.stats["expired"] += cur.rowcount
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("FSM: не удалось сохранить состояния")
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logging.exception("FSM: ошибка очистки старых состояний")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def start(self):
+        if self._tasks:
+            return
+        await self._connect()
+        self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._sweep_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def close(self):
+        # Dispatcher вызывает close() в начале shutdown, пока апдейты еще дорабатываются:
+        # здесь только сбрасываем изменения, соединение закрывает stop()
+        await self.flush()
+
+    def setup(self, dp):
+        # Вызывать после update_executor.setup: stop() должен выполниться после того,
+        # как executor доработает очередь апдейтов
+        dp.startup.register(self.start)
+        dp.shutdown.register(self.stop)
@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+import re
+
+from database import add_game_records_many, get_team_tags, get_tournament_ids
+from player_metrics import expand_player_stats
+
+# --- НАСТРОЙКИ ---
+BATCH_SIZE = 500            # игр на одну транзакцию executemany
+MAX_REPORTED_ERRORS = 5000
+
+# Колонки CSV (и ключи объектов в JSON). game_format необязателен:
+# если пуст, берется по размеру большей команды (5 игроков -> 5x5).
+COLUMNS = [
+    "tournament_id", "game_date", "game_format", "map_name",
+    "team1_tag", "team2_tag", "score_t1", "score_t2",
+    "team1_stats", "team2_stats",
+]
+REQUIRED = [c for c in COLUMNS if c != "game_format"]
+
+DATE_RE = re.compile(r"^\d{4}[.\-]\d{2}[.\-]\d{2}$")
+
+HELP_TEXT = (
+    "📥 *Импорт игр*\n\n"
+    "Отправьте файл *CSV* или *JSON* с подписью /import\\_games\\.\n\n"
+    "Колонки CSV \\(первая строка \\- заголовок\\):\n"
+    f"`{','.join(COLUMNS)}`\n\n"
+    "Статистика команды \\- игроки через `;`, у каждого `ник K A D`:\n"
+    "`player1 15 4 10; player2 9 7 12`\n\n"
+    "JSON \\- список объектов с теми же ключами; статистику можно передать списком "
+    "`{\"nickname\", \"K\", \"A\", \"D\"}`\\."
+)
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def _parse_team_stats(raw, column):
+    """'nick 1 2 3; nick2 4 5 6' или список словарей -> [[ник, K, A, D], ...]"""
+    if isinstance(raw, list):
+        items = raw
+    else:
+        items = [chunk.strip() for chunk in str(raw or "").split(";") if chunk.strip()]
+
+    entries, seen = [], set()
+    for item in items:
+        try:
+            if isinstance(item, dict):
+                nick = str(item.get("nickname", "")).strip()
+                k, a, d = int(item["K"]), int(item["A"]), int(item["D"])
+            else:
+                nick, k, a, d = item.rsplit(maxsplit=3)
+                k, a, d = int(k), int(a), int(d)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # AttributeError: в JSON вместо строки или объекта пришло число/список
+            raise ImportRowError(f"{column}: не разобран игрок '{item}'")
+        if not nick or min(k, a, d) < 0:
+            raise ImportRowError(f"{column}: неверные данные игрока '{item}'")
+        if nick.lower() in seen:
+            raise ImportRowError(f"{column}: игрок {nick} указан дважды")
+        seen.add(nick.lower())
+        entries.append([nick, k, a, d])
+
+    if not entries:
+        raise ImportRowError(f"{column}: нет игроков")
+    return entries
+
+
+def validate_row(row, tournament_ids, team_tags):
+    """Строка файла -> кортеж для add_game_records_many или ImportRowError"""
+    missing = [c for c in REQUIRED if row.get(c) in (None, "")]
+    if missing:
+        raise ImportRowError(f"нет значений: {', '.join(missing)}")
+
+    try:
+        tour_id = int(row["tournament_id"])
+        s1, s2 = int(row["score_t1"]), int(row["score_t2"])
+    except (TypeError, ValueError):
+        raise ImportRowError("tournament_id и счет должны быть числами")
+    if tour_id not in tournament_ids:
+        raise ImportRowError(f"турнир {tour_id} не найден")
+    if s1 < 0 or s2 < 0 or s1 + s2 == 0:
+        raise ImportRowError(f"неверный счет {s1}-{s2}")
+
+    game_date = str(row["game_date"]).strip()
+    if not DATE_RE.match(game_date):
+        raise ImportRowError(f"дата '{game_date}' не в формате YYYY.MM.DD")
+    game_date = game_date.replace("-", ".")
+
+    t1 = team_tags.get(str(row["team1_tag"]).strip().lower())
+    t2 = team_tags.get(str(row["team2_tag"]).strip().lower())
+    if not t1: raise ImportRowError(f"команда [{row['team1_tag']}] не найдена")
+    if not t2: raise ImportRowError(f"команда [{row['team2_tag']}] не найдена")
+    if t1 == t2: raise ImportRowError("команды должны быть разными")
+
+    stats1 = _parse_team_stats(row["team1_stats"], "team1_stats")
+    stats2 = _parse_team_stats(row["team2_stats"], "team2_stats")
+
+    rounds = s1 + s2
+    game_format = str(row.get("game_format") or "").strip()
+    if not game_format:
+        size = max(len(stats1), len(stats2))
+        game_format = f"{size}x{size}"
+
+    stats_json = json.dumps({
+        t1: expand_player_stats(stats1, rounds),
+        t2: expand_player_stats(stats2, rounds),
+    })
+    return (tour_id, game_date, game_format, str(row["map_name"]).strip(), t1, t2, s1, s2, rounds, stats_json)
+
+
+def iter_rows(data: bytes, filename: str):
+    """
+    (номер строки, словарь) из CSV или JSON. CSV читается построчно;
+    вместо словаря может прийти ImportRowError - строку не удалось прочитать.
+    """
+    if (filename or "").lower().endswith(".json"):
+        payload = json.loads(data.decode("utf-8-sig"))
+        if isinstance(payload, dict):
+            payload = payload.get("games", [])
+        if not isinstance(payload, list):
+            raise ValueError("JSON должен быть списком игр или объектом {\"games\": [...]}")
+        for num, item in enumerate(payload, 1):
+            yield num, item if isinstance(item, dict) else {}
+        return
+
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(text, dialect=dialect)
+    try:
+        fieldnames = reader.fieldnames or []
+    except csv.Error as e:
+        raise ValueError(f"Не разобран заголовок CSV: {e}")
+    unknown = [c for c in REQUIRED if c not in fieldnames]
+    if unknown:
+        raise ValueError(f"В CSV нет колонок: {', '.join(unknown)}")
+    # Номер строки файла: заголовок - первая строка
+    num = 1
+    while True:
+        num += 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # Битая строка (NUL, слишком длинное поле) - ошибка этой строки, читаем дальше
+            yield num, ImportRowError(f"CSV: {e}")
+            continue
+        yield num, row
+
+
+async def import_games(data: bytes, filename: str, progress=None):
+    """
+    Валидирует и вставляет игры пачками по BATCH_SIZE.
+    progress(imported, errors) вызывается после каждой пачки.
+    Возвращает (импортировано, [(номер строки, ошибка), ...]).
+    """
+    tournament_ids = await get_tournament_ids()
+    team_tags = await get_team_tags()
+
+    imported, errors, batch = 0, [], []
+    for num, row in iter_rows(data, filename):
+        try:
+            if isinstance(row, ImportRowError):
+                raise row
+            batch.append(validate_row(row, tournament_ids, team_tags))
+        except ImportRowError as e:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append((num, str(e)))
+            continue
+
+        if len(batch) >= BATCH_SIZE:
+            imported += await add_game_records_many(batch)
+            batch = []
+            if progress:
+                await progress(imported, len(errors))
+
+    if batch:
+        imported += await add_game_records_many(batch)
+    if progress:
+        await progress(imported, len(errors))
+    return imported, errors
+
+
+def build_error_report(errors):
+    """CSV с ошибками: номер строки исходного файла и причина"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["row", "error"])
+    writer.writerows(errors)
+    return out.getvalue().encode("utf-8-sig")
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+
+from aiohttp import ClientSession, FormData, TraceConfig, ClientConnectorError
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram.__meta__ import __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError, TelegramRetryAfter
+
+import keyboard_cache
+
+# --- НАСТРОЙКИ ПУЛА ---
+# Все запросы идут на один хост (api.telegram.org), поэтому лимит на хост
+# фактически и есть размер пула. Держим его с запасом над числом воркеров.
+POOL_LIMIT = 64
+POOL_LIMIT_PER_HOST = 64
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 600
+
+# --- ТАЙМ-АУТЫ ---
+CALL_TIMEOUT = 20       # обычные вызовы (sendMessage, editMessageText, ...)
+UPLOAD_TIMEOUT = 120    # загрузка файлов
+
+UPLOAD_METHODS = {
+    "sendPhoto", "sendDocument", "sendVideo", "sendAudio", "sendAnimation",
+    "sendVoice", "sendVideoNote", "sendMediaGroup", "sendSticker", "editMessageMedia",
+}
+
+# --- ПОВТОРЫ ---
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_AFTER_MAX = 30
+
+# После тайм-аута, обрыва или 5xx запрос мог дойти до Telegram: повторяем
+# только методы, повтор которых не создаст дубль сообщения.
+IDEMPOTENT_PREFIXES = ("get", "edit", "delete")
+IDEMPOTENT_METHODS = {"answerCallbackQuery"}
+
+
+def _is_idempotent(api_method):
+    return api_method.startswith(IDEMPOTENT_PREFIXES) or api_method in IDEMPOTENT_METHODS
+
+
+def _was_not_sent(e: TelegramNetworkError):
+    """Соединение не установилось - запрос точно не ушел, повтор безопасен для любого метода.
+    ServerDisconnectedError сюда не входит: сервер мог закрыть соединение уже после приема запроса."""
+    return isinstance(e.__cause__, ClientConnectorError)
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с ограниченным keep-alive пулом, раздельными тайм-аутами и ретраями."""
+
+    def __init__(self, timeout=CALL_TIMEOUT, upload_timeout=UPLOAD_TIMEOUT, max_retries=MAX_RETRIES, **kwargs):
+        super().__init__(limit=POOL_LIMIT, timeout=timeout, **kwargs)
+        self.upload_timeout = upload_timeout
+        self.max_retries = max_retries
+        self._connector_init.update(
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self.stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "retries": 0,
+            "failures": 0,
+        }
+        self._trace_config = self._build_trace_config()
+
+    def _build_trace_config(self):
+        trace = TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.stats["requests"] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats["connections_created"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats["connections_reused"] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    def reuse_ratio(self):
+        total = self.stats["connections_created"] + self.stats["connections_reused"]
+        return self.stats["connections_reused"] / total if total else 0.0
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[self._trace_config],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    def build_form_data(self, bot, method):
+        cached_markup = keyboard_cache.serialized(getattr(method, "reply_markup", None))
+        if cached_markup is None:
+            return super().build_form_data(bot, method)
+
+        # Клавиатура из keyboard_cache уже сериализована - не гоняем ее через model_dump
+        form = FormData(quote_fields=False)
+        files = {}
+        for key, value in method.model_dump(warnings=False, exclude={"reply_markup"}).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if not value:
+                continue
+            form.add_field(key, value)
+        form.add_field("reply_markup", cached_markup)
+        for key, value in files.items():
+            form.add_field(key, value.read(bot), filename=value.filename or key)
+        return form
+
+    def _backoff(self, attempt):
+        # Full jitter: случайная пауза в пределах экспоненциально растущего окна
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    async def make_request(self, bot, method, timeout=None):
+        api_method = method.__api_method__
+        if timeout is None and api_method in UPLOAD_METHODS:
+            timeout = self.upload_timeout
+
+        attempt = 0
+        while True:
+            try:
+                return await super().make_request(bot, method, timeout=timeout)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries or e.retry_after > RETRY_AFTER_MAX:
+                    self.stats["failures"] += 1
+                    raise
+                delay = e.retry_after
+            except TelegramServerError:
+                if attempt >= self.max_retries or not _is_idempotent(api_method):
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt)
+            except TelegramNetworkError as e:
+                if attempt >= self.max_retries or not (_was_not_sent(e) or _is_idempotent(api_method)):
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt)
+
+            attempt += 1
+            self.stats["retries"] += 1
+            logging.warning("Bot API %s: повтор %s/%s через %.2fс", api_method, attempt, self.max_retries, delay)
+            await asyncio.sleep(delay)
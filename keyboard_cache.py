@@ -0,0 +1,54 @@
+import functools
+from collections import OrderedDict
+
+# --- НАСТРОЙКИ ---
+PER_BUILDER_LIMIT = 512   # клавиатур на одну функцию (для параметров вроде game_id)
+
+# id(markup) -> (markup, json); markup храним, чтобы id не переиспользовался
+_serialized = {}
+
+
+def static_keyboard(builder):
+    """
+    Декоратор для функций, строящих клавиатуру только из своих аргументов.
+
+    Клавиатура строится один раз на набор аргументов, сразу сериализуется в JSON
+    и дальше отдается готовым объектом - без повторной валидации pydantic.
+    Возвращаемый объект общий: изменять его нельзя.
+    """
+    cache = OrderedDict()
+
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        markup = cache.get(key)
+        if markup is not None:
+            cache.move_to_end(key)
+            return markup
+
+        markup = builder(*args, **kwargs)
+        cache[key] = markup
+        _serialized[id(markup)] = (markup, markup.model_dump_json(exclude_none=True))
+        if len(cache) > PER_BUILDER_LIMIT:
+            _, old = cache.popitem(last=False)
+            _serialized.pop(id(old), None)
+        return markup
+
+    wrapper.cache_size = lambda: len(cache)
+    return wrapper
+
+
+def serialized(markup):
+    """Готовый JSON клавиатуры из кэша или None, если клавиатура собрана на лету"""
+    entry = _serialized.get(id(markup))
+    if entry is None or entry[0] is not markup:
+        return None
+    return entry[1]
+
+
+def dump_markup(markup):
+    """JSON клавиатуры: из кэша, если он есть"""
+    if markup is None:
+        return ""
+    cached = serialized(markup)
+    return cached if cached is not None else markup.model_dump_json(exclude_none=True)
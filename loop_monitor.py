@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from perf import Histogram
+
+# --- НАСТРОЙКИ ---
+TICK_INTERVAL = 0.1         # как часто цикл отмечается (и меряется задержка), секунды
+STALL_THRESHOLD = 0.3       # блокировка дольше этого - в лог стек главного потока
+STACK_LIMIT = 25            # кадров в дампе
+
+stall_log = logging.getLogger("loop_stall")
+
+
+class LoopMonitor:
+    """
+    Мониторинг задержки цикла событий.
+
+    Задача в цикле засыпает на TICK_INTERVAL и меряет, насколько позже
+    проснулась - это и есть лаг (гистограмма lag). Сторожевой поток следит
+    за отметками этой задачи: если цикл не отмечался дольше STALL_THRESHOLD,
+    значит его держит синхронный код - стек потока цикла пишется в лог,
+    один раз на каждую блокировку.
+    """
+
+    def __init__(self, interval=TICK_INTERVAL, threshold=STALL_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram()
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    async def _ticker(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._heartbeat = now
+
+    def _watch(self):
+        dumped_for = None
+        while not self._stop.wait(self.interval / 2):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or dumped_for == heartbeat:
+                continue
+            dumped_for = heartbeat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            stall_log.warning("Цикл событий заблокирован уже %.0f мс. Стек:\n%s", blocked * 1000, stack)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._ticker())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try: await self._task
+        except asyncio.CancelledError: pass
+        self._task = None
+        await asyncio.to_thread(self._watchdog.join)
+
+    def setup(self, dp):
+        dp.startup.register(self.start)
+        dp.shutdown.register(self.stop)
+
+    def summary(self):
+        return {
+            "ticks": self.lag.count,
+            "lag_p50_ms": round(self.lag.quantile(0.5) * 1000, 1),
+            "lag_p99_ms": round(self.lag.quantile(0.99) * 1000, 1),
+            "lag_avg_ms": round(self.lag.mean * 1000, 2),
+            "lag_max_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+        }
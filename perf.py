@@ -0,0 +1,407 @@
+import bisect
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+import database
+
+# --- НАСТРОЙКИ ---
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_KEYS = 300              # ключей на гистограмму; остальное идет в "other"
+SQL_KEY_LENGTH = 120
+# Бюджет одного апдейта: больше - предупреждение со сводкой мест, где открывались соединения.
+# В сессии апдейта (db_session.py) соединение одно, и «соединением» считается
+# каждое обращение хелпера к нему - как было бы без сессии.
+QUERY_BUDGET = 12
+CONNECTION_BUDGET = 4
+BUDGET_WARN_INTERVAL = 60   # не чаще раза в минуту на ключ хендлера
+STACK_DEPTH = 4
+METRICS_HOST = "127.0.0.1"
+METRICS_PATH = "/metrics"
+PREFIX = "bannerbot"
+
+_SPACES = re.compile(r"\s+")
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class Histogram:
+    """Накопительная гистограмма в стиле Prometheus (только count/sum/корзины)"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам - верхняя граница нужной корзины"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class UpdateStats:
+    """Счетчики одного апдейта: запросы к базе и к Bot API"""
+
+    __slots__ = ("db_count", "db_time", "db_connections", "api_count", "api_time", "sites")
+
+    def __init__(self):
+        self.db_count = 0
+        self.db_time = 0.0
+        self.db_connections = 0
+        self.api_count = 0
+        self.api_time = 0.0
+        self.sites = {}     # цепочка вызовов -> [соединений, запросов]
+
+    def summary(self):
+        """Места открытия соединений, самые «тяжелые» первыми"""
+        lines = []
+        for site, (conns, queries) in sorted(self.sites.items(), key=lambda kv: kv[1][1], reverse=True):
+            lines.append(f"  {conns} соед., {queries} запр.: {site}")
+        return "\n".join(lines)
+
+
+# Служебные функции database.py, через которые хелперы получают соединение
+_DB_PLUMBING = {"connect", "_open", "reading", "connection"}
+
+
+def _call_site(depth=STACK_DEPTH):
+    """Короткая цепочка вызовов из модулей проекта: bot.view_x > database.get_y"""
+    frame = sys._getframe(2)
+    chain = []
+    while frame is not None and len(chain) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_DIR) and not filename.endswith("perf.py"):
+            name = os.path.splitext(filename[len(_PROJECT_DIR):])[0].replace(os.sep, ".")
+            if not (name == "database" and frame.f_code.co_name in _DB_PLUMBING):
+                chain.append(f"{name}.{frame.f_code.co_name}")
+        frame = frame.f_back
+    return " > ".join(reversed(chain)) or "?"
+
+
+_current_update = contextvars.ContextVar("perf_current_update", default=None)
+
+
+def current_update():
+    return _current_update.get()
+
+
+def _callback_key(callback_data, data, route_key):
+    # Только маршруты и состояния из кода: ники, карты и ID в callback_data не плодят ключи
+    route = route_key(callback_data) if route_key is not None and callback_data else None
+    if route is not None:
+        return "cb:" + route
+    if data.get("raw_state"):
+        return "cb:state:" + data["raw_state"]
+    return "cb:?"
+
+
+def handler_key(event, data, route_key=None):
+    """Ключ гистограммы: маршрут callback (route_key(callback_data)), команда или FSM-состояние"""
+    if event.callback_query is not None:
+        return _callback_key(event.callback_query.data, data, route_key)
+    message = event.message
+    if message is not None:
+        text = message.text or message.caption or ""
+        if text.startswith("/"):
+            return "cmd:" + text.split(maxsplit=1)[0].split("@")[0][:32]
+        if data.get("raw_state"):
+            return "state:" + data["raw_state"]
+        return "msg:" + message.content_type
+    return "update:" + (event.event_type or "unknown")
+
+
+def sql_key(sql):
+    return _SPACES.sub(" ", sql).strip()[:SQL_KEY_LENGTH]
+
+
+class PerfRegistry:
+    """
+    Внутрипроцессная статистика производительности:
+    - латентность хендлеров (ключ - маршрут callback/команда/состояние FSM);
+    - время каждого SQL-запроса и каждого вызова Bot API;
+    - сколько запросов к базе и API делает апдейт каждого типа;
+    - апдейты сверх бюджета запросов/соединений (N+1) - с предупреждением в лог.
+
+    Подключение: perf.setup(dp, bot) - ПОСЛЕ update_executor, чтобы время
+    считалось от начала обработки, а не с момента постановки в очередь.
+    route_key(callback_data) -> ключ маршрута или None (CallbackTrie.route_key).
+    """
+
+    def __init__(self, route_key=None):
+        self.route_key = route_key
+        self._runner = None
+        self._lock = threading.Lock()   # SQL-замеры приходят из потоков aiosqlite
+        self.handlers = {}
+        self.sql = {}
+        self.api = {}
+        self.handler_db = {}    # ключ хендлера -> [апдейтов, запросов, время в базе, вызовов API, время API]
+        self.over_budget = {}   # ключ хендлера -> апдейтов сверх бюджета запросов/соединений
+        self._warned_at = {}
+        self.sources = {}       # имя -> функция без аргументов, возвращающая dict чисел
+        self.started = time.time()
+
+    def reset(self):
+        with self._lock:
+            self.handlers, self.sql, self.api, self.handler_db = {}, {}, {}, {}
+            self.over_budget, self._warned_at = {}, {}
+            self.started = time.time()
+
+    def _observe(self, table, key, seconds):
+        hist = table.get(key)
+        if hist is None:
+            if len(table) >= MAX_KEYS:
+                key = "other"
+                hist = table.get(key)
+            if hist is None:
+                hist = table[key] = Histogram()
+        hist.observe(seconds)
+
+    # --- хуки ---
+
+    def statement_listener(self):
+        """Фабрика для database.statement_listener (вызывается в цикле событий)"""
+        return StatementListener(self, _current_update.get())
+
+    def observe_api(self, method_name, seconds):
+        with self._lock:
+            self._observe(self.api, method_name, seconds)
+        update = _current_update.get()
+        if update is not None:
+            update.api_count += 1
+            update.api_time += seconds
+
+    def observe_handler(self, key, seconds, update):
+        with self._lock:
+            self._observe(self.handlers, key, seconds)
+            totals = self.handler_db.setdefault(key, [0, 0, 0.0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += update.db_count
+            totals[2] += update.db_time
+            totals[3] += update.api_count
+            totals[4] += update.api_time
+        if update.db_count > QUERY_BUDGET or update.db_connections > CONNECTION_BUDGET:
+            self._over_budget(key, update)
+
+    def _over_budget(self, key, update):
+        with self._lock:
+            self.over_budget[key] = self.over_budget.get(key, 0) + 1
+        now = time.monotonic()
+        if now - self._warned_at.get(key, -BUDGET_WARN_INTERVAL) < BUDGET_WARN_INTERVAL:
+            return
+        self._warned_at[key] = now
+        logging.warning(
+            "Апдейт %s: %d запросов в %d соединениях (бюджет %d/%d)\n%s",
+            key, update.db_count, update.db_connections, QUERY_BUDGET, CONNECTION_BUDGET, update.summary(),
+        )
+
+    def setup(self, dp, bot):
+        dp.update.outer_middleware(UpdateTimingMiddleware(self))
+        bot.session.middleware(ApiTimingMiddleware(self))
+        database.statement_listener = self.statement_listener
+
+    def add_source(self, name, func):
+        self.sources[name] = func
+
+    # --- вывод ---
+
+    def _snapshot(self, table):
+        with self._lock:
+            return sorted(table.items(), key=lambda kv: kv[1].total, reverse=True)
+
+    def report(self, top=10):
+        """Текстовый отчет для /perf (моноширинный)"""
+        lines = [f"Статистика за {int(time.time() - self.started)} с"]
+
+        lines.append("\nХендлеры (по суммарному времени):")
+        lines.append(f"{'ключ':<28} {'n':>6} {'p50':>7} {'p95':>7} {'ср.':>7} {'SQL/n':>6} {'API/n':>6} {'>бюдж':>6}")
+        for key, h in self._snapshot(self.handlers)[:top]:
+            n, db_n, _, api_n, _ = self.handler_db.get(key, [1, 0, 0.0, 0, 0.0])
+            lines.append(f"{key[:28]:<28} {h.count:>6} {_ms(h.quantile(0.5)):>7} {_ms(h.quantile(0.95)):>7} "
+                         f"{_ms(h.mean):>7} {db_n / n:>6.1f} {api_n / n:>6.1f} {self.over_budget.get(key, 0):>6}")
+
+        lines.append("\nSQL (по суммарному времени):")
+        for key, h in self._snapshot(self.sql)[:top]:
+            lines.append(f"{h.count:>7} × {_ms(h.mean):>6} = {_ms(h.total):>8} мс  {key[:60]}")
+
+        lines.append("\nBot API:")
+        for key, h in self._snapshot(self.api)[:top]:
+            lines.append(f"{key[:28]:<28} {h.count:>6} {_ms(h.quantile(0.5)):>7} {_ms(h.quantile(0.95)):>7}")
+
+        for name, func in self.sources.items():
+            try: values = func()
+            except: continue
+            lines.append(f"\n{name}: " + ", ".join(f"{k}={_num(v)}" for k, v in values.items()))
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Все метрики в текстовом формате Prometheus"""
+        out = []
+        _prom_histograms(out, f"{PREFIX}_handler_seconds", "handler", self._snapshot(self.handlers))
+        _prom_histograms(out, f"{PREFIX}_sql_seconds", "statement", self._snapshot(self.sql))
+        _prom_histograms(out, f"{PREFIX}_api_seconds", "method", self._snapshot(self.api))
+
+        with self._lock:
+            totals = list(self.handler_db.items())
+        for index, metric in ((1, "handler_sql_queries_total"), (2, "handler_sql_seconds_total"),
+                              (3, "handler_api_calls_total"), (4, "handler_api_seconds_total")):
+            out.append(f"# TYPE {PREFIX}_{metric} counter")
+            for key, values in totals:
+                out.append(f'{PREFIX}_{metric}{{handler="{_label(key)}"}} {values[index]}')
+
+        out.append(f"# TYPE {PREFIX}_handler_over_budget_total counter")
+        for key, count in list(self.over_budget.items()):
+            out.append(f'{PREFIX}_handler_over_budget_total{{handler="{_label(key)}"}} {count}')
+
+        for name, func in self.sources.items():
+            try: values = func()
+            except: continue
+            for k, v in values.items():
+                if isinstance(v, (int, float)):
+                    out.append(f"{PREFIX}_{name}_{k} {v}")
+        return "\n".join(out) + "\n"
+
+    # --- HTTP-эндпоинт ---
+
+    async def start_server(self, port, host=METRICS_HOST):
+        app = web.Application()
+        app.router.add_get(METRICS_PATH, self._metrics_handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info("Метрики Prometheus: http://%s:%s%s", host, port, METRICS_PATH)
+        self._runner = runner
+        return runner
+
+    async def stop_server(self):
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            await runner.cleanup()
+
+    def setup_server(self, dp, port, host=METRICS_HOST):
+        """Эндпоинт метрик живет вместе с диспетчером: поднимается на старте, закрывается при остановке"""
+        async def start():
+            await self.start_server(port, host)
+        dp.startup.register(start)
+        dp.shutdown.register(self.stop_server)
+
+    async def _metrics_handler(self, request):
+        return web.Response(text=self.prometheus(), content_type="text/plain", charset="utf-8")
+
+
+class StatementListener:
+    """
+    Слушатель запросов одного соединения. Место вызова (site) определяется при
+    открытии соединения и заново в rebind(), когда общее соединение сессии
+    апдейта берет следующий хелпер - так N+1 видно и с одним соединением.
+    """
+
+    __slots__ = ("registry", "update", "site")
+
+    def __init__(self, registry, update):
+        self.registry = registry
+        self.update = update
+        self.site = None
+        self.rebind()
+
+    def rebind(self):
+        if self.update is not None:
+            self.update.db_connections += 1
+            self.site = self.update.sites.setdefault(_call_site(), [0, 0])
+            self.site[0] += 1
+
+    def __call__(self, sql, params, seconds, fetch):
+        registry = self.registry
+        with registry._lock:
+            if fetch:
+                # Выборка строк - продолжение уже посчитанного запроса: только время
+                hist = registry.sql.get(sql_key(sql)) or registry.sql.get("other")
+                if hist is not None:
+                    hist.total += seconds
+            else:
+                registry._observe(registry.sql, sql_key(sql), seconds)
+        update = self.update
+        if update is not None:
+            # BEGIN снимка сессии - служебный, в бюджет запросов хелпера не идет
+            if not fetch and sql != "BEGIN":
+                update.db_count += 1
+                self.site[1] += 1
+            update.db_time += seconds
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    def __init__(self, registry):
+        self.registry = registry
+
+    async def __call__(self, handler, event, data):
+        update = UpdateStats()
+        token = _current_update.set(update)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.registry.observe_handler(handler_key(event, data, self.registry.route_key), time.perf_counter() - started, update)
+            _current_update.reset(token)
+
+
+class ApiTimingMiddleware(BaseRequestMiddleware):
+    def __init__(self, registry):
+        self.registry = registry
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.registry.observe_api(type(method).__name__, time.perf_counter() - started)
+
+
+def _ms(seconds):
+    if seconds == float("inf"):
+        return ">10s"
+    return f"{seconds * 1000:.1f}"
+
+
+def _num(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", " ")
+
+
+def _prom_histograms(out, name, label, items):
+    out.append(f"# TYPE {name} histogram")
+    for key, h in items:
+        lbl = f'{label}="{_label(key)}"'
+        cumulative = 0
+        for bound, c in zip(BUCKETS, h.counts):
+            cumulative += c
+            out.append(f'{name}_bucket{{{lbl},le="{bound}"}} {cumulative}')
+        out.append(f'{name}_bucket{{{lbl},le="+Inf"}} {h.count}')
+        out.append(f"{name}_sum{{{lbl}}} {h.total}")
+        out.append(f"{name}_count{{{lbl}}} {h.count}")
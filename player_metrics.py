@@ -0,0 +1,38 @@
+import math
+
+
+def calculate_player_metrics(k, a, d, rounds):
+    if rounds == 0: rounds = 1
+    kd = k / d if d > 0 else k
+    kpr = k / rounds
+    helps = a / rounds
+    diff = k - d
+    svr = (rounds - d) / rounds
+    apr = a / rounds
+    impact = 2.13 * kpr + 0.42 * apr - 0.41
+    if impact < 0: impact = 0
+    x = (kd + impact * 1.5) / 2.5
+    if x < 0: x = 0
+    rating = math.sqrt(x) if x > 0 else 0.0
+
+    return {
+        "K": k, "A": a, "D": d,
+        "+/-": diff,
+        "KPR": round(kpr, 2),
+        "DPR": round(d / rounds, 2),
+        "SVR": round(svr, 2),
+        "IMPACT": round(impact, 2),
+        "RATING": round(rating, 2),
+        "KD": round(kd, 2),
+        "HELPS": a 
+    }
+
+
+# Компактная статистика [ник, K, A, D] (мастер регистрации, импорт) -> метрики для stats_json
+def expand_player_stats(entries, rounds):
+    result = []
+    for nickname, k, a, d in entries:
+        metrics = calculate_player_metrics(k, a, d, rounds)
+        metrics['nickname'] = nickname
+        result.append(metrics)
+    return result
@@ -0,0 +1,244 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# --- НАСТРОЙКИ ---
+MIN_SECONDS = 1
+MAX_SECONDS = 300
+SAMPLE_INTERVAL = 0.005     # период стек-сэмплера, секунды
+TOP_FUNCTIONS = 40
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+
+MODES = ("sample", "cpu", "mem")
+HELP_TEXT = (
+    "🔬 *Профилирование*\n\n"
+    "`/profile N` \\- стек\\-сэмплер на N секунд \\(hot\\-функции \\+ collapsed stacks для flamegraph\\)\n"
+    "`/profile N cpu` \\- cProfile: точные вызовы, но заметно замедляет бота\n"
+    "`/profile N mem` \\- разница снимков tracemalloc за N секунд\n\n"
+    f"N от {MIN_SECONDS} до {MAX_SECONDS}\\."
+)
+
+_lock = asyncio.Lock()
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def busy():
+    return _lock.locked()
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_DIR):
+        filename = filename[len(_PROJECT_DIR):]
+    else:
+        # Из библиотек оставляем пакет и модуль: .../aiogram/client/bot.py -> aiogram/client/bot.py
+        parts = filename.replace("\\", "/").split("/")
+        for marker in ("site-packages", "dist-packages"):
+            if marker in parts:
+                parts = parts[parts.index(marker) + 1:]
+                break
+        else:
+            parts = parts[-2:]
+        filename = "/".join(parts)
+    return f"{filename}:{code.co_name}"
+
+
+class _Samples:
+    """Счетчик одинаковых стеков и отчеты по ним"""
+
+    kind = ""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()     # (кадр снаружи, ..., кадр внутри) -> сэмплов
+        self.samples = 0
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """Формат collapsed stacks (flamegraph.pl, speedscope): 'a;b;c 42'"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def report(self, seconds, top=TOP_FUNCTIONS):
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            # Функция в стеке несколько раз (рекурсия) считается один раз
+            for name in set(stack):
+                total_counts[name] += count
+
+        n = self.samples or 1
+        lines = [f"Стек-сэмплер ({self.kind}): {self.samples} сэмплов за {seconds} с, каждые {self.interval * 1000:.0f} мс", ""]
+        lines.append(f"{'собств.':>8} {'всего':>8}  функция")
+        for name, count in self_counts.most_common(top):
+            lines.append(f"{count / n:>8.1%} {total_counts[name] / n:>8.1%}  {name}")
+        lines.append("")
+        lines.append("По включительному времени:")
+        for name, count in total_counts.most_common(top):
+            lines.append(f"{count / n:>8.1%}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+class SignalSampler(_Samples):
+    """
+    Сэмплы по SIGPROF (таймер процессорного времени). Обработчик сигнала
+    выполняется в главном потоке между байткодами, поэтому видно именно то,
+    что занимало процессор; ожидание в select не попадает в выборку.
+    Только Unix и только из главного потока.
+    """
+
+    kind = "CPU, SIGPROF"
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._on_signal)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def _on_signal(self, signum, frame):
+        self._record(frame)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+
+class StackSampler(_Samples):
+    """
+    Запасной вариант: отдельный поток снимает стек потока цикла событий.
+    Смещен к точкам, где цикл отпускает GIL (select), так что полезен
+    скорее для настенного времени, чем для поиска горячих функций.
+    """
+
+    kind = "настенное время, поток"
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(interval)
+        self.thread_id = thread_id
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+
+def make_sampler():
+    if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+        return SignalSampler()
+    return StackSampler(threading.get_ident())
+
+
+async def profile_sample(seconds):
+    """(текстовый отчет, collapsed stacks) за seconds секунд живого трафика"""
+    async with _lock:
+        sampler = make_sampler()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+        return sampler.report(seconds), sampler.collapsed()
+
+
+async def profile_cpu(seconds, top=TOP_FUNCTIONS):
+    """(отчет pstats по собственному и накопленному времени, дамп .prof)"""
+    async with _lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats("tottime").print_stats(top)
+        stats.sort_stats("cumulative").print_stats(top)
+        # Тот же формат, что у Stats.dump_stats: открывается snakeviz, pstats и т.п.
+        return out.getvalue(), marshal.dumps(stats.stats)
+
+
+async def profile_memory(seconds, extra=None, top=TOP_ALLOCATIONS):
+    """Разница снимков tracemalloc; extra - dict с размерами кэшей для отчета"""
+    async with _lock:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+    before, after = before.filter_traces(filters), after.filter_traces(filters)
+
+    lines = [f"tracemalloc за {seconds} с: отслеживается {current / 1024:.0f} КБ, пик {peak / 1024:.0f} КБ"]
+    if started_here:
+        lines.append("(трассировка включена на время замера: учтены только выделения за этот период)")
+    if extra:
+        lines.append("")
+        for name, values in extra.items():
+            lines.append(f"{name}: " + ", ".join(f"{k}={v}" for k, v in values.items()))
+
+    lines.append("\nРост по файлам:")
+    for stat in after.compare_to(before, "filename")[:top]:
+        lines.append(f"{stat.size_diff / 1024:>+10.1f} КБ {stat.count_diff:>+8} блоков  {stat.traceback[0].filename}")
+
+    lines.append("\nРост по строкам:")
+    for stat in after.compare_to(before, "lineno")[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size_diff / 1024:>+10.1f} КБ {stat.count_diff:>+8} блоков  {frame.filename}:{frame.lineno}")
+
+    lines.append("\nКрупнейшие источники роста (стек):")
+    for stat in after.compare_to(before, "traceback")[:5]:
+        lines.append(f"{stat.size_diff / 1024:+.1f} КБ:")
+        lines.extend("    " + line for line in stat.traceback.format())
+    return "\n".join(lines) + "\n"
+
+
+def parse_args(args):
+    """'/profile 30 cpu' -> (30, 'cpu'); ValueError при неверных аргументах"""
+    parts = (args or "").split()
+    seconds, mode = 10, "sample"
+    for part in parts:
+        if part.isdigit():
+            seconds = int(part)
+        elif part.lower() in MODES:
+            mode = part.lower()
+        else:
+            raise ValueError(part)
+    if not MIN_SECONDS <= seconds <= MAX_SECONDS:
+        raise ValueError(seconds)
+    return seconds, mode
+
+
+def timestamp():
+    return time.strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,238 @@
+import json
+
+# --- ЭКРАНИРОВАНИЕ MarkdownV2 ---
+# Одна таблица трансляции вместо 18 последовательных str.replace
+MD_SPECIAL_CHARS = "_*[]()~`>#+-=|{}.!"
+_MD_TABLE = str.maketrans({ch: "\\" + ch for ch in MD_SPECIAL_CHARS})
+_MD_SPECIAL_SET = frozenset(MD_SPECIAL_CHARS)
+_MD_CODE_TABLE = str.maketrans({"\\": "\\\\", "`": "\\`"})
+
+
+def escape_md(text):
+    if text is None: return ""
+    text = str(text)
+    # Большинство полей (ники, названия) спецсимволов не содержат
+    if _MD_SPECIAL_SET.isdisjoint(text):
+        return text
+    return text.translate(_MD_TABLE)
+
+
+def escape_md_code(text):
+    if text is None: return ""
+    return str(text).translate(_MD_CODE_TABLE)
+
+
+def format_team_tag_md(tag: str) -> str:
+    if not tag:
+        return "\\[\\]"
+    return f"\\[{escape_md(tag)}\\]"
+
+
+def format_team_name_and_tag_md(name: str, tag: str) -> str:
+    return f"{escape_md(name)} {format_team_tag_md(tag)}"
+
+
+def fmt_money(val: float) -> str:
+    if val.is_integer():
+        return str(int(val))
+    return f"{val:.2f}".rstrip("0").rstrip(".")
+
+
+def _to_float(val):
+    try:
+        return float(str(val).replace(',', '.'))
+    except Exception:
+        return 0.0
+
+
+# =======================
+#    СТАТИСТИКА МАТЧА
+# =======================
+
+_GAME_HEADER = "⚔️ *Матч ID:* `{id}`\n{season}📅 `{date}` \\| 🗺 `{map}`\n🏆 Счет: *{s1} : {s2}*\n🏆 *Победитель:* {winner}\n\n"
+_STATS_TABLE_HEAD = f"```\n{'Player':<10} {'K':>2} {'A':>2} {'D':>2} {'KD':>4} {'RTG':>4}\n{'-' * 32}\n"
+_STATS_ROW = "{:<10} {:>2} {:>2} {:>2} {:>4} {:>4}\n".format
+
+
+def _stats_block(tag, players):
+    rows = [
+        _STATS_ROW(
+            escape_md_code(p.get('nickname', 'Player')[:10]),
+            p.get('K', 0), p.get('A', 0), p.get('D', 0), p.get('KD', 0.0), p.get('RATING', 0.0),
+        )
+        for p in players
+    ]
+    return f"🚩 *{format_team_tag_md(tag)}*\n{_STATS_TABLE_HEAD}{''.join(rows)}```\n"
+
+
+def format_game_stats(game, tournament_season=""):
+    try:
+        stats = json.loads(game['stats_json'])
+    except:
+        return "⚠️ Ошибка загрузки статистики"
+
+    try:
+        s1 = int(game.get('score_t1', 0))
+        s2 = int(game.get('score_t2', 0))
+    except Exception:
+        s1 = 0
+        s2 = 0
+
+    if s1 > s2:
+        winner = format_team_tag_md(game.get('team1_tag', ''))
+    elif s2 > s1:
+        winner = format_team_tag_md(game.get('team2_tag', ''))
+    else:
+        winner = "Ничья"
+
+    season_safe = escape_md(tournament_season)
+    header = _GAME_HEADER.format(
+        id=escape_md(game['id']),
+        season=f"❄️ *Сезон:* {season_safe}\n" if season_safe else "",
+        date=escape_md_code(game['game_date']),
+        map=escape_md_code(game['map_name']),
+        s1=escape_md(game['score_t1']),
+        s2=escape_md(game['score_t2']),
+        winner=winner,
+    )
+    return header + "".join(_stats_block(tag, players) for tag, players in stats.items())
+
+
+# =======================
+#    ПРОФИЛЬ ИГРОКА
+# =======================
+
+_PROFILE = (
+    "👤 *Игрок:* {full_name}\n"
+    "🛡️ *Команда:* {team}\n"
+    "🏆 *Ранг:* \\#{rank} \\(Очки: {score}\\)\n"
+    "\n"
+    "📊 *Статистика:*\n"
+    "🔫 K: {kills} \\| A: {assists} \\| D: {deaths}\n"
+    "➕/➖: {diff} \\| Helps: {helps}\n"
+    "💀 KD: {kd}\n"
+    "🔫 KPR: {kpr} \\| 🛡 DPR: {dpr}\n"
+    "❤️ SVR: {svr}\n"
+    "💥 IMPACT: {impact}\n"
+    "⭐ RATING: {rating}\n"
+    "\n📅 *Последние 3 игры:*\n{last_games}"
+    "\n🏅 *Достижения:*\n{achievements}"
+    "\n🔄 *История трансферов:*\n{transfers}"
+)
+
+
+def format_player_profile(stats):
+    full_name = stats['last_name'] + " \"" + stats['nickname'] + "\" " + stats['first_name']
+
+    if stats['last_3_games']:
+        last_games = "".join(f"▫️ {escape_md(g)}\n" for g in stats['last_3_games'])
+    else:
+        last_games = "▫️ Нет сыгранных игр\n"
+
+    if stats['achievements']:
+        achievements = "".join(f"{escape_md(ach)}\n" for ach in stats['achievements'])
+    else:
+        achievements = "▫️ Нет\n"
+
+    if stats['transfers']:
+        transfers = "".join(
+            f"▫️ {escape_md(t['date'])}: {escape_md(t['old_team'])} ➡️ {escape_md(t['new_team'])}\n"
+            for t in stats['transfers']
+        )
+    else:
+        transfers = "▫️ Пусто\n"
+
+    return _PROFILE.format(
+        full_name=escape_md(full_name),
+        team=escape_md(stats['current_team']),
+        rank=escape_md(stats['rank']),
+        score=escape_md(stats['score']),
+        kills=stats['kills'], assists=stats['assists'], deaths=stats['deaths'],
+        diff=escape_md(stats['diff']),
+        helps=escape_md(stats['helps']),
+        kd=escape_md(stats['kd']),
+        kpr=escape_md(stats['kpr']),
+        dpr=escape_md(stats['dpr']),
+        svr=escape_md(stats['svr']),
+        impact=escape_md(stats['impact']),
+        rating=escape_md(stats['avg_rating']),
+        last_games=last_games,
+        achievements=achievements,
+        transfers=transfers,
+    )
+
+
+# =======================
+#    КАРТОЧКА ТУРНИРА
+# =======================
+
+_TOURNAMENT = (
+    "🏆 *Турнир:* {name}\n"
+    "{season}"
+    "📅 *Год:* {year}\n"
+    "🚦 *Этапы:* {stages}\n"
+    "👥 *Участников:* {participants}\n\n"
+    "💰 *Призовой фонд:*\n{prize}\n\n"
+    "⭐ *MVP Приз:* {mvp}"
+)
+_STAGE_SEP = " \\-\\> "
+_STAGE_QUALIFIERS = escape_md("Квалификации")
+_STAGE_GROUPS = escape_md("Групповой этап")
+_STAGE_PLAYOFF = escape_md("Плей-офф (Main)")
+
+
+def _load_json(raw):
+    try:
+        return json.loads(raw)
+    except:
+        return None
+
+
+def _prize_block(pdata):
+    if not pdata:
+        return "Нет фонда"
+
+    curr = escape_md(pdata.get('currency', '?'))
+    dist_raw = pdata.get('distribution', [])
+    if isinstance(dist_raw, dict):
+        dist_list = [{"place": k, "amount": v} for k, v in dist_raw.items()]
+    elif isinstance(dist_raw, list):
+        dist_list = [x for x in dist_raw if isinstance(x, dict)]
+    else:
+        dist_list = []
+
+    amounts = [_to_float(x.get('amount', 0)) for x in dist_list]
+    total_fund_val = pdata.get('total_fund')
+    total_fund = _to_float(total_fund_val) if total_fund_val is not None else sum(amounts)
+
+    lines = [f"*{escape_md(fmt_money(total_fund))} {curr}*"]
+    lines.extend(
+        f"   🏅 {escape_md(item.get('place', ''))}: {escape_md(fmt_money(amount))} {curr}"
+        for item, amount in zip(dist_list, amounts)
+    )
+    return "\n".join(lines)
+
+
+def format_tournament_info(tour):
+    mdata = _load_json(tour['mvp_data'])
+    if mdata:
+        mvp = f"{escape_md(mdata.get('amount', '0'))} {escape_md(mdata.get('currency', ''))}"
+    else:
+        mvp = "Нет"
+
+    stages = []
+    if tour['has_qualifiers']: stages.append(_STAGE_QUALIFIERS)
+    if tour['has_group_stage']: stages.append(_STAGE_GROUPS)
+    stages.append(_STAGE_PLAYOFF)
+
+    parts = _load_json(tour['participants'])
+
+    return _TOURNAMENT.format(
+        name=escape_md(tour['full_name']),
+        season=f"❄️ *Сезон:* {escape_md(tour['season'])}\n" if tour['season'] else "",
+        year=tour['year'],
+        stages=_STAGE_SEP.join(stages),
+        participants=len(parts) if parts is not None else 0,
+        prize=_prize_block(_load_json(tour['prize_data'])),
+        mvp=mvp,
+    )
@@ -55,6 +55,7 @@ class GameRegister(StatesGroup):
     waiting_for_team1_tag = State()
     waiting_for_player_stats = State()
     waiting_for_team2_tag = State()
+    waiting_for_bulk_stats = State()
 
 # --- РЕДАКТИРОВАНИЕ ИГРЫ ---
 class GameEditState(StatesGroup):
@@ -78,6 +79,10 @@ class GameListState(StatesGroup):
 class TeamListState(StatesGroup):
     viewing = State()
 
+# --- ИМПОРТ ИГР ---
+class GameImportState(StatesGroup):
+    waiting_for_document = State()
+
 # --- КАЛБЕКИ ---
 class TournamentNav(CallbackData, prefix="turn_nav"):
     action: str
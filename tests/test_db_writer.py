@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import database
+
+
+class WriterTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._old_name = database.DB_NAME
+        self._tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        await database.close_writer()
+
+    def tearDown(self):
+        database.DB_NAME = self._old_name
+        self._tmp.cleanup()
+
+    async def test_write_fails_fast_when_db_cannot_be_opened(self):
+        database.DB_NAME = os.path.join(self._tmp.name, "missing_dir", "x.db")
+        results = await asyncio.wait_for(
+            asyncio.gather(*(database.add_user(i, f"u{i}") for i in range(5)), return_exceptions=True),
+            timeout=5,
+        )
+        self.assertTrue(all(isinstance(r, Exception) for r in results), results)
+
+    async def test_writer_recovers_after_failed_connect(self):
+        database.DB_NAME = os.path.join(self._tmp.name, "missing_dir", "x.db")
+        with self.assertRaises(Exception):
+            await asyncio.wait_for(database.add_user(1, "u"), timeout=5)
+
+        database.DB_NAME = os.path.join(self._tmp.name, "ok.db")
+        await database.init_db()
+        await asyncio.wait_for(database.add_user(1, "u"), timeout=5)
+        self.assertEqual((await database.get_user_info(1))["username"], "u")
+
+    async def test_write_fails_when_db_is_locked(self):
+        database.DB_NAME = os.path.join(self._tmp.name, "locked.db")
+        old_pragmas = database.CONNECTION_PRAGMAS
+        database.CONNECTION_PRAGMAS = [
+            "PRAGMA busy_timeout=100" if "busy_timeout" in p else p for p in old_pragmas
+        ]
+        await database.init_db()
+        # Вторая запись держит блокировку записи: BEGIN IMMEDIATE писателя падает
+        locker = sqlite3.connect(database.DB_NAME, isolation_level=None)
+        try:
+            locker.execute("BEGIN IMMEDIATE")
+            with self.assertRaises(sqlite3.OperationalError):
+                await asyncio.wait_for(database.add_user(1, "u"), timeout=5)
+            locker.execute("ROLLBACK")
+
+            await asyncio.wait_for(database.add_user(2, "v"), timeout=5)
+            self.assertEqual((await database.get_user_info(2))["username"], "v")
+        finally:
+            locker.close()
+            database.CONNECTION_PRAGMAS = old_pragmas
+
+
+if __name__ == "__main__":
+    unittest.main()
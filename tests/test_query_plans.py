@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import database
+
+# (вызов хелпера, [(фрагмент SQL, ожидаемые индексы (любой из), допустима ли сортировка во временном B-дереве)])
+# SQL не дублируется здесь: он снимается с настоящих запросов хелпера через statement_listener,
+# так что правка запроса в database.py мимо индекса ломает тест.
+CASES = [
+    (lambda: database.get_team_by_tag("abc"), [("FROM teams WHERE LOWER(tag)", "idx_teams_tag_lower", False)]),
+    (lambda: database.check_team_exists("x", "y"), [("FROM teams WHERE", "idx_teams_name_lower", False)]),
+    (lambda: database.get_team_rank_alphabetical("abc"), [("FROM teams WHERE LOWER(tag) <", "idx_teams_tag_lower", False)]),
+    (lambda: database.get_teams_paginated(sort_by="tag"), [("ORDER BY LOWER(tag)", "idx_teams_tag_lower", False)]),
+    (lambda: database.get_teams_paginated(sort_by="name"), [("ORDER BY LOWER(name)", "idx_teams_name_lower", False)]),
+    (lambda: database.get_games_paginated(1), [
+        ("SELECT COUNT(*) FROM games", "idx_games_tournament_created", False),
+        ("SELECT * FROM games", "idx_games_tournament_created", False),
+    ]),
+    (lambda: database.get_games_paginated(1, date_filter="2024.05.20"), [
+        ("SELECT * FROM games", "idx_games_tournament_date", False),
+    ]),
+    (lambda: _drain(database.iter_games(1)), [
+        ("FROM games WHERE", ("idx_games_tournament_created", "idx_games_tournament_date"), True),
+    ]),
+    (lambda: database.get_player_stats_and_rank("p1_1"), [
+        ("FROM games ORDER BY created_at", "idx_games_created", False),
+        ("FROM transfers WHERE player_name", "idx_transfers_player", False),
+    ]),
+    (lambda: database.update_player_nickname_in_roster("a", "b"), [("UPDATE transfers", "idx_transfers_player", False)]),
+    (lambda: database.get_tournaments_paginated(sort_by="year"), [("ORDER BY year DESC", "idx_tournaments_year", False)]),
+    (lambda: database.get_tournaments_paginated(sort_by="alpha"), [("ORDER BY LOWER(full_name)", "idx_tournaments_name_lower", False)]),
+    (lambda: database.get_tournament_choices(), [("FROM tournaments ORDER BY year", "idx_tournaments_year", False)]),
+    (lambda: database.check_tournament_exists("x"), [("FROM tournaments WHERE LOWER(full_name)", "idx_tournaments_name_lower", False)]),
+    (lambda: database.set_admin_role("y", "x", 1), [("UPDATE users", "idx_users_username", False)]),
+    (lambda: database.get_admins_paginated(), [
+        ("SELECT COUNT(*) FROM users", "idx_users_admins", False),
+        ("FROM users WHERE is_admin > 0 ORDER BY", "idx_users_admins", False),
+    ]),
+]
+
+
+async def _drain(rows):
+    async for _ in rows:
+        pass
+
+
+class QueryPlanTest(unittest.IsolatedAsyncioTestCase):
+    """Горячие запросы database.py идут по своим индексам, без полного скана и лишней сортировки"""
+
+    def setUp(self):
+        self._old_name = database.DB_NAME
+        self._old_listener = database.statement_listener
+        self._tmp = tempfile.TemporaryDirectory()
+        database.DB_NAME = os.path.join(self._tmp.name, "plans.db")
+        self.statements = []
+
+        def listener(sql, params, seconds, fetch):
+            if not fetch and sql != "COMMIT":
+                self.statements.append((sql, params))
+        database.statement_listener = lambda: listener
+
+    async def asyncTearDown(self):
+        await database.close_writer()
+
+    def tearDown(self):
+        database.statement_listener = self._old_listener
+        database.DB_NAME = self._old_name
+        database.invalidate_tournament_choices()
+        self._tmp.cleanup()
+
+    def _plan(self, conn, sql, params):
+        return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params or ())]
+
+    async def test_hot_queries_use_indexes(self):
+        await database.init_db()
+        database.invalidate_tournament_choices()
+        conn = sqlite3.connect(database.DB_NAME)
+        self.addCleanup(conn.close)
+
+        for call, checks in CASES:
+            self.statements.clear()
+            await call()
+            await database.close_writer()   # запросы писателя тоже должны попасть в список
+            for fragment, indexes, temp_sort_ok in checks:
+                if isinstance(indexes, str):
+                    indexes = (indexes,)
+                captured = [(sql, params) for sql, params in self.statements if fragment in database._SPACES.sub(" ", sql)]
+                with self.subTest(fragment=fragment):
+                    self.assertTrue(captured, f"запрос с '{fragment}' не выполнялся: {self.statements}")
+                    for sql, params in captured:
+                        plan = self._plan(conn, sql, params)
+                        text = "\n".join(plan)
+                        self.assertTrue(any(f"INDEX {index}" in text for index in indexes), f"{sql}\n{text}")
+                        self.assertFalse(any(line.startswith("SCAN ") and "USING" not in line for line in plan), f"{sql}\n{text}")
+                        if not temp_sort_ok:
+                            self.assertNotIn("TEMP B-TREE", text, sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from collections import deque
+
+from aiogram import BaseMiddleware
+
+# --- НАСТРОЙКИ ---
+WORKERS = 16            # сколько апдейтов обрабатывается одновременно
+MAX_PENDING = 1000      # апдейтов в очереди; при заполнении поллинг ждет (backpressure)
+STOP_TIMEOUT = 10
+
+
+class ChatSerialExecutor(BaseMiddleware):
+    """
+    Outer-middleware для dp.update: выполняет апдейты ограниченным пулом воркеров.
+    Апдейты одного чата обрабатываются строго по очереди, разные чаты - параллельно.
+
+    Поллинг нужно запускать с handle_as_tasks=False: тогда при полной очереди
+    он просто ждет, а не плодит задачи.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending)
+        self._ready = asyncio.Queue()   # ключи чатов, у которых есть работа
+        self._chat_queues = {}          # ключ чата -> deque[(handler, event, data)]
+        self._tasks = []
+        self.pending = 0
+        self.stats = {"processed": 0, "errors": 0, "waited_for_slot": 0, "max_pending": 0}
+
+    @staticmethod
+    def _chat_key(data):
+        chat = data.get("event_chat")
+        if chat is not None:
+            return ("chat", chat.id)
+        user = data.get("event_from_user")
+        if user is not None:
+            return ("user", user.id)
+        # Без чата и пользователя порядок не важен
+        return object()
+
+    async def __call__(self, handler, event, data):
+        if self._slots.locked():
+            self.stats["waited_for_slot"] += 1
+        await self._slots.acquire()
+        self.pending += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], self.pending)
+
+        key = self._chat_key(data)
+        queue = self._chat_queues.get(key)
+        if queue is None:
+            self._chat_queues[key] = deque([(handler, event, data)])
+            self._ready.put_nowait(key)
+        else:
+            # Чат уже обрабатывается или ждет воркера - просто встаем в его очередь
+            queue.append((handler, event, data))
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._chat_queues[key]
+            handler, event, data = queue[0]
+            try:
+                await handler(event, data)
+                self.stats["processed"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+                logging.exception("Ошибка обработки апдейта %s", getattr(event, "update_id", "?"))
+            finally:
+                queue.popleft()
+                self.pending -= 1
+                self._slots.release()
+                if queue:
+                    # В конец общей очереди: остальные чаты не ждут, пока этот опустеет
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chat_queues[key]
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        deadline = asyncio.get_running_loop().time() + STOP_TIMEOUT
+        while self.pending and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def setup(self, dp):
+        dp.update.outer_middleware(self)
+        dp.startup.register(self.start)
+        dp.shutdown.register(self.stop)